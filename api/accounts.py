@@ -1,51 +1,94 @@
-from typing import List
-
+from datetime import date
+from typing import List, Optional
 
+from fastapi import APIRouter, HTTPException, Query
 
 from services.accounts import (
-    create_account as svc_create_account,
-    list_accounts as svc_list_accounts,
-    update_account as svc_update_account,
-    delete_account as svc_delete_account,
+    create_account_async as svc_create_account,
+    list_accounts_async as svc_list_accounts,
+    list_accounts_with_balances_async as svc_list_accounts_with_balances,
+    list_account_balances_async as svc_list_account_balances,
+    get_account_by_id_async as svc_get_account_by_id,
+    get_balance_as_of_async as svc_get_balance_as_of,
+    get_total_balance_async as svc_get_total_balance,
+    update_account_async as svc_update_account,
+    delete_account_async as svc_delete_account,
 )
+from services.fx import FxRateError
+from services.transactions import get_account_balance_async as get_account_balance
 
-from fastapi import APIRouter, HTTPException
-from services.transactions import get_account_balance
-from models.account import Account
-from db import session_scope
-
-from api.schemas import AccountCreate, AccountOut, AccountUpdate
+from api.deps import DbSession
+from api.schemas import AccountBalanceOut, AccountCreate, AccountOut, AccountUpdate
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
 
 @router.get("", response_model=List[AccountOut])
-def read_accounts():
-    accounts = svc_list_accounts(active_only=False)
+async def read_accounts(
+    session: DbSession,
+    include_balance: bool = Query(False, description="Добавить балансы (тем же запросом)"),
+):
+    if include_balance:
+        return await svc_list_accounts_with_balances(active_only=False, session=session)
+    accounts = await svc_list_accounts(active_only=False, session=session)
     return accounts
 
 
+@router.get("/balances", response_model=List[AccountBalanceOut])
+async def read_account_balances(
+    session: DbSession,
+    active_only: bool = Query(False, description="Только активные счета"),
+    as_of: Optional[date] = Query(None, description="Баланс на конец этого дня"),
+):
+    """
+    Балансы всех счетов по валютам одним запросом. Счёт без операций —
+    ноль в валюте счёта. С as_of — по balance_checkpoints и хвосту операций.
+    """
+    return await svc_list_account_balances(active_only=active_only, as_of=as_of, session=session)
+
+
+# до /{account_id}/balance: иначе "summary" попадает в account_id
+@router.get("/summary/balance")
+async def get_total_balance(
+    session: DbSession,
+    currency: str = "RUB",
+    report_currency: Optional[str] = Query(
+        None, min_length=3, max_length=3, description="Все валюты в пересчёте по fx_rates",
+    ),
+):
+    try:
+        total = await svc_get_total_balance(currency, report_currency, session=session)
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {
+        "currency": report_currency or currency,
+        "total_balance_minor": total,
+    }
+
+
 @router.post("", response_model=AccountOut, status_code=201)
-def create_account(data: AccountCreate):
-    acc_dto = svc_create_account(
+async def create_account(data: AccountCreate, session: DbSession):
+    acc_dto = await svc_create_account(
         name=data.name,
         type_=data.type,
         currency=data.currency,
         is_active=True,
         card_number=data.card_number,  # новое поле
+        session=session,
     )
     return acc_dto
 
 
 @router.patch("/{account_id}", response_model=AccountOut)
-def update_account(account_id: int, data: AccountUpdate):
-    acc_dto = svc_update_account(
+async def update_account(account_id: int, data: AccountUpdate, session: DbSession):
+    acc_dto = await svc_update_account(
         account_id=account_id,
         name=data.name,
         type_=data.type,
         currency=data.currency,
         card_number=data.card_number,
         is_active=data.is_active,
+        session=session,
     )
     if acc_dto is None:
         raise HTTPException(status_code=404, detail="Account not found")
@@ -53,48 +96,38 @@ def update_account(account_id: int, data: AccountUpdate):
 
 
 @router.delete("/{account_id}", status_code=204)
-def delete_account(account_id: int):
-    ok = svc_delete_account(account_id)
+async def delete_account(account_id: int, session: DbSession):
+    try:
+        ok = await svc_delete_account(account_id, session=session)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
     if not ok:
         raise HTTPException(status_code=404, detail="Account not found")
 
 
 @router.get("/{account_id}/balance")
-def get_balance(account_id: int):
+async def get_balance(
+    account_id: int,
+    session: DbSession,
+    as_of: Optional[date] = Query(None, description="Баланс на конец этого дня"),
+):
     """
-    Текущий баланс счёта в копейках + валюта.
+    Текущий баланс счёта (или на конец дня as_of) в копейках + валюта.
     """
-    with session_scope() as session:
-        account = (
-            session.query(Account)
-            .filter(Account.id == account_id)
-            .first()
-        )
-        if account is None:
-            raise HTTPException(status_code=404, detail="Account not found")
-
-        currency = account.currency  # читаем пока сессия жива
+    account = await svc_get_account_by_id(account_id, session=session)
+    if account is None:
+        raise HTTPException(status_code=404, detail="Account not found")
 
-    balance_minor = get_account_balance(account_id=account_id)
+    if as_of is not None:
+        balance_minor = await svc_get_balance_as_of(account_id, as_of, session=session)
+    else:
+        balance_minor = await get_account_balance(account_id=account_id, session=session)
 
-    return {
+    result = {
         "account_id": account_id,
         "balance_minor": balance_minor,
-        "currency": currency,
+        "currency": account["currency"],
     }
-
-
-@router.get("/summary/balance")
-def get_total_balance(currency: str = "RUB"):
-    with session_scope() as session:
-        accounts = (
-            session.query(Account)
-            .filter(Account.currency == currency, Account.is_active == True)
-            .all()
-        )
-
-    total = sum(get_account_balance(a.id, currency) for a in accounts)
-    return {
-        "currency": currency,
-        "total_balance_minor": total,
-    }
\ No newline at end of file
+    if as_of is not None:
+        result["as_of"] = as_of
+    return result
@@ -1,18 +1,24 @@
+from typing import Annotated
+
 from fastapi import APIRouter, Depends, Header, HTTPException, status
 
+from api.deps import DbSession
 from api.schemas import TokenOut, UserCreate, UserLogin, UserOut
 from services.auth import (
-    authenticate_user,
+    authenticate_user_async as authenticate_user,
     create_access_token,
-    create_user,
-    get_user_from_token,
+    create_user_async as create_user,
+    get_user_from_token_async as get_user_from_token,
 )
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-def get_current_user(authorization: str | None = Header(None)) -> UserOut:
+async def get_current_user(
+    session: DbSession,
+    authorization: str | None = Header(None),
+) -> UserOut:
     if not authorization:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,7 +32,7 @@ def get_current_user(authorization: str | None = Header(None)) -> UserOut:
             headers={"WWW-Authenticate": "Bearer"},
         )
     token = authorization.removeprefix("Bearer ").strip()
-    user = get_user_from_token(token)
+    user = await get_user_from_token(token, session=session)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,18 +42,31 @@ def get_current_user(authorization: str | None = Header(None)) -> UserOut:
     return UserOut(id=user.id, username=user.username, is_active=user.is_active)
 
 
+# текущий пользователь в роуте; роутеры и так подключены с get_current_user,
+# FastAPI кэширует зависимость на запрос — лишнего запроса к БД нет
+CurrentUser = Annotated[UserOut, Depends(get_current_user)]
+
+
 @router.post("/register", response_model=UserOut, status_code=201)
-def register_user(data: UserCreate):
+async def register_user(data: UserCreate, session: DbSession):
     try:
-        user = create_user(username=data.username, password=data.password)
+        user = await create_user(
+            username=data.username,
+            password=data.password,
+            session=session,
+        )
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     return UserOut(id=user.id, username=user.username, is_active=user.is_active)
 
 
 @router.post("/login", response_model=TokenOut)
-def login_user(data: UserLogin):
-    user = authenticate_user(username=data.username, password=data.password)
+async def login_user(data: UserLogin, session: DbSession):
+    user = await authenticate_user(
+        username=data.username,
+        password=data.password,
+        session=session,
+    )
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -59,5 +78,5 @@ def login_user(data: UserLogin):
 
 
 @router.get("/me", response_model=UserOut)
-def read_me(current_user: UserOut = Depends(get_current_user)):
+async def read_me(current_user: UserOut = Depends(get_current_user)):
     return current_user
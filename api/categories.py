@@ -4,13 +4,14 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Query
 
 from services.categories import (
-    create_category as svc_create_category,
-    list_categories as svc_list_categories,
-    get_category_by_id as svc_get_category_by_id,
-    update_category as svc_update_category,
-    deactivate_category as svc_deactivate_category,
+    create_category_async as svc_create_category,
+    list_categories_async as svc_list_categories,
+    get_category_by_id_async as svc_get_category_by_id,
+    update_category_async as svc_update_category,
+    deactivate_category_async as svc_deactivate_category,
 )
 
+from api.deps import DbSession
 from api.schemas import CategoryCreate, CategoryOut, CategoryUpdate
 
 
@@ -18,48 +19,65 @@ router = APIRouter(prefix="/categories", tags=["categories"])
 
 
 @router.get("", response_model=List[CategoryOut])
-def read_categories(
+async def read_categories(
+    session: DbSession,
     type: Optional[str] = Query(None, description="income / expense"),
     active_only: bool = Query(True, description="Только активные категории"),
 ):
-    cats = svc_list_categories(type_=type, active_only=active_only)
+    cats = await svc_list_categories(
+        type_=type,
+        active_only=active_only,
+        session=session,
+    )
     return cats
 
 @router.post("", response_model=CategoryOut, status_code=201)
-def create_category(data: CategoryCreate):
-    cat_dto = svc_create_category(
-        name=data.name,
-        type_=data.type,
-        parent_id=data.parent_id,
-        is_active=True,
-    )
+async def create_category(data: CategoryCreate, session: DbSession):
+    try:
+        cat_dto = await svc_create_category(
+            name=data.name,
+            type_=data.type,
+            parent_id=data.parent_id,
+            is_active=True,
+            session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return cat_dto
 
 @router.get("/{category_id}", response_model=CategoryOut)
-def read_category(category_id: int):
-    cat = svc_get_category_by_id(category_id)
+async def read_category(category_id: int, session: DbSession):
+    cat = await svc_get_category_by_id(category_id, session=session)
     if cat is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return cat
 
 
 @router.post("/{category_id}", response_model=CategoryOut)
-def update_category_api(category_id: int, data: CategoryUpdate):
-    cat = svc_update_category(
-        category_id=category_id,
-        name=data.name,
-        type_=data.type,
-        parent_id=data.parent_id,
-        is_active=data.is_active,
-    )
+async def update_category_api(
+    category_id: int,
+    data: CategoryUpdate,
+    session: DbSession,
+):
+    try:
+        cat = await svc_update_category(
+            category_id=category_id,
+            name=data.name,
+            type_=data.type,
+            parent_id=data.parent_id,
+            is_active=data.is_active,
+            session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     if cat is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return cat
 
 
 @router.delete("/{category_id}")
-def delete_category(category_id: int):
-    ok = svc_deactivate_category(category_id)
+async def delete_category(category_id: int, session: DbSession):
+    ok = await svc_deactivate_category(category_id, session=session)
     if not ok:
         raise HTTPException(status_code=404, detail="Category not found")
     return {"success": True}
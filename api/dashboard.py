@@ -1,26 +1,40 @@
 from datetime import date
 from typing import Optional
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 
+from api.deps import DbSession
 from api.schemas import (
+    DashboardBundleOut,
+    DashboardCacheStatsOut,
     DashboardSummaryOut,
     DashboardTrendsOut,
     DashboardCategoriesOut,
+    NetWorthOut,
     # добавим позже, если сделаем отдельную схему
     # DashboardIncomeCategoriesOut,
 )
 from services.dashboard import (
-    get_summary,
-    get_trends,
-    get_categories_summary,
-    get_income_categories_summary,  # ← вот это
+    CategoryRollup,
+    get_bundle_async as get_bundle,
+    get_cache_stats,
+    get_summary_async as get_summary,
+    get_trends_async as get_trends,
+    get_categories_summary_async as get_categories_summary,
+    get_income_categories_summary_async as get_income_categories_summary,
 )
-
+from services.checkpoints import get_net_worth_series_async as get_net_worth_series
+from services.fx import FxRateError
 
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# все валюты в пересчёте по fx_rates; currency при этом не используется
+_REPORT_CURRENCY = Query(None, min_length=3, max_length=3, description="Валюта отчёта")
+# дерево категорий (category_closure)
+_CATEGORY_SUBTREE = Query(None, description="Только категория и её потомки")
+_ROLLUP = Query("leaf", description="leaf / parent — свернуть к категориям верхнего уровня")
+
 
 def _normalize_period(period: str) -> str:
     allowed = {"day", "week", "month", "quarter", "year"}
@@ -30,10 +44,13 @@ def _normalize_period(period: str) -> str:
 
 
 @router.get("/summary", response_model=DashboardSummaryOut)
-def dashboard_summary(
+async def dashboard_summary(
+    session: DbSession,
     period: str = Query("month"),
     base_date: Optional[date] = Query(None, description="Базовая дата внутри периода"),
     currency: str = Query("RUB"),
+    report_currency: Optional[str] = _REPORT_CURRENCY,
+    category_subtree: Optional[int] = _CATEGORY_SUBTREE,
 ):
     """
     Карточки: чистый поток, доходы, расходы, общий баланс счетов.
@@ -41,15 +58,28 @@ def dashboard_summary(
     period_norm = _normalize_period(period)
     base_date = base_date or date.today()
 
-    data = get_summary(period_norm, base_date, currency=currency)
+    try:
+        data = await get_summary(
+            period_norm,
+            base_date,
+            currency=currency,
+            report_currency=report_currency,
+            category_subtree=category_subtree,
+            session=session,
+        )
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return DashboardSummaryOut(**data)
 
 
 @router.get("/trends", response_model=DashboardTrendsOut)
-def dashboard_trends(
+async def dashboard_trends(
+    session: DbSession,
     period: str = Query("month"),
     base_date: Optional[date] = Query(None),
     currency: str = Query("RUB"),
+    report_currency: Optional[str] = _REPORT_CURRENCY,
+    category_subtree: Optional[int] = _CATEGORY_SUBTREE,
 ):
     """
     Линейный график динамики доходов и расходов.
@@ -57,16 +87,30 @@ def dashboard_trends(
     period_norm = _normalize_period(period)
     base_date = base_date or date.today()
 
-    data = get_trends(period_norm, base_date, currency=currency)
+    try:
+        data = await get_trends(
+            period_norm,
+            base_date,
+            currency=currency,
+            report_currency=report_currency,
+            category_subtree=category_subtree,
+            session=session,
+        )
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return DashboardTrendsOut(**data)
 
 
 @router.get("/categories", response_model=DashboardCategoriesOut)
-def dashboard_categories(
+async def dashboard_categories(
+    session: DbSession,
     period: str = Query("month"),
     base_date: Optional[date] = Query(None),
     currency: str = Query("RUB"),
     limit: int = Query(5, ge=1, le=50),
+    report_currency: Optional[str] = _REPORT_CURRENCY,
+    rollup: CategoryRollup = _ROLLUP,
+    category_subtree: Optional[int] = _CATEGORY_SUBTREE,
 ):
     """
     Круговая диаграмма и топ категорий по расходам.
@@ -74,21 +118,32 @@ def dashboard_categories(
     period_norm = _normalize_period(period)
     base_date = base_date or date.today()
 
-    data = get_categories_summary(
-        period_norm,
-        base_date,
-        currency=currency,
-        limit=limit,
-    )
+    try:
+        data = await get_categories_summary(
+            period_norm,
+            base_date,
+            currency=currency,
+            limit=limit,
+            report_currency=report_currency,
+            rollup=rollup,
+            category_subtree=category_subtree,
+            session=session,
+        )
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return DashboardCategoriesOut(**data)
 
 
 @router.get("/income_categories", response_model=DashboardCategoriesOut)
-def dashboard_income_categories(
+async def dashboard_income_categories(
+    session: DbSession,
     period: str = Query("month"),
     base_date: Optional[date] = Query(None),
     currency: str = Query("RUB"),
     limit: int = Query(5, ge=1, le=50),
+    report_currency: Optional[str] = _REPORT_CURRENCY,
+    rollup: CategoryRollup = _ROLLUP,
+    category_subtree: Optional[int] = _CATEGORY_SUBTREE,
 ):
     """
     Круговая диаграмма и топ категорий по доходам.
@@ -96,10 +151,85 @@ def dashboard_income_categories(
     period_norm = _normalize_period(period)
     base_date = base_date or date.today()
 
-    data = get_income_categories_summary(
-        period_norm,
-        base_date,
-        currency=currency,
-        limit=limit,
-    )
-    return DashboardCategoriesOut(**data)
\ No newline at end of file
+    try:
+        data = await get_income_categories_summary(
+            period_norm,
+            base_date,
+            currency=currency,
+            limit=limit,
+            report_currency=report_currency,
+            rollup=rollup,
+            category_subtree=category_subtree,
+            session=session,
+        )
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return DashboardCategoriesOut(**data)
+
+
+@router.get("/bundle", response_model=DashboardBundleOut)
+async def dashboard_bundle(
+    session: DbSession,
+    period: str = Query("month"),
+    base_date: Optional[date] = Query(None),
+    currency: str = Query("RUB"),
+    limit: int = Query(5, ge=1, le=50),
+    report_currency: Optional[str] = _REPORT_CURRENCY,
+    rollup: CategoryRollup = _ROLLUP,
+    category_subtree: Optional[int] = _CATEGORY_SUBTREE,
+):
+    """
+    Все виджеты страницы дашборда одним запросом:
+    summary, trends, categories (расходы) и income_categories (доходы).
+    """
+    period_norm = _normalize_period(period)
+    base_date = base_date or date.today()
+
+    try:
+        data = await get_bundle(
+            period_norm,
+            base_date,
+            currency=currency,
+            limit=limit,
+            report_currency=report_currency,
+            rollup=rollup,
+            category_subtree=category_subtree,
+            session=session,
+        )
+    except FxRateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return DashboardBundleOut(**data)
+
+
+@router.get("/net-worth", response_model=NetWorthOut)
+async def dashboard_net_worth(
+    session: DbSession,
+    date_from: date = Query(...),
+    date_to: Optional[date] = Query(None, description="По умолчанию — сегодня"),
+    granularity: str = Query("month", description="month / day"),
+    currency: str = Query("RUB"),
+):
+    """
+    График капитала: сумма балансов всех счетов в валюте на конец
+    каждого месяца (или дня) периода. Закрытые месяцы читаются из
+    balance_checkpoints, без суммирования всей истории.
+    """
+    try:
+        data = await get_net_worth_series(
+            currency,
+            date_from,
+            date_to or date.today(),
+            granularity,
+            session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return NetWorthOut(**data)
+
+
+@router.get("/cache/stats", response_model=DashboardCacheStatsOut)
+async def dashboard_cache_stats():
+    """
+    Метрики кэша дашборда в этом процессе: попадания, промахи, вытеснения.
+    """
+    return DashboardCacheStatsOut(**get_cache_stats())
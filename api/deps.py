@@ -0,0 +1,20 @@
+from typing import Annotated, AsyncIterator
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import async_session_scope
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """
+    Одна сессия (одно соединение из пула и максимум один commit) на HTTP-запрос.
+    Её разделяют get_current_user, роут и все вызываемые им сервисы.
+    """
+    async with async_session_scope() as session:
+        yield session
+
+
+# scope="function": commit выполняется до отправки ответа клиенту,
+# чтобы 2xx не ушёл раньше, чем данные реально записаны.
+DbSession = Annotated[AsyncSession, Depends(get_db, scope="function")]
@@ -0,0 +1,47 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from services.fx import (
+    FxRateDTO,
+    list_rates_async as svc_list_rates,
+    set_rates_async as svc_set_rates,
+)
+
+from api.deps import DbSession
+from api.schemas import FxRateIn, FxRateOut
+
+router = APIRouter(prefix="/fx-rates", tags=["fx"])
+
+
+@router.get("", response_model=List[FxRateOut])
+async def read_rates(
+    session: DbSession,
+    base: Optional[str] = Query(None, min_length=3, max_length=3),
+    quote: Optional[str] = Query(None, min_length=3, max_length=3),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+):
+    return await svc_list_rates(
+        base.upper() if base else None,
+        quote.upper() if quote else None,
+        date_from,
+        date_to,
+        session=session,
+    )
+
+
+@router.put("")
+async def put_rates(items: List[FxRateIn], session: DbSession):
+    """
+    Записать курсы (1 base = rate quote на rate_date); курс той же пары
+    на ту же дату заменяется. Отчёты с report_currency пересчитаются.
+    """
+    if any(item.base == item.quote for item in items):
+        raise HTTPException(status_code=400, detail="base and quote must differ")
+    written = await svc_set_rates(
+        [FxRateDTO(item.rate_date, item.base, item.quote, item.rate) for item in items],
+        session=session,
+    )
+    return {"written": written}
@@ -0,0 +1,74 @@
+# api/idempotency.py
+
+from typing import Annotated, Any, Awaitable, Callable, Optional
+
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.idempotency import (
+    StoredResponse,
+    request_hash,
+    claim_key_async as svc_claim_key,
+    get_response_async as svc_get_response,
+    save_response_async as svc_save_response,
+)
+
+IdempotencyKeyHeader = Annotated[
+    Optional[str],
+    Header(alias="Idempotency-Key", min_length=1, max_length=255),
+]
+
+
+def _replay(stored: StoredResponse, req_hash: str) -> JSONResponse:
+    if stored.request_hash != req_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    if stored.status_code is None:
+        raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is in progress")
+    return JSONResponse(
+        stored.body,
+        status_code=stored.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def idempotent(
+    session: AsyncSession,
+    user_id: int,
+    key: Optional[str],
+    method: str,
+    path: str,
+    payload: BaseModel,
+    status_code: int,
+    handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Выполнить handler() не больше одного раза на Idempotency-Key.
+    Без ключа — обычный вызов. Повтор с тем же ключом и телом получает
+    сохранённый ответ (заголовок Idempotent-Replayed: true) за один поиск
+    по первичному ключу; с другим телом — 422.
+    """
+    if key is None:
+        return await handler()
+
+    req_hash = request_hash(method, path, payload.model_dump_json())
+    stored = await svc_get_response(user_id, key, session=session)
+    if stored is not None:
+        return _replay(stored, req_hash)
+
+    # ключ занимается в транзакции запроса: параллельный повтор
+    # дождётся её commit и получит уже сохранённый ответ
+    if not await svc_claim_key(user_id, key, req_hash, session=session):
+        stored = await svc_get_response(user_id, key, session=session)
+        if stored is None:
+            raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is in progress")
+        return _replay(stored, req_hash)
+
+    body = jsonable_encoder(await handler())
+    await svc_save_response(user_id, key, status_code, body, session=session)
+    return JSONResponse(body, status_code=status_code)
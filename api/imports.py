@@ -0,0 +1,88 @@
+# api/imports.py
+
+import os
+import shutil
+from typing import List, Literal, Optional
+
+import anyio
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Query, UploadFile
+
+from services.imports import (
+    detect_format,
+    import_path,
+    run_import,
+    create_import_job_async as svc_create_import_job,
+    get_import_job_async as svc_get_import_job,
+    list_import_jobs_async as svc_list_import_jobs,
+)
+from api.deps import DbSession
+from api.schemas import ImportJobOut
+
+router = APIRouter(prefix="/imports", tags=["imports"])
+
+
+def _save_upload(upload: UploadFile, path: str) -> None:
+    with open(path, "wb") as out:
+        shutil.copyfileobj(upload.file, out, 1024 * 1024)
+
+
+@router.post("", response_model=ImportJobOut, status_code=202)
+async def create_import(
+    session: DbSession,
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    account_id: int = Form(...),
+    format: Optional[str] = Form(None, description="csv / ofx; по умолчанию — по расширению"),
+    chunk_size: Optional[int] = Form(None, ge=1),
+    on_duplicate: Literal["allow", "reject", "flag"] = Form(
+        "reject", description="уже записанные операции: reject — пропустить, flag — записать с пометкой",
+    ),
+):
+    """
+    Загрузить выписку и запустить импорт в фоне.
+    Ответ приходит сразу; прогресс — GET /imports/{id}.
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    path = import_path(fmt)
+    await anyio.to_thread.run_sync(_save_upload, file, path)
+    try:
+        job = await svc_create_import_job(
+            account_id, fmt, path, file.filename, chunk_size, on_duplicate,
+            session=session,
+        )
+    except ValueError as exc:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # задача стартует после ответа, когда сессия запроса уже зафиксирована
+    background.add_task(run_import, job.id)
+    return job
+
+
+@router.get("", response_model=List[ImportJobOut])
+async def read_imports(session: DbSession, limit: int = Query(50, ge=1, le=500)):
+    return await svc_list_import_jobs(limit, session=session)
+
+
+@router.get("/{job_id}", response_model=ImportJobOut)
+async def read_import(job_id: int, session: DbSession):
+    job = await svc_get_import_job(job_id, session=session)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.post("/{job_id}/resume", response_model=ImportJobOut, status_code=202)
+async def resume_import(job_id: int, session: DbSession, background: BackgroundTasks):
+    """Продолжить упавший или прерванный импорт с первой незафиксированной записи."""
+    job = await svc_get_import_job(job_id, session=session)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job.status not in ("failed", "interrupted"):
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status}")
+    background.add_task(run_import, job.id)
+    return job
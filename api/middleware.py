@@ -0,0 +1,38 @@
+import logging
+
+from fastapi import Request
+
+from db.instrumentation import (
+    SQL_MAX_QUERIES_PER_REQUEST,
+    SQL_STRICT_QUERY_LIMIT,
+    track_queries,
+)
+
+
+logger = logging.getLogger("myfinance.sql")
+
+
+async def sql_metrics_middleware(request: Request, call_next):
+    """
+    Считает SQL-запросы каждого HTTP-запроса и отдаёт их в заголовках
+    Server-Timing / X-DB-Query-Count. Подозрение на N+1 пишется в лог,
+    а в строгом режиме (SQL_STRICT_QUERY_LIMIT=1) превращается в ошибку.
+    """
+    label = f"{request.method} {request.url.path}"
+    limit = SQL_MAX_QUERIES_PER_REQUEST or None
+    strict_limit = limit if SQL_STRICT_QUERY_LIMIT else None
+
+    with track_queries(label=label, max_queries=strict_limit) as stats:
+        response = await call_next(request)
+
+    if limit is not None and stats.count > limit:
+        logger.warning(
+            "%s executed %d queries (limit %d), possible N+1",
+            label,
+            stats.count,
+            limit,
+        )
+
+    response.headers["Server-Timing"] = stats.server_timing()
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    return response
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime, date
 
 from pydantic import BaseModel, field_validator
@@ -36,6 +36,9 @@ class TransactionCreate(BaseModel):
     currency: str = "RUB"
     kind: str  # "income" / "expense" / "transfer"
     to_account_id: Optional[int] = None
+    # уже есть такая операция: allow — записать, reject — 409, flag — записать
+    # с duplicate_of_id; по умолчанию DUPLICATE_POLICY
+    on_duplicate: Optional[Literal["allow", "reject", "flag"]] = None
 
     @field_validator("amount_minor")
     @classmethod
@@ -52,6 +55,33 @@ class TransactionCreate(BaseModel):
         return v
 
 
+class TransactionBulkCreate(BaseModel):
+    items: List[TransactionCreate]
+    on_duplicate: Optional[Literal["allow", "reject", "flag"]] = None  # для всего пакета
+
+
+class FxRateIn(BaseModel):
+    rate_date: date
+    base: str      # 1 base = rate quote
+    quote: str
+    rate: float
+
+    @field_validator("base", "quote")
+    @classmethod
+    def validate_currency(cls, v: str) -> str:
+        v = v.upper()
+        if len(v) != 3 or not v.isalpha():
+            raise ValueError("currency must be a 3-letter code")
+        return v
+
+    @field_validator("rate")
+    @classmethod
+    def validate_rate(cls, v: float) -> float:
+        if not v > 0:
+            raise ValueError("rate must be > 0")
+        return v
+
+
 # ---------- Update-модели ----------
 
 class AccountUpdate(BaseModel):
@@ -85,6 +115,12 @@ class TokenOut(BaseModel):
 
 # ---------- Out-модели ----------
 
+class AccountBalanceOut(BaseModel):
+    account_id: int
+    currency: str
+    balance_minor: int
+
+
 class AccountOut(BaseModel):
     id: int
     name: str
@@ -93,6 +129,9 @@ class AccountOut(BaseModel):
     is_active: bool
     card_number: Optional[str] = None  # новый атрибут
     created_at: Optional[datetime] = None
+    # только с include_balance=true: баланс в валюте счёта и по всем валютам
+    balance_minor: Optional[int] = None
+    balances: Optional[List[AccountBalanceOut]] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -118,6 +157,65 @@ class TransactionOut(BaseModel):
     description: Optional[str] = None
     transfer_group_id: Optional[int] = None
     created_at: Optional[datetime] = None
+    duplicate_of_id: Optional[int] = None  # возможный дубль этой операции
+    # баланс счёта после операции (GET /transactions?running_balance=true)
+    running_balance_minor: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class WriteQueueStatsOut(BaseModel):
+    running: bool
+    queued: int          # ждут записи прямо сейчас
+    submitted: int
+    written: int
+    rejected: int        # ошибки отдельных операций (нет счёта, дубль)
+    failed_batches: int  # пачки, не дошедшие до commit
+    batches: int         # commit-ов
+    max_batch: int
+    avg_batch: float
+
+
+class TransactionPageOut(BaseModel):
+    items: List[TransactionOut]
+    next_cursor: Optional[str] = None   # передать в cursor за следующей страницей
+    total: Optional[int] = None         # только при include_total=true
+    total_exact: Optional[bool] = None  # false — total это нижняя граница
+
+
+class TransactionBulkItemOut(BaseModel):
+    index: int                 # позиция в items запроса
+    ids: List[int] = []        # созданные записи (у перевода — две)
+    error: Optional[str] = None
+    duplicate_of: Optional[int] = None  # найденный дубль (reject / flag)
+
+
+class TransactionBulkOut(BaseModel):
+    created: int               # элементов записано
+    failed: int                # элементов с ошибкой (не записаны)
+    results: List[TransactionBulkItemOut]
+
+
+class ImportJobOut(BaseModel):
+    id: int
+    account_id: int
+    format: str                # "csv" / "ofx"
+    filename: Optional[str] = None
+    status: str                # pending / running / done / failed / interrupted
+    chunk_size: int
+    on_duplicate: str          # allow / reject / flag
+    total_records: Optional[int] = None
+    committed_records: int     # записей выписки обработано и зафиксировано
+    inserted_count: int
+    duplicate_count: int       # найдено дублей (reject — пропущены, flag — записаны с пометкой)
+    error_count: int           # записей с ошибкой разбора или вставки
+    last_record_error: Optional[str] = None
+    error: Optional[str] = None
+    progress: Optional[float] = None  # 0..1
+    records_per_s: Optional[float] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -145,6 +243,15 @@ class CategoryUpdate(BaseModel):
         return v
 
 
+class FxRateOut(BaseModel):
+    rate_date: date
+    base: str
+    quote: str
+    rate: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 # ---------- Dashboard-модели ----------
 
 class DashboardSummaryOut(BaseModel):
@@ -186,3 +293,40 @@ class DashboardCategoriesOut(BaseModel):
     total_amount_minor: int
     currency: str = "RUB"
     categories: List[DashboardCategoryItem]
+
+
+class DashboardBundleOut(BaseModel):
+    """Все виджеты дашборда одним ответом (GET /dashboard/bundle)."""
+    summary: DashboardSummaryOut
+    trends: DashboardTrendsOut
+    categories: DashboardCategoriesOut          # расходы
+    income_categories: DashboardCategoriesOut   # доходы
+
+
+class NetWorthPoint(BaseModel):
+    date: date           # конец дня / месяца (последняя точка — date_to)
+    balance_minor: int
+
+
+class NetWorthOut(BaseModel):
+    currency: str
+    granularity: str     # "day" / "month"
+    date_from: date
+    date_to: date
+    points: List[NetWorthPoint]
+
+
+class DashboardCacheStatsOut(BaseModel):
+    size: int
+    max_size: int
+    ttl_s: float
+    hits: int
+    misses: int
+    stale: int       # промахи из-за записи в затронутые месяцы/валюты
+    expired: int     # промахи по TTL
+    evictions: int   # вытеснено по LRU
+    hit_ratio: float
+    flights: int     # запущено расчётов (после промаха кэша)
+    coalesced: int   # запросов, дождавшихся уже идущего расчёта
+    in_flight: int
+    max_waiters: int
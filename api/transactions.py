@@ -1,19 +1,42 @@
 # api/transactions.py
 
-from typing import List
+import csv
+import io
+import json
+from dataclasses import asdict
+from datetime import date
+from typing import Annotated, AsyncIterator, List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from db import session_scope
 from services.transactions import (
-    add_income as svc_add_income,
-    add_expense as svc_add_expense,
-    add_transfer as svc_add_transfer,
-    delete_transaction as svc_delete_transaction,
-    update_transaction as svc_update_transaction,  # ⚠️ см. ниже про сервис
+    NewTransaction,
+    TransactionDTO,
+    TransactionFilters,
+    add_transactions_bulk_async as svc_add_transactions_bulk,
+    add_income_async as svc_add_income,
+    add_expense_async as svc_add_expense,
+    add_transfer_async as svc_add_transfer,
+    list_transactions_page_async as svc_list_transactions_page,
+    stream_transactions_async as svc_stream_transactions,
+    delete_transaction_async as svc_delete_transaction,
+    update_transaction_async as svc_update_transaction,  # ⚠️ см. ниже про сервис
+)
+from services.duplicates import DuplicateTransactionError
+from services.write_queue import write_queue
+from api.auth import CurrentUser
+from api.deps import DbSession
+from api.idempotency import IdempotencyKeyHeader, idempotent
+from api.schemas import (
+    TransactionBulkCreate,
+    TransactionBulkOut,
+    TransactionCreate,
+    TransactionOut,
+    TransactionPageOut,
+    TransactionUpdate,
+    WriteQueueStatsOut,
 )
-from api.schemas import TransactionCreate, TransactionOut, TransactionUpdate
-from models.transaction import Transaction
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
@@ -26,43 +49,230 @@ def _detect_kind(amount_minor: int, transfer_group_id: int | None) -> str:
     return "expense"
 
 
-@router.get("", response_model=List[TransactionOut])
-def read_transactions():
-    # Берём ORM-объекты и сразу превращаем в dict, добавляя kind
-    with session_scope() as db:
-        txs = db.query(Transaction).order_by(Transaction.id).all()
-        rows: list[dict] = []
-        for tx in txs:
-            rows.append(
-                {
-                    "id": tx.id,
-                    "account_id": tx.account_id,
-                    "category_id": tx.category_id,
-                    "amount_minor": tx.amount_minor,
-                    "currency": tx.currency,
-                    "dt": tx.dt,
-                    "description": tx.description,
-                    "transfer_group_id": tx.transfer_group_id,
-                    "created_at": tx.created_at,
-                    "kind": _detect_kind(tx.amount_minor, tx.transfer_group_id),
-                }
-            )
+def _transaction_filters(
+    account_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    kind: Optional[Literal["income", "expense", "transfer"]] = Query(None),
+    currency: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None, description="С даты (включительно)"),
+    date_to: Optional[date] = Query(None, description="По дату (включительно)"),
+    amount_min: Optional[int] = Query(None, ge=0, description="Сумма по модулю, копейки"),
+    amount_max: Optional[int] = Query(None, ge=0),
+) -> TransactionFilters:
+    """Общие фильтры списка и выгрузки операций."""
+    return TransactionFilters(
+        account_id=account_id,
+        category_id=category_id,
+        kind=kind,
+        currency=currency,
+        date_from=date_from,
+        date_to=date_to,
+        amount_min=amount_min,
+        amount_max=amount_max,
+    )
+
+
+Filters = Annotated[TransactionFilters, Depends(_transaction_filters)]
+
+
+@router.get("", response_model=TransactionPageOut)
+async def read_transactions(
+    session: DbSession,
+    filters: Filters,
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500),
+    include_total: bool = Query(False),
+    running_balance: bool = Query(False, description="Баланс счёта после каждой операции (нужен account_id)"),
+):
+    """
+    Операции от новых к старым, страницами по limit.
+    Следующая страница — тот же запрос с cursor=next_cursor.
+    """
+    try:
+        page = await svc_list_transactions_page(
+            filters,
+            cursor=cursor,
+            limit=limit,
+            with_total=include_total,
+            running_balance=running_balance,
+            session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # Берём DTO из сервиса и превращаем в dict, добавляя kind
+    rows: list[dict] = []
+    for tx in page.items:
+        rows.append(
+            {
+                "id": tx.id,
+                "account_id": tx.account_id,
+                "category_id": tx.category_id,
+                "amount_minor": tx.amount_minor,
+                "currency": tx.currency,
+                "dt": tx.dt,
+                "description": tx.description,
+                "transfer_group_id": tx.transfer_group_id,
+                "created_at": tx.created_at,
+                "duplicate_of_id": tx.duplicate_of_id,
+                "kind": _detect_kind(tx.amount_minor, tx.transfer_group_id),
+                "running_balance_minor": (
+                    page.running_balances.get(tx.id) if page.running_balances is not None else None
+                ),
+            }
+        )
+
+    return TransactionPageOut(
+        items=[TransactionOut.model_validate(row) for row in rows],
+        next_cursor=page.next_cursor,
+        total=page.total,
+        total_exact=page.total_exact,
+    )
+
 
-    return [TransactionOut.model_validate(row) for row in rows]
+# ---------- Выгрузка ----------
+
+EXPORT_COLUMNS = [
+    "id",
+    "dt",
+    "kind",
+    "account_id",
+    "category_id",
+    "amount_minor",
+    "currency",
+    "description",
+    "transfer_group_id",
+    "created_at",
+    "duplicate_of_id",
+]
+
+
+def _export_row(tx: TransactionDTO) -> dict:
+    return {
+        "id": tx.id,
+        "dt": tx.dt.isoformat(),
+        "kind": _detect_kind(tx.amount_minor, tx.transfer_group_id),
+        "account_id": tx.account_id,
+        "category_id": tx.category_id,
+        "amount_minor": tx.amount_minor,
+        "currency": tx.currency,
+        "description": tx.description,
+        "transfer_group_id": tx.transfer_group_id,
+        "created_at": tx.created_at.isoformat() if tx.created_at else None,
+        "duplicate_of_id": tx.duplicate_of_id,
+    }
+
+
+async def _export_csv(filters: TransactionFilters) -> AsyncIterator[str]:
+    # BOM — чтобы Excel открыл кириллицу в описаниях без мастера импорта
+    buf = io.StringIO()
+    buf.write("\ufeff")
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    async for batch in svc_stream_transactions(filters):
+        writer.writerows(_export_row(tx) for tx in batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+async def _export_ndjson(filters: TransactionFilters) -> AsyncIterator[str]:
+    async for batch in svc_stream_transactions(filters):
+        yield "".join(
+            json.dumps(_export_row(tx), ensure_ascii=False) + "\n" for tx in batch
+        )
+
+
+@router.get("/export")
+async def export_transactions(
+    filters: Filters,
+    format: Literal["csv", "ndjson"] = Query("csv"),
+):
+    """
+    Все операции по фильтрам от старых к новым, потоком.
+    Строки читаются из БД пачками и сразу уходят клиенту, поэтому память
+    не растёт с объёмом истории. Выгрузка идёт в своей сессии:
+    сессия запроса закрывается до начала отправки ответа.
+    """
+    if format == "csv":
+        body, media_type = _export_csv(filters), "text/csv; charset=utf-8"
+    else:
+        body, media_type = _export_ndjson(filters), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="transactions.{format}"',
+        },
+    )
 
 
 @router.post("", response_model=List[TransactionOut], status_code=201)
-def create_transaction(data: TransactionCreate):
+async def create_transaction(
+    data: TransactionCreate,
+    session: DbSession,
+    user: CurrentUser,
+    idempotency_key: IdempotencyKeyHeader = None,
+):
+    """
+    Доход, расход или перевод. С заголовком Idempotency-Key повтор запроса
+    (например, после обрыва связи) вернёт первый ответ, не создавая запись.
+    """
+    # ключ идемпотентности фиксируется в транзакции запроса вместе с записью,
+    # поэтому такие запросы пишутся напрямую, а не через очередь
+    if idempotency_key is None and write_queue.running:
+        return await _create_transaction_queued(data)
+    return await idempotent(
+        session, user.id, idempotency_key, "POST", "/transactions", data, 201,
+        lambda: _create_transaction(data, session),
+    )
+
+
+async def _create_transaction_queued(data: TransactionCreate) -> List[TransactionOut]:
+    """Запись через очередь с групповым commit (WRITE_QUEUE_ENABLED=1)."""
+    if data.kind == "transfer" and data.to_account_id is None:
+        raise HTTPException(status_code=400, detail="to_account_id is required for transfer")
+
+    item = NewTransaction(
+        kind=data.kind,
+        account_id=data.account_id,
+        amount_minor=data.amount_minor,
+        category_id=data.category_id if data.kind != "transfer" else None,
+        to_account_id=data.to_account_id if data.kind == "transfer" else None,
+        dt=data.dt,
+        description=data.description,
+        currency=data.currency,
+    )
+    on_duplicate = data.on_duplicate if data.kind != "transfer" else None
+    try:
+        txs = await write_queue.submit_async(item, on_duplicate)
+    except DuplicateTransactionError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return [TransactionOut(**asdict(tx), kind=data.kind) for tx in txs]
+
+
+async def _create_transaction(data: TransactionCreate, session: DbSession) -> List[TransactionOut]:
     # Доход
     if data.kind == "income":
-        tx = svc_add_income(
-            account_id=data.account_id,
-            category_id=data.category_id,
-            amount_minor=data.amount_minor,
-            dt=data.dt,
-            description=data.description,
-            currency=data.currency,
-        )
+        try:
+            tx = await svc_add_income(
+                account_id=data.account_id,
+                category_id=data.category_id,
+                amount_minor=data.amount_minor,
+                dt=data.dt,
+                description=data.description,
+                currency=data.currency,
+                on_duplicate=data.on_duplicate,
+                session=session,
+            )
+        except DuplicateTransactionError as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
         row = {
             "id": tx.id,
             "account_id": tx.account_id,
@@ -72,21 +282,29 @@ def create_transaction(data: TransactionCreate):
             "dt": tx.dt,
             "description": tx.description,
             "transfer_group_id": tx.transfer_group_id,
-            "created_at": None,
+            "created_at": tx.created_at,
+            "duplicate_of_id": tx.duplicate_of_id,
             "kind": "income",
         }
         return [TransactionOut.model_validate(row)]
 
     # Расход
     if data.kind == "expense":
-        tx = svc_add_expense(
-            account_id=data.account_id,
-            category_id=data.category_id,
-            amount_minor=data.amount_minor,
-            dt=data.dt,
-            description=data.description,
-            currency=data.currency,
-        )
+        try:
+            tx = await svc_add_expense(
+                account_id=data.account_id,
+                category_id=data.category_id,
+                amount_minor=data.amount_minor,
+                dt=data.dt,
+                description=data.description,
+                currency=data.currency,
+                on_duplicate=data.on_duplicate,
+                session=session,
+            )
+        except DuplicateTransactionError as exc:
+            raise HTTPException(status_code=409, detail=str(exc)) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
         row = {
             "id": tx.id,
             "account_id": tx.account_id,
@@ -96,7 +314,8 @@ def create_transaction(data: TransactionCreate):
             "dt": tx.dt,
             "description": tx.description,
             "transfer_group_id": tx.transfer_group_id,
-            "created_at": None,
+            "created_at": tx.created_at,
+            "duplicate_of_id": tx.duplicate_of_id,
             "kind": "expense",
         }
         return [TransactionOut.model_validate(row)]
@@ -109,14 +328,18 @@ def create_transaction(data: TransactionCreate):
                 detail="to_account_id is required for transfer",
             )
 
-        txs = svc_add_transfer(
-            from_account_id=data.account_id,
-            to_account_id=data.to_account_id,
-            amount_minor=data.amount_minor,
-            dt=data.dt,
-            description=data.description,
-            currency=data.currency,
-        )
+        try:
+            txs = await svc_add_transfer(
+                from_account_id=data.account_id,
+                to_account_id=data.to_account_id,
+                amount_minor=data.amount_minor,
+                dt=data.dt,
+                description=data.description,
+                currency=data.currency,
+                session=session,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
         rows: list[dict] = []
         for tx in txs:
             rows.append(
@@ -129,7 +352,7 @@ def create_transaction(data: TransactionCreate):
                     "dt": tx.dt,
                     "description": tx.description,
                     "transfer_group_id": tx.transfer_group_id,
-                    "created_at": None,
+                    "created_at": tx.created_at,
                     "kind": "transfer",
                 }
             )
@@ -138,18 +361,83 @@ def create_transaction(data: TransactionCreate):
     raise HTTPException(status_code=400, detail="Invalid kind")
 
 
+@router.post("/bulk", response_model=TransactionBulkOut)
+async def create_transactions_bulk(
+    data: TransactionBulkCreate,
+    session: DbSession,
+    user: CurrentUser,
+    idempotency_key: IdempotencyKeyHeader = None,
+):
+    """
+    Пакет доходов, расходов и переводов (до TRANSACTIONS_BULK_MAX_ITEMS).
+    Элементы с ошибкой (нет счёта, перевод без to_account_id, дубль
+    при on_duplicate=reject) не записываются и возвращаются с error,
+    остальные фиксируются одним commit. Idempotency-Key — как у POST /transactions.
+    """
+    return await idempotent(
+        session, user.id, idempotency_key, "POST", "/transactions/bulk", data, 200,
+        lambda: _create_transactions_bulk(data, session),
+    )
+
+
+async def _create_transactions_bulk(data: TransactionBulkCreate, session: DbSession) -> TransactionBulkOut:
+    items = [
+        NewTransaction(
+            kind=item.kind,
+            account_id=item.account_id,
+            amount_minor=item.amount_minor,
+            category_id=item.category_id,
+            to_account_id=item.to_account_id,
+            dt=item.dt,
+            description=item.description,
+            currency=item.currency,
+        )
+        for item in data.items
+    ]
+    try:
+        results = await svc_add_transactions_bulk(
+            items, on_duplicate=data.on_duplicate, session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    failed = sum(1 for r in results if r.error is not None)
+    return TransactionBulkOut(
+        created=len(results) - failed,
+        failed=failed,
+        results=[
+            {"index": r.index, "ids": r.ids, "error": r.error, "duplicate_of": r.duplicate_of}
+            for r in results
+        ],
+    )
+
+
+@router.get("/write-queue/stats", response_model=WriteQueueStatsOut)
+async def write_queue_stats():
+    """Метрики очереди записи с групповым commit в этом процессе."""
+    return WriteQueueStatsOut(**write_queue.stats())
+
+
 @router.patch("/{transaction_id}", response_model=TransactionOut)
-def patch_transaction(transaction_id: int, data: TransactionUpdate):
+async def patch_transaction(
+    transaction_id: int,
+    data: TransactionUpdate,
+    session: DbSession,
+):
     """
     Обновляет категорию, описание и/или сумму транзакции.
     Логика обновления (включая переводы) реализована в сервисе.
     """
-    tx = svc_update_transaction(
-        transaction_id=transaction_id,
-        category_id=data.category_id,
-        description=data.description,
-        amount_minor=data.amount_minor,  # 👈 прокидываем новую сумму
-    )
+    try:
+        tx = await svc_update_transaction(
+            transaction_id=transaction_id,
+            category_id=data.category_id,
+            description=data.description,
+            amount_minor=data.amount_minor,  # 👈 прокидываем новую сумму
+            session=session,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     if tx is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -162,13 +450,14 @@ def patch_transaction(transaction_id: int, data: TransactionUpdate):
         "dt": tx.dt,
         "description": tx.description,
         "transfer_group_id": tx.transfer_group_id,
-        "created_at": None,
+        "created_at": tx.created_at,
+        "duplicate_of_id": tx.duplicate_of_id,
         "kind": _detect_kind(tx.amount_minor, tx.transfer_group_id),
     }
     return TransactionOut.model_validate(row)
 
 @router.delete("/{transaction_id}", status_code=204)
-def delete_transaction(transaction_id: int):
-    deleted = svc_delete_transaction(transaction_id)
+async def delete_transaction(transaction_id: int, session: DbSession):
+    deleted = await svc_delete_transaction(transaction_id, session=session)
     if not deleted:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -0,0 +1,170 @@
+"""
+Замер запросов дашборда и баланса до/после составных индексов transactions.
+
+    python bench_indexes.py --rows 1000000
+
+Создаёт отдельную SQLite-базу (по умолчанию bench.db), заполняет её
+синтетическими транзакциями и печатает медиану времени каждого запроса
+без новых индексов и с ними.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+ARGS = _parse_args()
+# сервисы берут engine из DATABASE_URL, поэтому выставляем его до импорта
+os.environ["DATABASE_URL"] = f"sqlite:///{ARGS.db}"
+# меряем сами запросы, а не попадания в кэш дашборда
+os.environ["DASHBOARD_CACHE_SIZE"] = "0"
+
+from db.base import Base, engine  # noqa: E402
+from models import account, account_balance, budget, category, daily_rollup, transaction, user  # noqa: E402,F401
+from models.transaction import Transaction  # noqa: E402
+from services.dashboard import (  # noqa: E402
+    get_bundle,
+    get_categories_summary,
+    get_income_categories_summary,
+    get_summary,
+    get_trends,
+)
+from services.transactions import get_account_balance  # noqa: E402
+
+ACCOUNTS = 20
+CATEGORIES = 50
+YEARS = 5
+BASE_DATE = date(2026, 6, 15)
+
+
+def _fill(path: str, rows: int) -> None:
+    rnd = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO accounts (id, name, type, currency, is_active) VALUES (?, ?, ?, ?, 1)",
+        [(i, f"acc {i}", "card", "USD" if i % 10 == 0 else "RUB") for i in range(1, ACCOUNTS + 1)],
+    )
+    conn.executemany(
+        "INSERT INTO categories (id, name, type, is_active) VALUES (?, ?, ?, 1)",
+        [(i, f"cat {i}", "income" if i <= 5 else "expense") for i in range(1, CATEGORIES + 1)],
+    )
+
+    start = datetime.combine(BASE_DATE, datetime.min.time()) - timedelta(days=365 * YEARS)
+    span = 365 * YEARS * 24 * 3600
+    batch = []
+    for i in range(1, rows + 1):
+        acc = rnd.randint(1, ACCOUNTS)
+        currency = "USD" if acc % 10 == 0 else "RUB"
+        dt = start + timedelta(seconds=rnd.randrange(span))
+        if rnd.random() < 0.05:
+            cat, amount, group = None, -rnd.randint(100, 100_000), i
+        else:
+            cat = rnd.randint(1, CATEGORIES)
+            amount = rnd.randint(100, 500_000) * (1 if cat <= 5 else -1)
+            group = None
+        day_key = dt.year * 10000 + dt.month * 100 + dt.day
+        batch.append((acc, cat, amount, currency, dt.isoformat(" "), day_key, day_key // 100, group))
+        if len(batch) == 50_000:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.execute(
+        "INSERT INTO account_balances "
+        "(account_id, currency, balance_minor, tx_count, last_tx_id) "
+        "SELECT account_id, currency, SUM(amount_minor), COUNT(*), MAX(id) "
+        "FROM transactions GROUP BY account_id, currency"
+    )
+    conn.execute(
+        "INSERT INTO daily_rollups "
+        "(day_key, month_key, currency, category_id, sign, amount_minor, tx_count) "
+        "SELECT day_key, month_key, currency, COALESCE(category_id, 0), "
+        "CASE WHEN amount_minor > 0 THEN 1 ELSE -1 END, SUM(ABS(amount_minor)), COUNT(*) "
+        "FROM transactions WHERE transfer_group_id IS NULL GROUP BY 1, 2, 3, 4, 5"
+    )
+    conn.commit()
+    conn.close()
+
+
+def _insert(conn: sqlite3.Connection, batch: list) -> None:
+    conn.executemany(
+        "INSERT INTO transactions "
+        "(account_id, category_id, amount_minor, currency, dt, day_key, month_key, "
+        "transfer_group_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        batch,
+    )
+
+
+def _new_indexes():
+    return [idx for idx in Transaction.__table__.indexes if idx.name != "ix_transactions_id"]
+
+
+def _timed(fn) -> float:
+    samples = []
+    for _ in range(ARGS.repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+CASES = [
+    ("get_summary(month)", lambda: get_summary("month", BASE_DATE)),
+    ("get_summary(year)", lambda: get_summary("year", BASE_DATE)),
+    ("get_trends(month)", lambda: get_trends("month", BASE_DATE)),
+    ("get_trends(year)", lambda: get_trends("year", BASE_DATE)),
+    ("get_categories_summary(month)", lambda: get_categories_summary("month", BASE_DATE)),
+    ("get_income_categories_summary(year)", lambda: get_income_categories_summary("year", BASE_DATE)),
+    ("get_bundle(month)", lambda: get_bundle("month", BASE_DATE)),
+    ("get_bundle(year)", lambda: get_bundle("year", BASE_DATE)),
+    ("get_account_balance(1, RUB)", lambda: get_account_balance(1, "RUB")),
+]
+
+
+def _run_cases() -> dict:
+    return {name: _timed(fn) for name, fn in CASES}
+
+
+def main() -> None:
+    if os.path.exists(ARGS.db):
+        os.remove(ARGS.db)
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for idx in _new_indexes():
+            idx.drop(conn)
+
+    started = time.perf_counter()
+    _fill(ARGS.db, ARGS.rows)
+    print(f"filled {ARGS.rows} rows in {time.perf_counter() - started:.1f} s")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    before = _run_cases()
+
+    with engine.begin() as conn:
+        for idx in _new_indexes():
+            idx.create(conn)
+        conn.exec_driver_sql("ANALYZE")
+    after = _run_cases()
+
+    print(f"{'query':40} {'before, ms':>12} {'after, ms':>12} {'speedup':>9}")
+    for name, _ in CASES:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:40} {before[name]:12.1f} {after[name]:12.1f} {speedup:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Замер пути записи: сколько SQL-запросов и времени стоит одна операция
+создания / изменения / удаления через сервисный слой.
+
+    python bench_writes.py --rows 100000 --ops 2000 --writers 32
+
+Создаёт отдельную SQLite-базу (по умолчанию bench.db), заполняет её
+синтетическими транзакциями (чтобы индексы были реального размера)
+и печатает для каждой операции число запросов и медиану времени;
+каждая операция — отдельный commit, как в HTTP-запросе.
+В конце — пропускная способность --writers параллельных писателей
+add_income: каждый со своим commit и через очередь с групповым commit
+(services/write_queue.py).
+"""
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--writers", type=int, default=32)
+    return parser.parse_args()
+
+
+ARGS = _parse_args()
+# сервисы берут engine из DATABASE_URL, поэтому выставляем его до импорта
+os.environ["DATABASE_URL"] = f"sqlite:///{ARGS.db}"
+
+from db.base import Base, engine  # noqa: E402
+from db.instrumentation import track_queries  # noqa: E402
+from models import account, account_balance, balance_checkpoint, budget, category, daily_rollup, id_sequence, transaction, user  # noqa: E402,F401
+from services import accounts, categories, checkpoints  # noqa: E402
+from services import transactions as tx  # noqa: E402
+from services.write_queue import write_queue  # noqa: E402
+
+ACCOUNTS = 20
+CATEGORIES = 50
+START = datetime(2021, 1, 1)
+
+
+def _fill(rows: int) -> None:
+    for i in range(1, ACCOUNTS + 1):
+        accounts.create_account(f"acc {i}", "card")
+    for i in range(1, CATEGORIES + 1):
+        categories.create_category(f"cat {i}", "income" if i <= 5 else "expense")
+
+    rnd = random.Random(42)
+    span = 5 * 365 * 24 * 3600
+    for start in range(0, rows, tx.TRANSACTIONS_BULK_MAX_ITEMS):
+        items = []
+        for _ in range(min(tx.TRANSACTIONS_BULK_MAX_ITEMS, rows - start)):
+            cat = rnd.randint(1, CATEGORIES)
+            items.append(tx.NewTransaction(
+                kind="income" if cat <= 5 else "expense",
+                account_id=rnd.randint(1, ACCOUNTS),
+                amount_minor=rnd.randint(100, 500_000),
+                category_id=cat,
+                dt=START + timedelta(seconds=rnd.randrange(span)),
+            ))
+        tx.add_transactions_bulk(items)
+    # как при старте приложения: прошедшие месяцы закрыты, и запись
+    # задним числом обновляет balance_checkpoints
+    checkpoints.close_months()
+
+
+def _measure(fn, args_list: list) -> tuple[float, float]:
+    """(запросов на операцию, медиана мкс) по всем аргументам из списка."""
+    samples = []
+    queries = 0
+    for args in args_list:
+        with track_queries() as stats:
+            started = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - started) * 1e6)
+        queries += stats.count
+    return queries / len(args_list), statistics.median(samples)
+
+
+def _throughput(write, writers: int, ops: int) -> float:
+    """Операций в секунду у writers потоков, каждый делает ops // writers записей."""
+    per_writer = max(1, ops // writers)
+
+    def worker(w: int) -> None:
+        for i in range(per_writer):
+            write(w * per_writer + i)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return writers * per_writer / (time.perf_counter() - started)
+
+
+def main() -> None:
+    if os.path.exists(ARGS.db):
+        os.remove(ARGS.db)
+    Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    _fill(ARGS.rows)
+    print(f"filled {ARGS.rows} rows in {time.perf_counter() - started:.1f} s")
+
+    rnd = random.Random(7)
+    n = ARGS.ops
+    dts = [START + timedelta(minutes=rnd.randrange(5 * 365 * 24 * 60)) for _ in range(n)]
+    acc = [rnd.randint(1, ACCOUNTS) for _ in range(n)]
+    created: dict[str, list] = {}
+
+    def add_income(i):
+        created.setdefault("income", []).append(
+            tx.add_income(acc[i], 1, 1000 + i, dts[i], f"bench {i}").id
+        )
+
+    def add_expense(i):
+        created.setdefault("expense", []).append(
+            tx.add_expense(acc[i], 10, 1000 + i, dts[i], f"bench {i}").id
+        )
+
+    def add_transfer(i):
+        out, _ = tx.add_transfer(acc[i], acc[i] % ACCOUNTS + 1, 500 + i, dts[i])
+        created.setdefault("transfer", []).append(out.id)
+
+    def create_account(i):
+        created.setdefault("account", []).append(
+            accounts.create_account(f"bench {i}", "cash")["id"]
+        )
+
+    def create_category(i):
+        created.setdefault("category", []).append(
+            categories.create_category(f"bench {i}", "expense")["id"]
+        )
+
+    cases = [
+        ("add_income", add_income, range(n)),
+        ("add_expense", add_expense, range(n)),
+        ("add_transfer", add_transfer, range(n)),
+        ("update_transaction(amount)",
+         lambda i: tx.update_transaction(created["expense"][i], amount_minor=2000 + i), range(n)),
+        ("update_transaction(transfer)",
+         lambda i: tx.update_transaction(created["transfer"][i], description="upd"), range(n)),
+        ("delete_transaction", lambda i: tx.delete_transaction(created["income"][i]), range(n)),
+        ("delete_transaction(transfer)",
+         lambda i: tx.delete_transaction(created["transfer"][i]), range(n)),
+        ("create_account", create_account, range(n)),
+        ("update_account", lambda i: accounts.update_account(created["account"][i], name="x"), range(n)),
+        ("create_category", create_category, range(n)),
+        ("update_category",
+         lambda i: categories.update_category(created["category"][i], name="x"), range(n)),
+    ]
+
+    print(f"{'operation':32} {'queries':>8} {'median, us':>11}")
+    for name, fn, indices in cases:
+        queries, median = _measure(fn, [(i,) for i in indices])
+        print(f"{name:32} {queries:8.1f} {median:11.0f}")
+
+    def direct(i):
+        tx.add_income(acc[i % n], 1, 100 + i, dts[i % n], "direct")
+
+    def queued(i):
+        item = tx.NewTransaction("income", acc[i % n], 100 + i, 1, dt=dts[i % n], description="queued")
+        write_queue.submit(item).result()
+
+    write_queue.start()
+    try:
+        print(f"\n{ARGS.writers} writers, add_income, ops/s")
+        print(f"{'commit per operation':32} {_throughput(direct, ARGS.writers, n):8.0f}")
+        print(f"{'write queue (group commit)':32} {_throughput(queued, ARGS.writers, n):8.0f}")
+    finally:
+        write_queue.stop()
+    print(write_queue.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,17 @@ def main() -> None:
 
     # Порядок важен из‑за внешних ключей: сначала транзакции/бюджеты, потом справочники
     with engine.begin() as conn:
+        conn.execute(text("DELETE FROM account_balances;"))
+        conn.execute(text("DELETE FROM daily_rollups;"))
+        conn.execute(text("DELETE FROM balance_checkpoints;"))
         conn.execute(text("DELETE FROM transactions;"))
         conn.execute(text("DELETE FROM budgets;"))
+        conn.execute(text("DELETE FROM import_jobs;"))
+        conn.execute(text("DELETE FROM idempotency_keys;"))
+        conn.execute(text("DELETE FROM id_sequences;"))
+        conn.execute(text("DELETE FROM fx_rates;"))
         conn.execute(text("DELETE FROM accounts;"))
+        conn.execute(text("DELETE FROM category_closure;"))
         conn.execute(text("DELETE FROM categories;"))
 
     print("Done. All tables are empty.")
@@ -1,10 +1,19 @@
-from .base import Base, engine, SessionLocal
-from contextlib import contextmanager
+from .base import Base, engine, SessionLocal, async_engine, AsyncSessionLocal
+from contextlib import asynccontextmanager, contextmanager
 
 
 
 @contextmanager
-def session_scope():
+def session_scope(session=None):
+    """
+    Транзакция на время блока: commit при успехе, rollback при ошибке.
+    Если передана уже открытая сессия (например, сессия HTTP-запроса),
+    она используется как есть — commit/rollback/close остаются за владельцем.
+    """
+    if session is not None:
+        yield session
+        return
+
     session = SessionLocal()
     try:
         yield session
@@ -15,5 +24,23 @@ def session_scope():
     finally:
         session.close()
 
+
+@asynccontextmanager
+async def async_session_scope(session=None):
+    """Асинхронный аналог session_scope() поверх AsyncSession."""
+    if session is not None:
+        yield session
+        return
+
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
 def get_session():
     return SessionLocal()
\ No newline at end of file
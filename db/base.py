@@ -1,13 +1,142 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///myfinance.db"  # файл в корне проекта
+from .instrumentation import install_query_hooks
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # нужно для SQLite в однопоточном режиме
-)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///myfinance.db")  # файл в корне проекта
+# та же БД через асинхронный драйвер; по умолчанию выводится из DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Пул соединений (для файловой SQLite и серверных СУБД)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# PRAGMA, которые выставляются на каждом новом соединении SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+# отрицательное значение — размер в КиБ (здесь 64 МиБ на соединение)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY").upper()
+# внешние ключи проверяет сама SQLite: сервисы не делают SELECT на
+# существование счёта перед записью, а ловят нарушение FK
+SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "ON").upper()
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE_MODES = {"DEFAULT", "FILE", "MEMORY"}
+_ON_OFF = {"ON", "OFF"}
+
+
+def _sqlite_pragmas() -> list[str]:
+    """Список PRAGMA для нового соединения (значения проверяем, т.к. они из env)."""
+    if SQLITE_JOURNAL_MODE not in _JOURNAL_MODES:
+        raise ValueError(f"Unsupported SQLITE_JOURNAL_MODE: {SQLITE_JOURNAL_MODE}")
+    if SQLITE_SYNCHRONOUS not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}")
+    if SQLITE_TEMP_STORE not in _TEMP_STORE_MODES:
+        raise ValueError(f"Unsupported SQLITE_TEMP_STORE: {SQLITE_TEMP_STORE}")
+    if SQLITE_FOREIGN_KEYS not in _ON_OFF:
+        raise ValueError(f"Unsupported SQLITE_FOREIGN_KEYS: {SQLITE_FOREIGN_KEYS}")
+
+    return [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA temp_store = {SQLITE_TEMP_STORE}",
+        f"PRAGMA foreign_keys = {SQLITE_FOREIGN_KEYS}",
+    ]
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def install_sqlite_pragmas(engine: Engine) -> None:
+    """Вешает на engine хук, который настраивает каждое новое соединение SQLite."""
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def _engine_kwargs(url) -> dict:
+    kwargs: dict = {}
+
+    if url.get_backend_name() == "sqlite":
+        # соединения переиспользуются пулом в разных потоках FastAPI
+        kwargs["connect_args"] = {"check_same_thread": False}
+
+    if not _is_sqlite_memory(url):
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=url.get_backend_name() != "sqlite",
+        )
+
+    return kwargs
+
+
+def create_db_engine(database_url: str | None = None) -> Engine:
+    """
+    Создать engine по настройкам из окружения.
+    Для SQLite дополнительно включаются WAL, busy_timeout, кеш страниц и mmap,
+    чтобы читатели не блокировались писателем.
+    """
+    url = make_url(database_url or DATABASE_URL)
+    engine = create_engine(url, **_engine_kwargs(url))
+    install_query_hooks(engine)
+
+    if url.get_backend_name() == "sqlite":
+        install_sqlite_pragmas(engine)
+
+    return engine
+
+
+def _to_async_url(database_url: str):
+    """sqlite:///... -> sqlite+aiosqlite:///...; для других СУБД драйвер задаётся явно."""
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.get_driver_name() == "pysqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+def create_async_db_engine(database_url: str | None = None) -> AsyncEngine:
+    """Асинхронный engine с теми же настройками пула и PRAGMA, что и синхронный."""
+    url = make_url(database_url) if database_url else _to_async_url(DATABASE_URL)
+    async_engine = create_async_engine(url, **_engine_kwargs(url))
+    install_query_hooks(async_engine.sync_engine)
+
+    if url.get_backend_name() == "sqlite":
+        install_sqlite_pragmas(async_engine.sync_engine)
+
+    return async_engine
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: после commit атрибуты нельзя догрузить лениво в async-коде
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -0,0 +1,132 @@
+"""
+Учёт SQL-запросов: количество, суммарное время и самый медленный запрос
+в рамках одного HTTP-запроса (или любого блока track_queries()).
+"""
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# запросы дольше порога пишутся в лог медленных запросов
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+# необязательный файл для лога медленных запросов (иначе — общий логгер)
+SQL_SLOW_QUERY_LOG = os.getenv("SQL_SLOW_QUERY_LOG")
+# сколько запросов на один эндпоинт считаем нормой (0 — без ограничения)
+SQL_MAX_QUERIES_PER_REQUEST = int(os.getenv("SQL_MAX_QUERIES_PER_REQUEST", "0"))
+# строгий режим для тестов: превышение лимита — ошибка, а не предупреждение
+SQL_STRICT_QUERY_LIMIT = os.getenv("SQL_STRICT_QUERY_LIMIT", "0") == "1"
+
+logger = logging.getLogger("myfinance.sql")
+slow_logger = logging.getLogger("myfinance.sql.slow")
+
+if SQL_SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SQL_SLOW_QUERY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_logger.addHandler(_handler)
+    slow_logger.setLevel(logging.WARNING)
+
+
+class TooManyQueriesError(RuntimeError):
+    """Блок выполнил больше SQL-запросов, чем разрешено (строгий режим)."""
+
+
+@dataclass
+class QueryStats:
+    label: str = ""
+    max_queries: Optional[int] = None
+    count: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_statement: Optional[str] = None
+    # внешний блок track_queries(): запросы учитываются и в нём
+    parent: Optional["QueryStats"] = None
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+        if self.parent is not None:
+            self.parent.record(statement, elapsed_ms)
+
+        if self.max_queries is not None and self.count > self.max_queries:
+            raise TooManyQueriesError(
+                f"{self.label or 'block'} executed {self.count} queries "
+                f"(limit {self.max_queries}); last: {_shorten(statement)}"
+            )
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing."""
+        return (
+            f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_ms:.2f}"
+        )
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "sql_query_stats",
+    default=None,
+)
+
+
+def _shorten(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+@contextmanager
+def track_queries(
+    label: str = "",
+    max_queries: Optional[int] = None,
+) -> Iterator[QueryStats]:
+    """
+    Считать SQL-запросы внутри блока.
+    Удобно в тестах: with track_queries(max_queries=3): client.get(...)
+    """
+    stats = QueryStats(
+        label=label,
+        max_queries=max_queries,
+        parent=_current_stats.get(),
+    )
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def install_query_hooks(engine: Engine) -> None:
+    """Вешает на engine хуки замера каждого выполненного statement."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        elapsed_ms = (perf_counter() - started) * 1000
+
+        stats = _current_stats.get()
+        if elapsed_ms >= SQL_SLOW_QUERY_MS:
+            slow_logger.warning(
+                "slow query %.1f ms [%s]: %s",
+                elapsed_ms,
+                stats.label if stats is not None else "-",
+                _shorten(statement),
+            )
+
+        if stats is not None:
+            stats.record(statement, elapsed_ms)
@@ -1,4 +1,4 @@
-import { apiGet, apiPost, apiPatch, apiDelete } from "./client";
+import { apiGet, apiPost, apiPatch, apiDelete, buildQuery } from "./client";
 
 export interface Account {
   id: number;
@@ -8,6 +8,9 @@ export interface Account {
   is_active: boolean;
   card_number?: string | null;
   created_at: string | null;
+  // только при getAccounts(true): баланс в валюте счёта и по всем валютам
+  balance_minor?: number | null;
+  balances?: AccountBalance[] | null;
 }
 
 export interface AccountCreate {
@@ -31,8 +34,14 @@ export interface AccountBalance {
   currency: string;
 }
 
-export function getAccounts(): Promise<Account[]> {
-  return apiGet<Account[]>("/accounts");
+export function getAccounts(includeBalance = false): Promise<Account[]> {
+  return apiGet<Account[]>(
+    `/accounts${buildQuery({ include_balance: includeBalance || undefined })}`
+  );
+}
+
+export function getAccountBalances(): Promise<AccountBalance[]> {
+  return apiGet<AccountBalance[]>("/accounts/balances");
 }
 
 export function createAccount(data: AccountCreate): Promise<Account> {
@@ -10,6 +10,19 @@ function buildAuthHeader(): HeadersInit {
   return { Authorization: `Bearer ${token}` };
 }
 
+export function buildQuery(
+  params: Record<string, string | number | boolean | undefined>
+): string {
+  const searchParams = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined && value !== null) {
+      searchParams.append(key, String(value));
+    }
+  });
+  const qs = searchParams.toString();
+  return qs ? `?${qs}` : "";
+}
+
 export async function apiGet<T>(path: string): Promise<T> {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     headers: { ...buildAuthHeader() },
@@ -22,13 +35,15 @@ export async function apiGet<T>(path: string): Promise<T> {
 
 export async function apiPost<TReq, TRes>(
   path: string,
-  body: TReq
+  body: TReq,
+  headers: Record<string, string> = {}
 ): Promise<TRes> {
   const res = await fetch(`${API_BASE_URL}${path}`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
       ...buildAuthHeader(),
+      ...headers,
     },
     body: JSON.stringify(body),
   });
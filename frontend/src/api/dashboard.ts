@@ -1,8 +1,11 @@
 // frontend/src/api/dashboard.ts
-import { apiGet } from "./client";
+import { apiGet, buildQuery } from "./client";
 
 export type PeriodType = "day" | "week" | "month" | "quarter" | "year";
 
+// leaf — категории как есть, parent — свёрнутые к верхнему уровню
+export type CategoryRollup = "leaf" | "parent";
+
 export interface DashboardSummary {
   period: PeriodType;
   date_from: string; // ISO yyyy-mm-dd
@@ -44,23 +47,28 @@ export interface DashboardCategories {
   categories: DashboardCategoryItem[];
 }
 
-function buildQuery(params: Record<string, string | number | undefined>): string {
-  const searchParams = new URLSearchParams();
-  Object.entries(params).forEach(([key, value]) => {
-    if (value !== undefined && value !== null) {
-      searchParams.append(key, String(value));
-    }
-  });
-  const qs = searchParams.toString();
-  return qs ? `?${qs}` : "";
+export interface DashboardBundle {
+  summary: DashboardSummary;
+  trends: DashboardTrends;
+  categories: DashboardCategories; // расходы
+  income_categories: DashboardCategories; // доходы
 }
 
+// reportCurrency: операции во всех валютах, пересчитанные в неё по курсам
+// GET /fx-rates (currency тогда не учитывается).
+// categorySubtree: только операции категории и её потомков.
 export async function getDashboardSummary(
   period: PeriodType,
   baseDate: string,
   currency = "RUB",
+  reportCurrency?: string,
+  categorySubtree?: number,
 ): Promise<DashboardSummary> {
-  const qs = buildQuery({ period, base_date: baseDate, currency });
+  const qs = buildQuery({
+    period, base_date: baseDate, currency,
+    report_currency: reportCurrency,
+    category_subtree: categorySubtree,
+  });
   return apiGet<DashboardSummary>(`/dashboard/summary${qs}`);
 }
 
@@ -68,8 +76,14 @@ export async function getDashboardTrends(
   period: PeriodType,
   baseDate: string,
   currency = "RUB",
+  reportCurrency?: string,
+  categorySubtree?: number,
 ): Promise<DashboardTrends> {
-  const qs = buildQuery({ period, base_date: baseDate, currency });
+  const qs = buildQuery({
+    period, base_date: baseDate, currency,
+    report_currency: reportCurrency,
+    category_subtree: categorySubtree,
+  });
   return apiGet<DashboardTrends>(`/dashboard/trends${qs}`);
 }
 
@@ -78,8 +92,16 @@ export async function getDashboardCategories(
   baseDate: string,
   limit = 5,
   currency = "RUB",
+  reportCurrency?: string,
+  rollup: CategoryRollup = "leaf",
+  categorySubtree?: number,
 ): Promise<DashboardCategories> {
-  const qs = buildQuery({ period, base_date: baseDate, limit, currency });
+  const qs = buildQuery({
+    period, base_date: baseDate, limit, currency,
+    report_currency: reportCurrency,
+    rollup,
+    category_subtree: categorySubtree,
+  });
   return apiGet<DashboardCategories>(`/dashboard/categories${qs}`);
 }
 
@@ -88,7 +110,34 @@ export async function getDashboardIncomeCategories(
   baseDate: string,
   limit = 5,
   currency = "RUB",
+  reportCurrency?: string,
+  rollup: CategoryRollup = "leaf",
+  categorySubtree?: number,
 ): Promise<DashboardCategories> {
-  const qs = buildQuery({ period, base_date: baseDate, limit, currency });
+  const qs = buildQuery({
+    period, base_date: baseDate, limit, currency,
+    report_currency: reportCurrency,
+    rollup,
+    category_subtree: categorySubtree,
+  });
   return apiGet<DashboardCategories>(`/dashboard/income_categories${qs}`);
 }
+
+// Все виджеты дашборда одним запросом
+export async function getDashboardBundle(
+  period: PeriodType,
+  baseDate: string,
+  limit = 5,
+  currency = "RUB",
+  reportCurrency?: string,
+  rollup: CategoryRollup = "leaf",
+  categorySubtree?: number,
+): Promise<DashboardBundle> {
+  const qs = buildQuery({
+    period, base_date: baseDate, limit, currency,
+    report_currency: reportCurrency,
+    rollup,
+    category_subtree: categorySubtree,
+  });
+  return apiGet<DashboardBundle>(`/dashboard/bundle${qs}`);
+}
@@ -1,4 +1,4 @@
-import { apiGet, apiPost, apiPatch, apiDelete } from "./client.ts";
+import { apiGet, apiPost, apiPatch, apiDelete, buildQuery } from "./client.ts";
 
 export interface Transaction {
   id: number;
@@ -9,6 +9,7 @@ export interface Transaction {
   dt: string;
   description: string | null;
   kind: "income" | "expense" | "transfer";
+  running_balance_minor?: number | null; // только при running_balance
 }
 
 export interface TransactionCreate {
@@ -28,14 +29,50 @@ export interface TransactionUpdate {
   amount_minor?: number; // новая сумма в копейках
 }
 
-export async function getTransactions(): Promise<Transaction[]> {
-  return apiGet<Transaction[]>("/transactions");
+export interface TransactionFilters {
+  account_id?: number;
+  category_id?: number;
+  kind?: "income" | "expense" | "transfer";
+  currency?: string;
+  date_from?: string; // ISO yyyy-mm-dd, включительно
+  date_to?: string;
+  amount_min?: number; // по модулю, в копейках
+  amount_max?: number;
 }
 
+export interface TransactionPage {
+  items: Transaction[];
+  next_cursor: string | null; // null — это последняя страница
+  total: number | null; // только при include_total
+  total_exact: boolean | null;
+}
+
+export async function getTransactions(
+  filters: TransactionFilters = {},
+  cursor?: string,
+  limit = 50,
+  includeTotal = false,
+  runningBalance = false // баланс после каждой операции, нужен filters.account_id
+): Promise<TransactionPage> {
+  const query = buildQuery({
+    ...filters,
+    cursor,
+    limit,
+    include_total: includeTotal || undefined,
+    running_balance: runningBalance || undefined,
+  });
+  return apiGet<TransactionPage>(`/transactions${query}`);
+}
+
+// Ключ генерируется на одну отправку формы: при повторе того же запроса
+// сервер вернёт первый ответ, а не создаст операцию второй раз
 export async function createTransaction(
-  data: TransactionCreate
+  data: TransactionCreate,
+  idempotencyKey: string = crypto.randomUUID()
 ): Promise<Transaction> {
-  return apiPost<TransactionCreate, Transaction>("/transactions", data);
+  return apiPost<TransactionCreate, Transaction>("/transactions", data, {
+    "Idempotency-Key": idempotencyKey,
+  });
 }
 
 export async function updateTransaction(
@@ -3,28 +3,25 @@ import MirLogo from "../../assets/Mir-logo.SVG.svg";
 import {
     getAccounts,
     deleteAccount,
-    getAccountBalance,
 } from "../../api/accounts";
-import type {Account, AccountBalance} from "../../api/accounts";
+import type {Account} from "../../api/accounts";
 
 import CreateAccountModal from "./CreateAccountModal";
 import EditAccountModal from "./EditAccountModal";
 
 const AccountsPage: React.FC = () => {
     const [accounts, setAccounts] = useState<Account[]>([]);
-    const [balances, setBalances] = useState<Record<number, AccountBalance>>({});
     const [loading, setLoading] = useState(true);
-    const [balancesLoading, setBalancesLoading] = useState(false);
     const [error, setError] = useState<string | null>(null);
 
     const [isCreateOpen, setIsCreateOpen] = useState(false);
     const [isEditOpen, setIsEditOpen] = useState(false);
     const [accountToEdit, setAccountToEdit] = useState<Account | null>(null);
 
-    // загрузка счетов
+    // счета вместе с балансами — один запрос, сколько бы ни было счетов
     useEffect(() => {
         setLoading(true);
-        getAccounts()
+        getAccounts(true)
             .then((data) => setAccounts(data as Account[]))
             .catch((e: unknown) => {
                 if (e instanceof Error) {
@@ -36,35 +33,24 @@ const AccountsPage: React.FC = () => {
             .finally(() => setLoading(false));
     }, []);
 
-    // загрузка балансов после получения счетов
-    useEffect(() => {
-        if (!accounts.length) return;
-
-        setBalancesLoading(true);
-        (async () => {
-            try {
-                const results = await Promise.all(
-                    accounts.map((acc) => getAccountBalance(acc.id))
-                );
-                const map: Record<number, AccountBalance> = {};
-                for (const b of results) {
-                    map[b.account_id] = b;
-                }
-                setBalances(map);
-            } catch (e) {
-                console.error("Failed to load balances", e);
-            } finally {
-                setBalancesLoading(false);
-            }
-        })();
-    }, [accounts]);
-
     const handleCreated = (acc: Account) => {
-        setAccounts((prev) => [...prev, acc]);
+        setAccounts((prev) => [...prev, {...acc, balance_minor: 0, balances: []}]);
     };
 
     const handleUpdated = (acc: Account) => {
-        setAccounts((prev) => prev.map((a) => (a.id === acc.id ? acc : a)));
+        // PATCH возвращает счёт без баланса — берём уже загруженный
+        setAccounts((prev) =>
+            prev.map((a) =>
+                a.id === acc.id
+                    ? {
+                        ...acc,
+                        balances: a.balances,
+                        balance_minor:
+                            a.balances?.find((b) => b.currency === acc.currency)?.balance_minor ?? 0,
+                    }
+                    : a
+            )
+        );
     };
 
     const openEdit = (acc: Account) => {
@@ -140,13 +126,10 @@ const AccountsPage: React.FC = () => {
             ) : (
                 <div className="space-y-3">
                     {accounts.map((acc) => {
-                        const balance = balances[acc.id];
                         const balanceText =
-                            balance && !balancesLoading
-                                ? formatMoney(balance.balance_minor, balance.currency)
-                                : balancesLoading
-                                    ? "Загружаю баланс..."
-                                    : "—";
+                            acc.balance_minor != null
+                                ? formatMoney(acc.balance_minor, acc.currency)
+                                : "—";
 
                         return (
                             <div
@@ -1,11 +1,6 @@
 ﻿import React, { useEffect, useState } from "react";
 import { TopCategoriesTable } from "../../components/dashboard/TopCategoriesTable";
-import {
-  getDashboardSummary,
-  getDashboardTrends,
-  getDashboardCategories,
-  getDashboardIncomeCategories,
-} from "../../api/dashboard";
+import { getDashboardBundle } from "../../api/dashboard";
 import { DonutChart } from "../../components/dashboard/DonutChart";
 import { TrendChart } from "../../components/dashboard/TrendChart";
 import type {
@@ -52,21 +47,16 @@ const DashboardPage: React.FC = () => {
         setLoading(true);
         setError(null);
 
-        const [s, t, exp, inc] = await Promise.all([
-          getDashboardSummary(period, baseDate),
-          getDashboardTrends(period, baseDate),
-          getDashboardCategories(period, baseDate, 5),
-          getDashboardIncomeCategories(period, baseDate, 5),
-        ]);
+        const bundle = await getDashboardBundle(period, baseDate, 5);
 
         if (cancelled) {
           return;
         }
 
-        setSummary(s);
-        setTrends(t);
-        setExpenseCategories(exp);
-        setIncomeCategories(inc);
+        setSummary(bundle.summary);
+        setTrends(bundle.trends);
+        setExpenseCategories(bundle.categories);
+        setIncomeCategories(bundle.income_categories);
       } catch (e) {
         if (cancelled) {
           return;
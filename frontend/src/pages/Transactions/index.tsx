@@ -9,6 +9,8 @@ import {
 import { getAccounts, type Account } from "../../api/accounts";
 import { getCategories, type Category } from "../../api/categories";
 
+const PAGE_SIZE = 50;
+
 const TransactionsPage: React.FC = () => {
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [editTx, setEditTx] = useState<Transaction | null>(null);
@@ -16,6 +18,10 @@ const TransactionsPage: React.FC = () => {
   const [accounts, setAccounts] = useState<Account[]>([]);
   const [categories, setCategories] = useState<Category[]>([]);
   const [loading, setLoading] = useState(false);
+  // keyset-пагинация: курсор следующей страницы и общее число операций
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [total, setTotal] = useState<number | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // для подтверждения удаления
   const [deletingTx, setDeletingTx] = useState<Transaction | null>(null);
@@ -24,12 +30,14 @@ const TransactionsPage: React.FC = () => {
   const fetchAll = async () => {
     try {
       setLoading(true);
-      const [txs, accs, cats] = await Promise.all([
-        getTransactions(),
+      const [page, accs, cats] = await Promise.all([
+        getTransactions({}, undefined, PAGE_SIZE, true),
         getAccounts(),
         getCategories(),
       ]);
-      setItems(txs);
+      setItems(page.items);
+      setNextCursor(page.next_cursor);
+      setTotal(page.total);
       setAccounts(accs);
       setCategories(cats);
     } catch (e) {
@@ -43,6 +51,20 @@ const TransactionsPage: React.FC = () => {
     fetchAll();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await getTransactions({}, nextCursor, PAGE_SIZE);
+      setItems((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleTransactionSaved = () => {
     setEditTx(null);
     fetchAll();
@@ -65,6 +87,7 @@ const TransactionsPage: React.FC = () => {
     try {
       await deleteTransaction(deletingTx.id);
       setItems((prev) => prev.filter((t) => t.id !== deletingTx.id));
+      setTotal((prev) => (prev === null ? prev : prev - 1));
       closeDeleteModal();
     } catch (e) {
       console.error(e);
@@ -86,7 +109,14 @@ const TransactionsPage: React.FC = () => {
   return (
     <div className="flex flex-col h-full">
       <div className="flex items-center justify-between mb-4">
-        <h1 className="text-xl font-semibold">Транзакции</h1>
+        <h1 className="text-xl font-semibold">
+          Транзакции
+          {total !== null && (
+            <span className="ml-2 text-sm font-normal text-gray-400">
+              {total}
+            </span>
+          )}
+        </h1>
         <button
           onClick={handleAddClick}
           className="px-4 py-2 rounded-lg bg-purple-500 text-white text-sm font-medium"
@@ -162,6 +192,19 @@ const TransactionsPage: React.FC = () => {
             })}
           </ul>
         )}
+
+        {!loading && nextCursor && (
+          <div className="pt-3 flex justify-center">
+            <button
+              type="button"
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="text-sm px-4 py-2 rounded-lg border border-gray-200 text-gray-600 hover:border-purple-400 hover:text-purple-600 disabled:opacity-50"
+            >
+              {loadingMore ? "Загрузка..." : "Показать ещё"}
+            </button>
+          </div>
+        )}
       </div>
 
       <AddTransactionModal
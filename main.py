@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+
+import anyio
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
@@ -6,18 +9,44 @@ from api.accounts import router as accounts_router
 from api.auth import router as auth_router, get_current_user
 from api.categories import router as categories_router
 from api.dashboard import router as dashboard_router
+from api.fx import router as fx_router
+from api.imports import router as imports_router
+from api.middleware import sql_metrics_middleware
 from api.transactions import router as transactions_router
 from db import session_scope
+from db.base import engine
 from models.account import Account
 from models.budget import Budget
 from models.category import Category
 from models.transaction import Transaction
+from services import columnar
+from services.checkpoints import close_months
+from services.idempotency import purge_expired_keys
+from services.imports import mark_interrupted_imports
+from services.write_queue import WRITE_QUEUE_ENABLED, write_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # колоночный движок (COLUMNAR_ENGINE=1) загружаем до первого запроса
+    await anyio.to_thread.run_sync(columnar.load, engine)
+    # импорты, шедшие при остановке процесса, можно продолжить через /resume
+    await anyio.to_thread.run_sync(mark_interrupted_imports)
+    await anyio.to_thread.run_sync(purge_expired_keys)
+    # балансы на конец прошедших месяцев (после миграции — первичное заполнение)
+    await anyio.to_thread.run_sync(close_months)
+    if WRITE_QUEUE_ENABLED:
+        write_queue.start()
+    yield
+    # дописать принятые операции до остановки процесса
+    await anyio.to_thread.run_sync(write_queue.stop)
 
 
 app = FastAPI(
     title="myFinance API",
     description="Черновой API для отладки и работы через сервисный слой",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 origins = [
@@ -25,12 +54,15 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+app.middleware("http")(sql_metrics_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Query-Count"],
 )
 
 app.include_router(auth_router)
@@ -38,6 +70,8 @@ app.include_router(accounts_router, dependencies=[Depends(get_current_user)])
 app.include_router(categories_router, dependencies=[Depends(get_current_user)])
 app.include_router(transactions_router, dependencies=[Depends(get_current_user)])
 app.include_router(dashboard_router, dependencies=[Depends(get_current_user)])
+app.include_router(imports_router, dependencies=[Depends(get_current_user)])
+app.include_router(fx_router, dependencies=[Depends(get_current_user)])
 
 templates = Jinja2Templates(directory="templates")
 
@@ -0,0 +1,157 @@
+"""
+Служебные команды обслуживания базы.
+
+    python manage.py rebuild-balances   # пересчитать account_balances
+    python manage.py verify-balances    # сверить account_balances с transactions
+    python manage.py rebuild-rollups    # пересчитать daily_rollups (backfill)
+    python manage.py verify-rollups     # сверить daily_rollups с transactions
+    python manage.py rebuild-checkpoints  # пересчитать balance_checkpoints
+    python manage.py verify-checkpoints   # сверить balance_checkpoints с transactions
+    python manage.py rebuild-category-closure  # пересчитать category_closure
+    python manage.py verify-category-closure   # сверить category_closure с parent_id
+"""
+import argparse
+import sys
+
+from db import session_scope
+from services.balances import rebuild_account_balances, verify_account_balances
+from services.categories import rebuild_category_closure, verify_category_closure
+from services.checkpoints import rebuild_balance_checkpoints, verify_balance_checkpoints
+from services.rollups import rebuild_daily_rollups, verify_daily_rollups
+
+
+def cmd_rebuild_balances(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        rows = rebuild_account_balances(session)
+    print(f"account_balances rebuilt: {rows} rows")
+    return 0
+
+
+def cmd_verify_balances(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        mismatches = verify_account_balances(session)
+
+    if not mismatches:
+        print("account_balances OK")
+        return 0
+
+    for m in mismatches:
+        print(
+            f"account {m['account_id']} {m['currency']}: "
+            f"stored {m['stored_balance_minor']} ({m['stored_tx_count']} tx), "
+            f"expected {m['expected_balance_minor']} ({m['expected_tx_count']} tx)"
+        )
+    print(f"{len(mismatches)} mismatches; run: python manage.py rebuild-balances")
+    return 1
+
+
+def cmd_rebuild_rollups(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        rows = rebuild_daily_rollups(session)
+    print(f"daily_rollups rebuilt: {rows} rows")
+    return 0
+
+
+def cmd_verify_rollups(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        mismatches = verify_daily_rollups(session)
+
+    if not mismatches:
+        print("daily_rollups OK")
+        return 0
+
+    for m in mismatches:
+        print(
+            f"{m['day_key']} {m['currency']} category {m['category_id']} sign {m['sign']}: "
+            f"stored {m['stored_amount_minor']} ({m['stored_tx_count']} tx), "
+            f"expected {m['expected_amount_minor']} ({m['expected_tx_count']} tx)"
+        )
+    print(f"{len(mismatches)} mismatches; run: python manage.py rebuild-rollups")
+    return 1
+
+
+def cmd_rebuild_checkpoints(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        rows = rebuild_balance_checkpoints(session)
+    print(f"balance_checkpoints rebuilt: {rows} rows")
+    return 0
+
+
+def cmd_verify_checkpoints(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        mismatches = verify_balance_checkpoints(session)
+
+    if not mismatches:
+        print("balance_checkpoints OK")
+        return 0
+
+    for m in mismatches:
+        print(
+            f"account {m['account_id']} {m['currency']} {m['month_key']}: "
+            f"stored {m['stored_balance_minor']}, expected {m['expected_balance_minor']}"
+        )
+    print(f"{len(mismatches)} mismatches; run: python manage.py rebuild-checkpoints")
+    return 1
+
+
+def cmd_rebuild_category_closure(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        rows = rebuild_category_closure(session)
+    print(f"category_closure rebuilt: {rows} rows")
+    return 0
+
+
+def cmd_verify_category_closure(args: argparse.Namespace) -> int:
+    with session_scope() as session:
+        mismatches = verify_category_closure(session)
+
+    if not mismatches:
+        print("category_closure OK")
+        return 0
+
+    for m in mismatches:
+        print(
+            f"{m['ancestor_id']} -> {m['descendant_id']}: "
+            f"stored depth {m['stored_depth']}, expected {m['expected_depth']}"
+        )
+    print(f"{len(mismatches)} mismatches; run: python manage.py rebuild-category-closure")
+    return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("rebuild-balances", help="пересчитать account_balances").set_defaults(
+        func=cmd_rebuild_balances,
+    )
+    sub.add_parser("verify-balances", help="сверить account_balances").set_defaults(
+        func=cmd_verify_balances,
+    )
+    sub.add_parser("rebuild-rollups", help="пересчитать daily_rollups").set_defaults(
+        func=cmd_rebuild_rollups,
+    )
+    sub.add_parser("verify-rollups", help="сверить daily_rollups").set_defaults(
+        func=cmd_verify_rollups,
+    )
+
+    sub.add_parser("rebuild-checkpoints", help="пересчитать balance_checkpoints").set_defaults(
+        func=cmd_rebuild_checkpoints,
+    )
+    sub.add_parser("verify-checkpoints", help="сверить balance_checkpoints").set_defaults(
+        func=cmd_verify_checkpoints,
+    )
+
+    sub.add_parser(
+        "rebuild-category-closure", help="пересчитать category_closure",
+    ).set_defaults(func=cmd_rebuild_category_closure)
+    sub.add_parser(
+        "verify-category-closure", help="сверить category_closure",
+    ).set_defaults(func=cmd_verify_category_closure)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,11 +9,13 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(BASE_DIR))
 
-from db.base import Base, engine
-from models import account, category, transaction, budget  # noqa: F401
+from db.base import Base, engine, DATABASE_URL
+from models import account, account_balance, category, daily_rollup, transaction, budget, import_job, idempotency_key, id_sequence, balance_checkpoint, fx_rate, category_closure  # noqa: F401
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
+# миграции применяем к той же БД, что и приложение (DATABASE_URL из окружения)
+config.set_main_option("sqlalchemy.url", DATABASE_URL)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,44 @@
+"""add account_balances
+
+Revision ID: 5b8e1d3f7c22
+Revises: c41f7a9e2d10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1d3f7c22'
+down_revision: Union[str, Sequence[str], None] = 'c41f7a9e2d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "account_balances",
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("balance_minor", sa.Integer(), nullable=False),
+        sa.Column("tx_count", sa.Integer(), nullable=False),
+        sa.Column("last_tx_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["account_id"], ["accounts.id"]),
+        sa.PrimaryKeyConstraint("account_id", "currency"),
+    )
+    # заполняем по уже существующим транзакциям
+    op.execute(
+        """
+        INSERT INTO account_balances (account_id, currency, balance_minor, tx_count, last_tx_id)
+        SELECT account_id, currency, SUM(amount_minor), COUNT(*), MAX(id)
+        FROM transactions
+        GROUP BY account_id, currency
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("account_balances")
@@ -0,0 +1,56 @@
+"""add daily_rollups
+
+Revision ID: 7d2a9c4e1f35
+Revises: 5b8e1d3f7c22
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2a9c4e1f35'
+down_revision: Union[str, Sequence[str], None] = '5b8e1d3f7c22'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_rollups",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("sign", sa.SmallInteger(), nullable=False),
+        sa.Column("amount_minor", sa.Integer(), nullable=False),
+        sa.Column("tx_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "currency", "category_id", "sign"),
+    )
+    op.create_index(
+        "ix_daily_rollups_currency_day",
+        "daily_rollups",
+        ["currency", "day"],
+    )
+    # заполняем по уже существующим транзакциям (переводы не входят)
+    op.execute(
+        """
+        INSERT INTO daily_rollups (day, currency, category_id, sign, amount_minor, tx_count)
+        SELECT date(dt),
+               currency,
+               COALESCE(category_id, 0),
+               CASE WHEN amount_minor > 0 THEN 1 ELSE -1 END,
+               SUM(ABS(amount_minor)),
+               COUNT(*)
+        FROM transactions
+        WHERE transfer_group_id IS NULL
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_daily_rollups_currency_day", table_name="daily_rollups")
+    op.drop_table("daily_rollups")
@@ -0,0 +1,50 @@
+"""add transaction list indexes
+
+Revision ID: a8f4c2d6e1b7
+Revises: e3b6f1a8c904
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8f4c2d6e1b7'
+down_revision: Union[str, Sequence[str], None] = 'e3b6f1a8c904'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keyset-пагинация GET /transactions по (dt, id)
+    op.create_index("ix_transactions_dt", "transactions", ["dt"], unique=False)
+    op.create_index(
+        "ix_transactions_account_dt",
+        "transactions",
+        ["account_id", "dt"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactions_currency_dt",
+        "transactions",
+        ["currency", "dt"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactions_transfer_dt",
+        "transactions",
+        ["dt"],
+        unique=False,
+        sqlite_where=sa.text("transfer_group_id IS NOT NULL"),
+    )
+    op.execute("ANALYZE transactions")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_transfer_dt", table_name="transactions")
+    op.drop_index("ix_transactions_currency_dt", table_name="transactions")
+    op.drop_index("ix_transactions_account_dt", table_name="transactions")
+    op.drop_index("ix_transactions_dt", table_name="transactions")
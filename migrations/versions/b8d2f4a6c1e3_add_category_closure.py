@@ -0,0 +1,55 @@
+"""add category_closure
+
+Revision ID: b8d2f4a6c1e3
+Revises: a3c5e7f9b2d4
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f4a6c1e3'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e7f9b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "category_closure",
+        sa.Column("ancestor_id", sa.Integer(), nullable=False),
+        sa.Column("descendant_id", sa.Integer(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor_id"], ["categories.id"]),
+        sa.ForeignKeyConstraint(["descendant_id"], ["categories.id"]),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+        sqlite_with_rowid=False,
+    )
+    op.create_index(
+        "ix_category_closure_descendant_id",
+        "category_closure",
+        ["descendant_id", "depth"],
+        unique=False,
+    )
+    # заполняем по существующему дереву (parent_id)
+    op.execute(
+        """
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT tree.ancestor_id, c.id, tree.depth + 1
+            FROM tree JOIN categories AS c ON c.parent_id = tree.descendant_id
+        )
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM tree
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_category_closure_descendant_id", table_name="category_closure")
+    op.drop_table("category_closure")
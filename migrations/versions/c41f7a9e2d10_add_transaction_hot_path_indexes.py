@@ -0,0 +1,56 @@
+"""add transaction hot path indexes
+
+Revision ID: c41f7a9e2d10
+Revises: 9f3d2c0e6b1a
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a9e2d10'
+down_revision: Union[str, Sequence[str], None] = '9f3d2c0e6b1a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_transactions_currency_dt_no_transfer",
+        "transactions",
+        ["currency", "dt", "amount_minor", "category_id"],
+        unique=False,
+        sqlite_where=sa.text("transfer_group_id IS NULL"),
+    )
+    op.create_index(
+        "ix_transactions_account_currency_amount",
+        "transactions",
+        ["account_id", "currency", "amount_minor"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactions_category_dt",
+        "transactions",
+        ["category_id", "dt"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactions_transfer_group_id",
+        "transactions",
+        ["transfer_group_id"],
+        unique=False,
+        sqlite_where=sa.text("transfer_group_id IS NOT NULL"),
+    )
+    # обновляем статистику, чтобы планировщик SQLite сразу выбрал новые индексы
+    op.execute("ANALYZE transactions")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_transfer_group_id", table_name="transactions")
+    op.drop_index("ix_transactions_category_dt", table_name="transactions")
+    op.drop_index("ix_transactions_account_currency_amount", table_name="transactions")
+    op.drop_index("ix_transactions_currency_dt_no_transfer", table_name="transactions")
@@ -0,0 +1,87 @@
+"""add transaction fingerprints for duplicate detection
+
+Revision ID: c9e1f4a7b2d8
+Revises: b5d7e9f1a3c6
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+import hashlib
+import re
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1f4a7b2d8'
+down_revision: Union[str, Sequence[str], None] = 'b5d7e9f1a3c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 10000
+
+# Копия normalize_description / transaction_fingerprint из models.transaction
+# на момент этой ревизии: миграция не должна зависеть от текущего кода
+# приложения, иначе после его изменения повторный прогон даст другие
+# отпечатки, чем при первом.
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _fingerprint(
+    account_id: int,
+    amount_minor: int,
+    day_key: int,
+    description: Optional[str],
+) -> str:
+    normalized = _NON_WORD.sub(" ", (description or "").casefold()).strip()
+    raw = f"{account_id}|{amount_minor}|{day_key}|{normalized}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("fingerprint", sa.String(length=16), nullable=True))
+    op.add_column("transactions", sa.Column("duplicate_of_id", sa.Integer(), nullable=True))
+    op.add_column(
+        "import_jobs",
+        sa.Column("on_duplicate", sa.String(length=8), nullable=False, server_default="reject"),
+    )
+
+    # нормализация описания (casefold, юникод) в SQLite не выражается —
+    # отпечатки существующих операций считаем в Python пачками по id
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, account_id, amount_minor, day_key, description "
+                "FROM transactions WHERE id > :last ORDER BY id LIMIT :n"
+            ),
+            {"last": last_id, "n": BATCH},
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE transactions SET fingerprint = :fp WHERE id = :id"),
+            [
+                {"id": r.id, "fp": _fingerprint(r.account_id, r.amount_minor, r.day_key, r.description)}
+                for r in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+    op.create_index("ix_transactions_fingerprint", "transactions", ["fingerprint"])
+    op.create_index(
+        "ix_transactions_account_amount_dt",
+        "transactions",
+        ["account_id", "amount_minor", "dt"],
+    )
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_account_amount_dt", table_name="transactions")
+    op.drop_index("ix_transactions_fingerprint", table_name="transactions")
+    op.drop_column("import_jobs", "on_duplicate")
+    op.drop_column("transactions", "duplicate_of_id")
+    op.drop_column("transactions", "fingerprint")
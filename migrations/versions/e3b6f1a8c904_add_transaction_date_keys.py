@@ -0,0 +1,133 @@
+"""add day_key/month_key to transactions and daily_rollups
+
+Revision ID: e3b6f1a8c904
+Revises: 7d2a9c4e1f35
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b6f1a8c904'
+down_revision: Union[str, Sequence[str], None] = '7d2a9c4e1f35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite добавляет NOT NULL колонку только с DEFAULT; сразу после
+    # добавления заполняем реальными значениями из dt
+    op.add_column(
+        "transactions",
+        sa.Column("day_key", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "transactions",
+        sa.Column("month_key", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        UPDATE transactions
+        SET day_key = CAST(strftime('%Y%m%d', dt) AS INTEGER),
+            month_key = CAST(strftime('%Y%m', dt) AS INTEGER)
+        """
+    )
+    op.create_index(
+        "ix_transactions_currency_day_key",
+        "transactions",
+        ["currency", "day_key"],
+        sqlite_where=sa.text("transfer_group_id IS NULL"),
+    )
+    op.create_index(
+        "ix_transactions_currency_month_key",
+        "transactions",
+        ["currency", "month_key"],
+        sqlite_where=sa.text("transfer_group_id IS NULL"),
+    )
+
+    # daily_rollups переводим с колонки day (DATE) на ключи;
+    # таблица производная, поэтому проще пересоздать и заполнить заново
+    op.drop_index("ix_daily_rollups_currency_day", table_name="daily_rollups")
+    op.drop_table("daily_rollups")
+    op.create_table(
+        "daily_rollups",
+        sa.Column("day_key", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("sign", sa.SmallInteger(), nullable=False),
+        sa.Column("month_key", sa.Integer(), nullable=False),
+        sa.Column("amount_minor", sa.Integer(), nullable=False),
+        sa.Column("tx_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day_key", "currency", "category_id", "sign"),
+    )
+    op.create_index(
+        "ix_daily_rollups_currency_day_key",
+        "daily_rollups",
+        ["currency", "day_key"],
+    )
+    op.create_index(
+        "ix_daily_rollups_currency_month_key",
+        "daily_rollups",
+        ["currency", "month_key"],
+    )
+    op.execute(
+        """
+        INSERT INTO daily_rollups
+            (day_key, month_key, currency, category_id, sign, amount_minor, tx_count)
+        SELECT day_key,
+               month_key,
+               currency,
+               COALESCE(category_id, 0),
+               CASE WHEN amount_minor > 0 THEN 1 ELSE -1 END,
+               SUM(ABS(amount_minor)),
+               COUNT(*)
+        FROM transactions
+        WHERE transfer_group_id IS NULL
+        GROUP BY 1, 2, 3, 4, 5
+        """
+    )
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_daily_rollups_currency_month_key", table_name="daily_rollups")
+    op.drop_index("ix_daily_rollups_currency_day_key", table_name="daily_rollups")
+    op.drop_table("daily_rollups")
+    op.create_table(
+        "daily_rollups",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("sign", sa.SmallInteger(), nullable=False),
+        sa.Column("amount_minor", sa.Integer(), nullable=False),
+        sa.Column("tx_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "currency", "category_id", "sign"),
+    )
+    op.create_index(
+        "ix_daily_rollups_currency_day",
+        "daily_rollups",
+        ["currency", "day"],
+    )
+    op.execute(
+        """
+        INSERT INTO daily_rollups (day, currency, category_id, sign, amount_minor, tx_count)
+        SELECT date(dt),
+               currency,
+               COALESCE(category_id, 0),
+               CASE WHEN amount_minor > 0 THEN 1 ELSE -1 END,
+               SUM(ABS(amount_minor)),
+               COUNT(*)
+        FROM transactions
+        WHERE transfer_group_id IS NULL
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+    op.drop_index("ix_transactions_currency_month_key", table_name="transactions")
+    op.drop_index("ix_transactions_currency_day_key", table_name="transactions")
+    op.drop_column("transactions", "month_key")
+    op.drop_column("transactions", "day_key")
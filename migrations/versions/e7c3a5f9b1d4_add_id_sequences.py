@@ -0,0 +1,38 @@
+"""add id_sequences
+
+Revision ID: e7c3a5f9b1d4
+Revises: d2a6b8c3e5f1
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c3a5f9b1d4'
+down_revision: Union[str, Sequence[str], None] = 'd2a6b8c3e5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "id_sequences",
+        sa.Column("name", sa.String(length=32), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+        sqlite_with_rowid=False,
+    )
+    # группы переводов раньше нумеровались id списания —
+    # счётчик продолжает с максимального выданного номера
+    op.execute(
+        "INSERT INTO id_sequences (name, value) "
+        "SELECT 'transfer_group', COALESCE(MAX(transfer_group_id), 0) FROM transactions"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("id_sequences")
@@ -0,0 +1,44 @@
+"""add balance_checkpoints
+
+Revision ID: f1b4d8a2c6e9
+Revises: e7c3a5f9b1d4
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b4d8a2c6e9'
+down_revision: Union[str, Sequence[str], None] = 'e7c3a5f9b1d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "balance_checkpoints",
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("month_key", sa.Integer(), nullable=False),
+        sa.Column("balance_minor", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("account_id", "currency", "month_key"),
+        sqlite_with_rowid=False,
+    )
+    op.create_index(
+        "ix_balance_checkpoints_month_key_currency",
+        "balance_checkpoints",
+        ["month_key", "currency"],
+        unique=False,
+    )
+    # таблица заполняется при старте приложения (services/checkpoints.py,
+    # close_months) или командой: python manage.py rebuild-checkpoints
+
+
+def downgrade() -> None:
+    op.drop_index("ix_balance_checkpoints_month_key_currency", table_name="balance_checkpoints")
+    op.drop_table("balance_checkpoints")
+    op.execute("DELETE FROM id_sequences WHERE name = 'balance_checkpoints'")
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from db.base import Base
+
+
+class AccountBalance(Base):
+    """
+    Материализованный баланс счёта в разрезе валюты.
+    Обновляется в той же транзакции, что и записи transactions.
+    """
+    __tablename__ = "account_balances"
+
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    currency = Column(String(3), primary_key=True)
+    balance_minor = Column(Integer, nullable=False, default=0)  # копейки
+    tx_count = Column(Integer, nullable=False, default=0)
+    last_tx_id = Column(Integer, nullable=True)  # максимальный id учтённой транзакции
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Index
+from db.base import Base
+
+
+class BalanceCheckpoint(Base):
+    """
+    Баланс счёта на конец месяца (накопительный, по валюте операций).
+    Строки есть за каждый месяц от первой операции пары (счёт, валюта)
+    до последнего закрытого месяца (см. services/checkpoints.py).
+    """
+    __tablename__ = "balance_checkpoints"
+
+    account_id = Column(Integer, primary_key=True)
+    currency = Column(String(3), primary_key=True)
+    month_key = Column(Integer, primary_key=True)    # YYYYMM, см. models.transaction
+    balance_minor = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # сумма по всем счетам на конец месяца (график капитала)
+        Index("ix_balance_checkpoints_month_key_currency", "month_key", "currency"),
+        {"sqlite_with_rowid": False},
+    )
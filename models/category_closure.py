@@ -0,0 +1,22 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer
+from db.base import Base
+
+
+class CategoryClosure(Base):
+    """
+    Замыкание дерева категорий (categories.parent_id): строка на каждую
+    пару предок -> потомок, включая саму категорию (depth = 0).
+    Поддерживается сервисом категорий (см. services/categories.py).
+    """
+    __tablename__ = "category_closure"
+
+    # (ancestor_id, descendant_id) — все потомки категории одним диапазоном PK
+    ancestor_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    depth = Column(Integer, nullable=False)  # 0 — сама категория, 1 — дочерняя, ...
+
+    __table_args__ = (
+        # все предки категории (перенос поддерева, свёртка к верхнему уровню)
+        Index("ix_category_closure_descendant_id", "descendant_id", "depth"),
+        {"sqlite_with_rowid": False},
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, SmallInteger, Index
+from db.base import Base
+
+# category_id для операций без категории (NULL в transactions):
+# NULL нельзя сделать частью первичного ключа
+NO_CATEGORY = 0
+
+
+class DailyRollup(Base):
+    """
+    Дневные итоги операций (без переводов) для дашборда.
+    Одна строка — день, валюта, категория и знак (1 доход, -1 расход).
+    """
+    __tablename__ = "daily_rollups"
+
+    day_key = Column(Integer, primary_key=True)      # YYYYMMDD, см. models.transaction
+    currency = Column(String(3), primary_key=True)
+    category_id = Column(Integer, primary_key=True)  # NO_CATEGORY, если категории нет
+    sign = Column(SmallInteger, primary_key=True)    # 1 доход, -1 расход
+    month_key = Column(Integer, nullable=False)      # YYYYMM
+    amount_minor = Column(Integer, nullable=False, default=0)  # сумма по модулю, копейки
+    tx_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # дашборд: диапазон дней / месяцев в одной валюте
+        Index("ix_daily_rollups_currency_day_key", "currency", "day_key"),
+        Index("ix_daily_rollups_currency_month_key", "currency", "month_key"),
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Date, Float, String
+from db.base import Base
+
+
+class FxRate(Base):
+    """
+    Курс валюты на дату: 1 base = rate quote.
+    На дату без курса (выходные) берётся последний известный до неё
+    (services/fx.py).
+    """
+    __tablename__ = "fx_rates"
+
+    base = Column(String(3), primary_key=True)
+    quote = Column(String(3), primary_key=True)
+    rate_date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+
+    __table_args__ = {"sqlite_with_rowid": False}
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String
+from db.base import Base
+
+
+class IdSequence(Base):
+    """
+    Счётчики идентификаторов, которые не являются первичным ключом строки
+    (transfer_group_id). value — последний выданный номер.
+    Здесь же последний закрытый месяц balance_checkpoints (YYYYMM).
+    """
+    __tablename__ = "id_sequences"
+
+    name = Column(String(32), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = {"sqlite_with_rowid": False}
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from db.base import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Ответ на запрос с заголовком Idempotency-Key.
+    Повтор запроса с тем же ключом отдаёт сохранённый ответ, не выполняя
+    запрос заново. Записи старше IDEMPOTENCY_TTL_S удаляются.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(32), nullable=False)  # метод, путь и тело запроса
+    status_code = Column(Integer, nullable=True)       # NULL — запрос ещё выполняется
+    response_body = Column(Text, nullable=True)        # JSON
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+        # ключ — это и есть первичный ключ: без rowid таблица занимает одно B-дерево
+        {"sqlite_with_rowid": False},
+    )
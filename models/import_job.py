@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, func
+from db.base import Base
+
+
+class ImportJob(Base):
+    """
+    Импорт банковской выписки (CSV / OFX) в счёт.
+    committed_records — сколько записей выписки уже зафиксировано:
+    прерванный импорт продолжается с этой позиции.
+    """
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    format = Column(String(8), nullable=False)         # 'csv' / 'ofx'
+    filename = Column(String, nullable=True)           # имя файла у клиента
+    path = Column(String, nullable=False)              # сохранённая копия выписки
+    status = Column(String(16), nullable=False, default="pending")
+    # pending / running / done / failed / interrupted
+    chunk_size = Column(Integer, nullable=False)
+    on_duplicate = Column(String(8), nullable=False, default="reject")  # allow / reject / flag
+    # операции счёта с id <= base_tx_id существовали до импорта (для поиска дублей)
+    base_tx_id = Column(Integer, nullable=False, default=0)
+
+    total_records = Column(Integer, nullable=True)     # записей в выписке
+    committed_records = Column(Integer, nullable=False, default=0)
+    inserted_count = Column(Integer, nullable=False, default=0)
+    duplicate_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    last_record_error = Column(Text, nullable=True)    # последняя ошибка разбора записи
+    error = Column(Text, nullable=True)                # причина остановки импорта
+    elapsed_s = Column(Float, nullable=False, default=0.0)  # время обработки (для скорости)
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
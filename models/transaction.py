@@ -1,7 +1,65 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, func
+import hashlib
+import re
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index, func, text
 #from sqlalchemy.orm import relationship
 from db.base import Base
 
+
+# Целочисленные ключи дат: 20260315 для дня, 202603 для месяца.
+# Группировка и диапазоны по ним идут по индексу, без date()/strftime().
+
+def to_day_key(value: date) -> int:
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def to_month_key(value: date) -> int:
+    return value.year * 100 + value.month
+
+
+def month_key_to_date(key: int) -> date:
+    return date(key // 100, key % 100, 1)
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_description(value: Optional[str]) -> str:
+    """'  ОПЛАТА: Magnit  #12 ' -> 'оплата magnit 12' — для сравнения описаний."""
+    return _NON_WORD.sub(" ", (value or "").casefold()).strip()
+
+
+def transaction_fingerprint(
+    account_id: int,
+    amount_minor: int,
+    day_key: int,
+    description: Optional[str],
+) -> str:
+    """Отпечаток для поиска дублей: счёт, сумма со знаком, день, описание."""
+    raw = f"{account_id}|{amount_minor}|{day_key}|{normalize_description(description)}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def _day_key_default(context) -> int:
+    return to_day_key(context.get_current_parameters()["dt"])
+
+
+def _month_key_default(context) -> int:
+    return to_month_key(context.get_current_parameters()["dt"])
+
+
+def _fingerprint_default(context) -> str:
+    params = context.get_current_parameters()
+    return transaction_fingerprint(
+        params["account_id"],
+        params["amount_minor"],
+        to_day_key(params["dt"]),
+        params.get("description"),
+    )
+
+
 class Transaction(Base):
     __tablename__ = "transactions"
 
@@ -14,10 +72,72 @@ class Transaction(Base):
     currency = Column(String(3), nullable=False)
 
     dt = Column(DateTime, nullable=False)           # дата/время операции
+    # производные от dt, заполняются при вставке
+    day_key = Column(Integer, nullable=False, default=_day_key_default)      # YYYYMMDD
+    month_key = Column(Integer, nullable=False, default=_month_key_default)  # YYYYMM
     description = Column(Text)
 
     transfer_group_id = Column(Integer, nullable=True)
+    # поиск дублей (services/duplicates.py); при изменении суммы
+    # или описания пересчитывается
+    fingerprint = Column(String(16), nullable=True, default=_fingerprint_default)
+    # операция записана с пометкой «возможный дубль» этой операции
+    duplicate_of_id = Column(Integer, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     #account = relationship("Account")
     #category = relationship("Category")
+
+    __table_args__ = (
+        # дашборд: диапазон дат в одной валюте без переводов;
+        # amount_minor и category_id в индексе — запросы не ходят в таблицу
+        Index(
+            "ix_transactions_currency_dt_no_transfer",
+            "currency",
+            "dt",
+            "amount_minor",
+            "category_id",
+            sqlite_where=text("transfer_group_id IS NULL"),
+        ),
+        # баланс счёта: SUM(amount_minor) читается прямо из индекса
+        Index(
+            "ix_transactions_account_currency_amount",
+            "account_id",
+            "currency",
+            "amount_minor",
+        ),
+        Index("ix_transactions_category_dt", "category_id", "dt"),
+        # список операций (keyset по (dt, id), id — это rowid в конце индекса):
+        # без фильтров, по счёту, по валюте, только переводы
+        Index("ix_transactions_dt", "dt"),
+        Index("ix_transactions_account_dt", "account_id", "dt"),
+        Index("ix_transactions_currency_dt", "currency", "dt"),
+        Index(
+            "ix_transactions_transfer_dt",
+            "dt",
+            sqlite_where=text("transfer_group_id IS NOT NULL"),
+        ),
+        # дубли: точное совпадение отпечатка и окно ±N дней с той же суммой
+        Index("ix_transactions_fingerprint", "fingerprint"),
+        Index("ix_transactions_account_amount_dt", "account_id", "amount_minor", "dt"),
+        # группировка по дням/месяцам в одной валюте (без переводов)
+        Index(
+            "ix_transactions_currency_day_key",
+            "currency",
+            "day_key",
+            sqlite_where=text("transfer_group_id IS NULL"),
+        ),
+        Index(
+            "ix_transactions_currency_month_key",
+            "currency",
+            "month_key",
+            sqlite_where=text("transfer_group_id IS NULL"),
+        ),
+        # только записи переводов: иначе SQLite берёт этот индекс
+        # для "transfer_group_id IS NULL" и читает 95% таблицы через него
+        Index(
+            "ix_transactions_transfer_group_id",
+            "transfer_group_id",
+            sqlite_where=text("transfer_group_id IS NOT NULL"),
+        ),
+    )
@@ -1,7 +1,22 @@
+from datetime import date
 from typing import List, Optional, TypedDict
 
-from db import session_scope
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
 from models.account import Account
+from models.account_balance import AccountBalance
+from models.balance_checkpoint import BalanceCheckpoint
+from services.balances import (
+    balances_by_account_query,
+    get_active_accounts_balance,
+    get_active_accounts_balance_in,
+)
+from services.checkpoints import balances_as_of
+from services.dashboard_cache import ACCOUNTS_SCOPE, mark_dirty
 
 
 class AccountDTO(TypedDict):
@@ -13,6 +28,17 @@ class AccountDTO(TypedDict):
     card_number: Optional[str]
 
 
+class AccountBalanceDTO(TypedDict):
+    account_id: int
+    currency: str
+    balance_minor: int
+
+
+class AccountWithBalanceDTO(AccountDTO):
+    balance_minor: int                    # в валюте счёта
+    balances: List[AccountBalanceDTO]     # по всем валютам операций счёта
+
+
 def _mask_card_number(card_number: Optional[str]) -> Optional[str]:
     """Храним только маску вида '**** 1234'."""
     if not card_number:
@@ -37,71 +63,331 @@ def _to_dto(account: Account) -> AccountDTO:
     )
 
 
-def create_account(
+# колонки в порядке полей AccountDTO: запись сразу возвращает готовый DTO
+# через RETURNING, без SELECT после INSERT/UPDATE
+_DTO_COLUMNS = (
+    Account.id,
+    Account.name,
+    Account.type,
+    Account.currency,
+    Account.is_active,
+    Account.card_number,
+)
+
+
+def _row_to_dto(row) -> AccountDTO:
+    return AccountDTO(**row._mapping)
+
+
+# ---------- Логика поверх открытой сессии ----------
+# Одни и те же функции используются синхронными обёртками (session_scope)
+# и асинхронными (AsyncSession.run_sync).
+
+def _create_account(
+    session: Session,
     name: str,
     type_: str,
     currency: str = "RUB",
     is_active: bool = True,
     card_number: Optional[str] = None,
 ) -> AccountDTO:
-    """Создать новый счёт и вернуть его как DTO."""
-    with session_scope() as session:
-        account = Account(
+    row = session.execute(
+        insert(Account)
+        .values(
             name=name,
             type=type_,
             currency=currency,
             is_active=is_active,
             card_number=_mask_card_number(card_number),
         )
+        .returning(*_DTO_COLUMNS)
+    ).one()
+    return _row_to_dto(row)
+
+
+def _list_accounts(session: Session, active_only: bool = True) -> List[AccountDTO]:
+    query = session.query(Account)
+    if active_only:
+        query = query.filter(Account.is_active.is_(True))
+
+    accounts = query.order_by(Account.id).all()
+    return [_to_dto(acc) for acc in accounts]
+
+
+def _list_accounts_with_balances(
+    session: Session,
+    active_only: bool = True,
+) -> List[AccountWithBalanceDTO]:
+    """Счета вместе с балансами — один запрос, сколько бы ни было счетов."""
+    result: dict[int, AccountWithBalanceDTO] = {}
+    for row in session.execute(balances_by_account_query(active_only)):
+        acc = result.get(row.id)
+        if acc is None:
+            acc = result[row.id] = AccountWithBalanceDTO(
+                id=row.id,
+                name=row.name,
+                type=row.type,
+                currency=row.currency,
+                is_active=row.is_active,
+                card_number=row.card_number,
+                balance_minor=0,
+                balances=[],
+            )
+        acc["balances"].append(AccountBalanceDTO(
+            account_id=row.id,
+            currency=row.balance_currency,
+            balance_minor=int(row.balance_minor),
+        ))
+        if row.balance_currency == row.currency:
+            acc["balance_minor"] = int(row.balance_minor)
+    return list(result.values())
+
+
+def _list_account_balances(
+    session: Session,
+    active_only: bool = False,
+    as_of: Optional[date] = None,
+) -> List[AccountBalanceDTO]:
+    if as_of is not None:
+        return _list_account_balances_as_of(session, active_only, as_of)
+    return [
+        AccountBalanceDTO(
+            account_id=row.id,
+            currency=row.balance_currency,
+            balance_minor=int(row.balance_minor),
+        )
+        for row in session.execute(balances_by_account_query(active_only))
+    ]
+
+
+def _list_account_balances_as_of(
+    session: Session,
+    active_only: bool,
+    as_of: date,
+) -> List[AccountBalanceDTO]:
+    """То же на конец дня as_of: balance_checkpoints + хвост операций."""
+    query = session.query(Account.id, Account.currency)
+    if active_only:
+        query = query.filter(Account.is_active.is_(True))
+
+    balances = balances_as_of(session, as_of)
+    by_account: dict[int, list] = {}
+    for (account_id, currency), amount in sorted(balances.items()):
+        by_account.setdefault(account_id, []).append((currency, amount))
+
+    result = []
+    for account_id, account_currency in query.order_by(Account.id):
+        for currency, amount in by_account.get(account_id) or [(account_currency, 0)]:
+            result.append(AccountBalanceDTO(
+                account_id=account_id,
+                currency=currency,
+                balance_minor=amount,
+            ))
+    return result
+
+
+def _get_balance_as_of(session: Session, account_id: int, as_of: date) -> int:
+    """Баланс счёта на конец дня as_of (сумма по всем валютам)."""
+    return sum(balances_as_of(session, as_of, account_id).values())
+
+
+def _get_total_balance(
+    session: Session,
+    currency: str,
+    report_currency: Optional[str] = None,
+) -> int:
+    if report_currency is not None:
+        return get_active_accounts_balance_in(session, report_currency)
+    return get_active_accounts_balance(session, currency)
+
+
+def _get_account_by_id(session: Session, account_id: int) -> Optional[AccountDTO]:
+    account = (
+        session.query(Account)
+        .filter(Account.id == account_id)
+        .first()
+    )
 
-        session.add(account)
-        session.flush()  # получаем id
-        session.refresh(account)
+    if account is None:
+        return None
 
-        return _to_dto(account)
+    return _to_dto(account)
 
 
-def list_accounts(active_only: bool = True) -> List[AccountDTO]:
-    """Получить список счетов как DTO."""
-    with session_scope() as session:
-        query = session.query(Account)
-        if active_only:
-            query = query.filter(Account.is_active.is_(True))
+def _deactivate_account(session: Session, account_id: int) -> bool:
+    found = session.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(is_active=False)
+        .returning(Account.id)
+        .execution_options(synchronize_session=False)
+    ).first()
 
-        accounts = query.order_by(Account.id).all()
-        return [_to_dto(acc) for acc in accounts]
+    if found is None:
+        return False
 
+    # меняется набор счетов в общем балансе дашборда
+    mark_dirty(session, [ACCOUNTS_SCOPE])
+    return True
 
-def get_account_by_id(account_id: int) -> Optional[AccountDTO]:
-    """Найти счёт по id."""
-    with session_scope() as session:
-        account = (
-            session.query(Account)
-            .filter(Account.id == account_id)
-            .first()
-        )
 
-        if account is None:
-            return None
+def _update_account(
+    session: Session,
+    account_id: int,
+    name: Optional[str] = None,
+    type_: Optional[str] = None,
+    currency: Optional[str] = None,
+    card_number: Optional[str] = None,
+    is_active: Optional[bool] = None,
+) -> Optional[AccountDTO]:
+    values = {}
+    if name is not None:
+        values["name"] = name
+    if type_ is not None:
+        values["type"] = type_
+    if currency is not None:
+        values["currency"] = currency
+    if card_number is not None:
+        values["card_number"] = _mask_card_number(card_number)
+    if is_active is not None:
+        values["is_active"] = is_active
+
+    if not values:
+        return _get_account_by_id(session, account_id)
+
+    row = session.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(**values)
+        .returning(*_DTO_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if row is None:
+        return None
 
-        return _to_dto(account)
+    if currency is not None or is_active is not None:
+        mark_dirty(session, [ACCOUNTS_SCOPE])
+    return _row_to_dto(row)
 
 
-def deactivate_account(account_id: int) -> bool:
-    """Пометить счёт как неактивный. Возвращает True, если счёт найден."""
-    with session_scope() as session:
-        account = (
-            session.query(Account)
-            .filter(Account.id == account_id)
-            .first()
+def _delete_account(session: Session, account_id: int) -> bool:
+    """
+    Удалить счёт без операций. Счёт, на который ссылаются операции
+    или импорты, не удаляется (внешний ключ) — ValueError.
+    """
+    # пустые строки баланса остаются после удаления всех операций счёта
+    session.execute(
+        delete(AccountBalance).where(
+            AccountBalance.account_id == account_id,
+            AccountBalance.tx_count == 0,
         )
+    )
+    try:
+        found = session.execute(
+            delete(Account)
+            .where(Account.id == account_id)
+            .returning(Account.id)
+            .execution_options(synchronize_session=False)
+        ).first()
+    except IntegrityError as exc:
+        raise ValueError("account has transactions or imports") from exc
+
+    if found is not None:
+        # операций у счёта нет — его балансы на конец месяцев нулевые
+        session.execute(delete(BalanceCheckpoint).where(BalanceCheckpoint.account_id == account_id))
+    return found is not None
+
+
+# ---------- Синхронный API ----------
+
+def create_account(
+    name: str,
+    type_: str,
+    currency: str = "RUB",
+    is_active: bool = True,
+    card_number: Optional[str] = None,
+    *,
+    session: Optional[Session] = None,
+) -> AccountDTO:
+    """Создать новый счёт и вернуть его как DTO."""
+    with session_scope(session) as session:
+        return _create_account(session, name, type_, currency, is_active, card_number)
 
-        if account is None:
-            return False
 
-        account.is_active = False
-        session.add(account)
-        return True
+def list_accounts(
+    active_only: bool = True,
+    *,
+    session: Optional[Session] = None,
+) -> List[AccountDTO]:
+    """Получить список счетов как DTO."""
+    with session_scope(session) as session:
+        return _list_accounts(session, active_only)
+
+
+def list_accounts_with_balances(
+    active_only: bool = True,
+    *,
+    session: Optional[Session] = None,
+) -> List[AccountWithBalanceDTO]:
+    """Счета с балансом в своей валюте и по всем валютам операций."""
+    with session_scope(session) as session:
+        return _list_accounts_with_balances(session, active_only)
+
+
+def list_account_balances(
+    active_only: bool = False,
+    as_of: Optional[date] = None,
+    *,
+    session: Optional[Session] = None,
+) -> List[AccountBalanceDTO]:
+    """
+    Балансы всех счетов по валютам (счёт без операций — ноль в своей
+    валюте); с as_of — на конец этого дня.
+    """
+    with session_scope(session) as session:
+        return _list_account_balances(session, active_only, as_of)
+
+
+def get_balance_as_of(
+    account_id: int,
+    as_of: date,
+    *,
+    session: Optional[Session] = None,
+) -> int:
+    """Баланс счёта на конец дня as_of, в копейках."""
+    with session_scope(session) as session:
+        return _get_balance_as_of(session, account_id, as_of)
+
+
+def get_total_balance(
+    currency: str = "RUB",
+    report_currency: Optional[str] = None,
+    *,
+    session: Optional[Session] = None,
+) -> int:
+    """
+    Общий баланс активных счетов в валюте, в копейках; с report_currency —
+    всех валют в пересчёте по сегодняшнему курсу (currency не используется).
+    """
+    with session_scope(session) as session:
+        return _get_total_balance(session, currency, report_currency)
+
+
+def get_account_by_id(
+    account_id: int,
+    *,
+    session: Optional[Session] = None,
+) -> Optional[AccountDTO]:
+    """Найти счёт по id."""
+    with session_scope(session) as session:
+        return _get_account_by_id(session, account_id)
+
+
+def deactivate_account(account_id: int, *, session: Optional[Session] = None) -> bool:
+    """Пометить счёт как неактивный. Возвращает True, если счёт найден."""
+    with session_scope(session) as session:
+        return _deactivate_account(session, account_id)
 
 
 def update_account(
@@ -111,53 +397,142 @@ def update_account(
     currency: Optional[str] = None,
     card_number: Optional[str] = None,
     is_active: Optional[bool] = None,
+    *,
+    session: Optional[Session] = None,
 ) -> Optional[AccountDTO]:
     """
     Частично обновить данные счёта.
     Возвращает DTO обновлённого счёта или None, если счёт не найден.
     """
-    with session_scope() as session:
-        account = (
-            session.query(Account)
-            .filter(Account.id == account_id)
-            .first()
+    with session_scope(session) as session:
+        return _update_account(
+            session, account_id, name, type_, currency, card_number, is_active,
         )
 
-        if account is None:
-            return None
 
-        if name is not None:
-            account.name = name
-        if type_ is not None:
-            account.type = type_
-        if currency is not None:
-            account.currency = currency
-        if card_number is not None:
-            account.card_number = _mask_card_number(card_number)
-        if is_active is not None:
-            account.is_active = is_active
+def delete_account(account_id: int, *, session: Optional[Session] = None) -> bool:
+    """
+    Полностью удалить счёт из базы.
+    Возвращает True, если счёт был найден и удалён;
+    ValueError, если у счёта есть операции или импорты.
+    """
+    with session_scope(session) as session:
+        return _delete_account(session, account_id)
+
+
+# ---------- Асинхронный API ----------
 
-        session.add(account)
-        session.flush()
-        session.refresh(account)
+async def create_account_async(
+    name: str,
+    type_: str,
+    currency: str = "RUB",
+    is_active: bool = True,
+    card_number: Optional[str] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> AccountDTO:
+    """Асинхронный вариант create_account."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _create_account, name, type_, currency, is_active, card_number,
+        )
 
-        return _to_dto(account)
 
+async def list_accounts_async(
+    active_only: bool = True,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[AccountDTO]:
+    """Асинхронный вариант list_accounts."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_accounts, active_only)
 
-def delete_account(account_id: int) -> bool:
-    """
-    Полностью удалить счёт из базы.
-    Возвращает True, если счёт был найден и удалён.
-    """
-    with session_scope() as session:
-        account = (
-            session.query(Account)
-            .filter(Account.id == account_id)
-            .first()
+
+async def list_accounts_with_balances_async(
+    active_only: bool = True,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[AccountWithBalanceDTO]:
+    """Асинхронный вариант list_accounts_with_balances."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_accounts_with_balances, active_only)
+
+
+async def list_account_balances_async(
+    active_only: bool = False,
+    as_of: Optional[date] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[AccountBalanceDTO]:
+    """Асинхронный вариант list_account_balances."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_account_balances, active_only, as_of)
+
+
+async def get_balance_as_of_async(
+    account_id: int,
+    as_of: date,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> int:
+    """Асинхронный вариант get_balance_as_of."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_balance_as_of, account_id, as_of)
+
+
+async def get_total_balance_async(
+    currency: str = "RUB",
+    report_currency: Optional[str] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> int:
+    """Асинхронный вариант get_total_balance."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_total_balance, currency, report_currency)
+
+
+async def get_account_by_id_async(
+    account_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[AccountDTO]:
+    """Асинхронный вариант get_account_by_id."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_account_by_id, account_id)
+
+
+async def deactivate_account_async(
+    account_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    """Асинхронный вариант deactivate_account."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_deactivate_account, account_id)
+
+
+async def update_account_async(
+    account_id: int,
+    name: Optional[str] = None,
+    type_: Optional[str] = None,
+    currency: Optional[str] = None,
+    card_number: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[AccountDTO]:
+    """Асинхронный вариант update_account."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _update_account, account_id, name, type_, currency, card_number, is_active,
         )
 
-        if account is None:
-            return False
 
-        session.delete(account)
-        return True
+async def delete_account_async(
+    account_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    """Асинхронный вариант delete_account."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_delete_account, account_id)
@@ -7,9 +7,12 @@ import os
 import secrets
 from typing import Optional
 
+import anyio
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from db import session_scope
+from db import async_session_scope, session_scope
 from models.user import User
 
 
@@ -52,45 +55,47 @@ def _to_dto(user: User) -> UserDTO:
     )
 
 
-def create_user(username: str, password: str) -> UserDTO:
-    if not username or not password:
-        raise ValueError("username and password are required")
-
-    with session_scope() as session:
-        existing = session.query(User).filter(User.username == username).first()
-        if existing is not None:
-            raise ValueError("username already exists")
-
-        salt = secrets.token_hex(16)
-        password_hash = _hash_password(password, salt)
-        user = User(
-            username=username,
-            password_hash=password_hash,
-            password_salt=salt,
-            is_active=True,
-        )
-        session.add(user)
-        session.flush()
-        session.refresh(user)
-        return _to_dto(user)
-
-
-def authenticate_user(username: str, password: str) -> Optional[UserDTO]:
-    with session_scope() as session:
-        user = session.query(User).filter(User.username == username).first()
-        if user is None or not user.is_active:
-            return None
-        if not _verify_password(password, user.password_salt, user.password_hash):
-            return None
-        return _to_dto(user)
+def _insert_user(
+    session: Session,
+    username: str,
+    password_hash: str,
+    salt: str,
+) -> UserDTO:
+    existing = session.query(User).filter(User.username == username).first()
+    if existing is not None:
+        raise ValueError("username already exists")
+
+    user = User(
+        username=username,
+        password_hash=password_hash,
+        password_salt=salt,
+        is_active=True,
+    )
+    session.add(user)
+    session.flush()
+    session.refresh(user)
+    return _to_dto(user)
+
+
+def _load_credentials(
+    session: Session,
+    username: str,
+) -> Optional[tuple[UserDTO, str, str]]:
+    """Активный пользователь + (salt, hash) для проверки пароля."""
+    user = session.query(User).filter(User.username == username).first()
+    if user is None or not user.is_active:
+        return None
+    return _to_dto(user), user.password_salt, user.password_hash
 
 
-def create_access_token(user_id: int) -> str:
-    serializer = _serializer()
-    return serializer.dumps({"user_id": user_id})
+def _get_active_user(session: Session, user_id: int) -> Optional[UserDTO]:
+    user = session.query(User).filter(User.id == user_id).first()
+    if user is None or not user.is_active:
+        return None
+    return _to_dto(user)
 
 
-def get_user_from_token(token: str) -> Optional[UserDTO]:
+def _user_id_from_token(token: str) -> Optional[int]:
     serializer = _serializer()
     try:
         data = serializer.loads(token, max_age=AUTH_TOKEN_TTL_SECONDS)
@@ -100,9 +105,104 @@ def get_user_from_token(token: str) -> Optional[UserDTO]:
     user_id = data.get("user_id")
     if not isinstance(user_id, int):
         return None
+    return user_id
+
+
+def create_user(
+    username: str,
+    password: str,
+    *,
+    session: Optional[Session] = None,
+) -> UserDTO:
+    if not username or not password:
+        raise ValueError("username and password are required")
+
+    salt = secrets.token_hex(16)
+    password_hash = _hash_password(password, salt)
+    with session_scope(session) as session:
+        return _insert_user(session, username, password_hash, salt)
+
+
+def authenticate_user(
+    username: str,
+    password: str,
+    *,
+    session: Optional[Session] = None,
+) -> Optional[UserDTO]:
+    with session_scope(session) as session:
+        credentials = _load_credentials(session, username)
+    if credentials is None:
+        return None
+
+    user, salt, password_hash = credentials
+    if not _verify_password(password, salt, password_hash):
+        return None
+    return user
+
+
+def create_access_token(user_id: int) -> str:
+    serializer = _serializer()
+    return serializer.dumps({"user_id": user_id})
+
+
+def get_user_from_token(
+    token: str,
+    *,
+    session: Optional[Session] = None,
+) -> Optional[UserDTO]:
+    user_id = _user_id_from_token(token)
+    if user_id is None:
+        return None
+
+    with session_scope(session) as session:
+        return _get_active_user(session, user_id)
+
+
+# ---------- Асинхронный API ----------
+# PBKDF2 нагружает CPU, поэтому хеширование уводим в поток,
+# чтобы не блокировать event loop.
+
+async def create_user_async(
+    username: str,
+    password: str,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> UserDTO:
+    if not username or not password:
+        raise ValueError("username and password are required")
+
+    salt = secrets.token_hex(16)
+    password_hash = await anyio.to_thread.run_sync(_hash_password, password, salt)
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_insert_user, username, password_hash, salt)
+
+
+async def authenticate_user_async(
+    username: str,
+    password: str,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[UserDTO]:
+    async with async_session_scope(session) as session:
+        credentials = await session.run_sync(_load_credentials, username)
+    if credentials is None:
+        return None
+
+    user, salt, password_hash = credentials
+    ok = await anyio.to_thread.run_sync(_verify_password, password, salt, password_hash)
+    if not ok:
+        return None
+    return user
+
+
+async def get_user_from_token_async(
+    token: str,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[UserDTO]:
+    user_id = _user_id_from_token(token)
+    if user_id is None:
+        return None
 
-    with session_scope() as session:
-        user = session.query(User).filter(User.id == user_id).first()
-        if user is None or not user.is_active:
-            return None
-        return _to_dto(user)
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_active_user, user_id)
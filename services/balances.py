@@ -0,0 +1,214 @@
+"""
+Материализованные балансы счетов (таблица account_balances).
+
+Сервис транзакций вызывает apply_balance_changes() в той же сессии,
+что и изменение transactions, поэтому баланс и операции всегда
+фиксируются одним commit. Чтение баланса — поиск по первичному ключу.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from models.account_balance import AccountBalance
+from models.transaction import Transaction
+from services.fx import converter
+
+if TYPE_CHECKING:
+    from services.transactions import TransactionDTO
+
+# UPSERT текстом, а не sqlite_insert().on_conflict_do_update(): ON CONFLICT
+# у SQLAlchemy не кэшируется и компилируется заново на каждую запись.
+# В SQLite max(NULL, x) = NULL, поэтому last_tx_id через coalesce.
+_UPSERT_BALANCE = text(
+    "INSERT INTO account_balances (account_id, currency, balance_minor, tx_count, last_tx_id) "
+    "VALUES (:account_id, :currency, :balance_minor, :tx_count, :last_tx_id) "
+    "ON CONFLICT (account_id, currency) DO UPDATE SET "
+    "balance_minor = balance_minor + excluded.balance_minor, "
+    "tx_count = tx_count + excluded.tx_count, "
+    "last_tx_id = nullif(max(coalesce(last_tx_id, 0), coalesce(excluded.last_tx_id, 0)), 0)"
+)
+
+def apply_balance_changes(
+    session: Session,
+    added: Iterable[TransactionDTO] = (),
+    removed: Iterable[TransactionDTO] = (),
+) -> None:
+    """
+    Учесть добавленные и удалённые записи transactions.
+    Изменение суммы записи = removed (старое состояние) + added (новое).
+    Дельты сначала сворачиваются по (account_id, currency),
+    затем все пары записываются одним UPSERT (executemany).
+    """
+    deltas: dict[tuple[int, str], list] = {}
+
+    for tx in added:
+        d = deltas.setdefault((tx.account_id, tx.currency), [0, 0, None])
+        d[0] += tx.amount_minor
+        d[1] += 1
+        d[2] = tx.id if d[2] is None else max(d[2], tx.id)
+
+    for tx in removed:
+        d = deltas.setdefault((tx.account_id, tx.currency), [0, 0, None])
+        d[0] -= tx.amount_minor
+        d[1] -= 1
+
+    rows = [
+        {
+            "account_id": account_id,
+            "currency": currency,
+            "balance_minor": amount,
+            "tx_count": count,
+            "last_tx_id": last_tx_id,
+        }
+        for (account_id, currency), (amount, count, last_tx_id) in deltas.items()
+        if amount != 0 or count != 0
+    ]
+    if not rows:
+        return
+
+    # один executemany на все пары — пачка операций не множит запросы
+    session.execute(_UPSERT_BALANCE, rows)
+
+
+def get_balance(
+    session: Session,
+    account_id: int,
+    currency: Optional[str] = None,
+) -> int:
+    """Баланс счёта в копейках; без валюты — сумма по всем валютам счёта."""
+    q = select(func.coalesce(func.sum(AccountBalance.balance_minor), 0)).where(
+        AccountBalance.account_id == account_id,
+    )
+    if currency is not None:
+        q = q.where(AccountBalance.currency == currency)
+    return int(session.execute(q).scalar_one())
+
+
+def balances_by_account_query(active_only: bool = False):
+    """
+    Балансы всех счетов по валютам одним запросом: accounts LEFT JOIN
+    агрегат account_balances по (account_id, currency). Счёт без операций
+    даёт одну строку в своей валюте с нулём. Колонки: поля счёта,
+    balance_currency, balance_minor.
+    """
+    totals = (
+        select(
+            AccountBalance.account_id,
+            AccountBalance.currency,
+            func.sum(AccountBalance.balance_minor).label("balance_minor"),
+        )
+        .group_by(AccountBalance.account_id, AccountBalance.currency)
+        .subquery()
+    )
+    q = (
+        select(
+            Account.id,
+            Account.name,
+            Account.type,
+            Account.currency,
+            Account.is_active,
+            Account.card_number,
+            func.coalesce(totals.c.currency, Account.currency).label("balance_currency"),
+            func.coalesce(totals.c.balance_minor, 0).label("balance_minor"),
+        )
+        .select_from(Account)
+        .outerjoin(totals, totals.c.account_id == Account.id)
+        .order_by(Account.id, totals.c.currency)
+    )
+    if active_only:
+        q = q.where(Account.is_active.is_(True))
+    return q
+
+
+def get_active_accounts_balance(session: Session, currency: str) -> int:
+    """Общий баланс активных счетов в валюте currency (одним запросом)."""
+    q = (
+        select(func.coalesce(func.sum(AccountBalance.balance_minor), 0))
+        .join(Account, Account.id == AccountBalance.account_id)
+        .where(
+            Account.is_active.is_(True),
+            Account.currency == currency,
+            AccountBalance.currency == currency,
+        )
+    )
+    return int(session.execute(q).scalar_one())
+
+
+def get_active_accounts_balance_in(session: Session, report_currency: str) -> int:
+    """
+    Общий баланс активных счетов во всех валютах в пересчёте
+    в report_currency по сегодняшнему курсу: один запрос с группировкой
+    по валюте, пересчитывается каждая валюта целиком (services/fx.py).
+    """
+    q = (
+        select(AccountBalance.currency, func.sum(AccountBalance.balance_minor))
+        .join(Account, Account.id == AccountBalance.account_id)
+        .where(Account.is_active.is_(True))
+        .group_by(AccountBalance.currency)
+    )
+    convert = converter(session, report_currency)
+    today = date.today()
+    return sum(convert(int(amount), currency, today) for currency, amount in session.execute(q))
+
+
+def rebuild_account_balances(session: Session) -> int:
+    """Пересчитать таблицу целиком по transactions. Возвращает число строк."""
+    session.execute(delete(AccountBalance))
+    session.execute(
+        insert(AccountBalance).from_select(
+            ["account_id", "currency", "balance_minor", "tx_count", "last_tx_id"],
+            select(
+                Transaction.account_id,
+                Transaction.currency,
+                func.sum(Transaction.amount_minor),
+                func.count(),
+                func.max(Transaction.id),
+            ).group_by(Transaction.account_id, Transaction.currency),
+        )
+    )
+    return int(session.execute(select(func.count()).select_from(AccountBalance)).scalar_one())
+
+
+def verify_account_balances(session: Session) -> List[dict]:
+    """
+    Сравнить сохранённые балансы с пересчётом по transactions.
+    Возвращает список расхождений (пустой — всё сходится).
+    """
+    actual = {
+        (r.account_id, r.currency): (int(r.balance), int(r.cnt))
+        for r in session.execute(
+            select(
+                Transaction.account_id,
+                Transaction.currency,
+                func.sum(Transaction.amount_minor).label("balance"),
+                func.count().label("cnt"),
+            ).group_by(Transaction.account_id, Transaction.currency)
+        )
+    }
+    stored = {
+        (r.account_id, r.currency): (r.balance_minor, r.tx_count)
+        for r in session.execute(select(AccountBalance))
+        .scalars()
+    }
+
+    mismatches = []
+    for key in sorted(actual.keys() | stored.keys()):
+        expected = actual.get(key, (0, 0))
+        got = stored.get(key, (0, 0))
+        if expected != got:
+            mismatches.append(
+                {
+                    "account_id": key[0],
+                    "currency": key[1],
+                    "expected_balance_minor": expected[0],
+                    "expected_tx_count": expected[1],
+                    "stored_balance_minor": got[0],
+                    "stored_tx_count": got[1],
+                }
+            )
+    return mismatches
@@ -1,7 +1,23 @@
+"""
+Категории доходов и расходов.
+
+Дерево категорий (parent_id) продублировано в category_closure — строка
+на каждую пару предок -> потомок. Таблица меняется в той же транзакции,
+что и categories: при создании категории и при смене родителя. Через
+неё дашборд сворачивает суммы к верхнему уровню и фильтрует по
+поддереву одним условием (см. services/dashboard.py).
+"""
 from typing import List, Optional, TypedDict
 
-from db import session_scope
+from sqlalchemy import and_, delete, func, insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
 from models.category import Category
+from models.category_closure import CategoryClosure
+from services.dashboard_cache import CATEGORIES_SCOPE, mark_dirty
 
 
 class CategoryDTO(TypedDict):
@@ -22,70 +38,274 @@ def _to_dto(cat: Category) -> CategoryDTO:
     )
 
 
-def create_category(
+# колонки в порядке полей CategoryDTO (см. _DTO_COLUMNS в services/accounts.py)
+_DTO_COLUMNS = (
+    Category.id,
+    Category.name,
+    Category.type,
+    Category.parent_id,
+    Category.is_active,
+)
+
+
+# новая категория: её предки — предки родителя на шаг дальше, плюс она сама
+_INSERT_CLOSURE = text(
+    "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+    "SELECT ancestor_id, :id, depth + 1 FROM category_closure WHERE descendant_id = :parent_id "
+    "UNION ALL SELECT :id, :id, 0"
+)
+# перенос поддерева: связи поддерева со старыми предками удаляются...
+_DETACH_SUBTREE = text(
+    "DELETE FROM category_closure "
+    "WHERE descendant_id IN (SELECT descendant_id FROM category_closure WHERE ancestor_id = :id) "
+    "AND ancestor_id IN ("
+    "SELECT ancestor_id FROM category_closure WHERE descendant_id = :id AND depth > 0)"
+)
+# ...и каждый предок нового родителя связывается с каждым узлом поддерева
+_ATTACH_SUBTREE = text(
+    "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+    "SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1 "
+    "FROM category_closure AS a JOIN category_closure AS d ON d.ancestor_id = :id "
+    "WHERE a.descendant_id = :parent_id"
+)
+# замыкание, посчитанное заново по parent_id
+_EXPECTED_CLOSURE = text(
+    "WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS ("
+    "SELECT id, id, 0 FROM categories "
+    "UNION ALL "
+    "SELECT tree.ancestor_id, c.id, tree.depth + 1 "
+    "FROM tree JOIN categories AS c ON c.parent_id = tree.descendant_id"
+    ") SELECT ancestor_id, descendant_id, depth FROM tree"
+)
+
+
+def _row_to_dto(row) -> CategoryDTO:
+    return CategoryDTO(**row._mapping)
+
+
+def _write_returning(session: Session, stmt, parent_id: Optional[int]):
+    """Выполнить INSERT/UPDATE ... RETURNING; несуществующий parent_id — ValueError."""
+    try:
+        return session.execute(stmt.returning(*_DTO_COLUMNS)).first()
+    except IntegrityError as exc:
+        raise ValueError(f"parent category {parent_id} not found") from exc
+
+
+# ---------- Логика поверх открытой сессии ----------
+
+def _create_category(
+    session: Session,
     name: str,
-    type_: str,                  # 'income' / 'expense'
+    type_: str,
     parent_id: Optional[int] = None,
     is_active: bool = True,
 ) -> CategoryDTO:
-    """Создать категорию дохода/расхода."""
     if type_ not in ("income", "expense"):
         raise ValueError("type_ must be 'income' or 'expense'")
 
-    with session_scope() as session:
-        cat = Category(
+    row = _write_returning(
+        session,
+        insert(Category).values(
             name=name,
             type=type_,
             parent_id=parent_id,
             is_active=is_active,
+        ),
+        parent_id,
+    )
+    session.execute(_INSERT_CLOSURE, {"id": row.id, "parent_id": parent_id})
+    return _row_to_dto(row)
+
+
+def _list_categories(
+    session: Session,
+    type_: Optional[str] = None,
+    active_only: bool = True,
+) -> List[CategoryDTO]:
+    query = session.query(Category)
+    if type_ is not None:
+        query = query.filter(Category.type == type_)
+    if active_only:
+        query = query.filter(Category.is_active.is_(True))
+    cats = query.order_by(Category.id).all()
+    return [_to_dto(c) for c in cats]
+
+
+def _get_category_by_id(session: Session, category_id: int) -> Optional[CategoryDTO]:
+    cat = (
+        session.query(Category)
+        .filter(Category.id == category_id)
+        .first()
+    )
+    if cat is None:
+        return None
+    return _to_dto(cat)
+
+
+def _deactivate_category(session: Session, category_id: int) -> bool:
+    found = session.execute(
+        update(Category)
+        .where(Category.id == category_id)
+        .values(is_active=False)
+        .returning(Category.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return found is not None
+
+
+def _update_category(
+    session: Session,
+    category_id: int,
+    *,
+    name: Optional[str] = None,
+    type_: Optional[str] = None,
+    parent_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+) -> Optional[CategoryDTO]:
+    if type_ is not None and type_ not in ("income", "expense"):
+        raise ValueError("type_ must be 'income' or 'expense'")
+
+    values = {}
+    if name is not None:
+        values["name"] = name
+    if type_ is not None:
+        values["type"] = type_
+    if parent_id is not None:
+        values["parent_id"] = parent_id
+    if is_active is not None:
+        values["is_active"] = is_active
+
+    if not values:
+        return _get_category_by_id(session, category_id)
+
+    moved = False
+    if parent_id is not None:
+        # одним запросом: не потомок ли новый родитель и не он ли уже родитель
+        links = dict(
+            session.execute(
+                select(CategoryClosure.ancestor_id, CategoryClosure.descendant_id).where(
+                    or_(
+                        and_(
+                            CategoryClosure.ancestor_id == category_id,
+                            CategoryClosure.descendant_id == parent_id,
+                        ),
+                        and_(
+                            CategoryClosure.ancestor_id == parent_id,
+                            CategoryClosure.descendant_id == category_id,
+                            CategoryClosure.depth == 1,
+                        ),
+                    ),
+                )
+            ).all()
+        )
+        if links.get(category_id) == parent_id:
+            raise ValueError(f"category {parent_id} is in the subtree of category {category_id}")
+        moved = links.get(parent_id) != category_id
+
+    row = _write_returning(
+        session,
+        update(Category)
+        .where(Category.id == category_id)
+        .values(**values)
+        .execution_options(synchronize_session=False),
+        parent_id,
+    )
+
+    if row is None:
+        return None
+
+    if moved:
+        params = {"id": category_id, "parent_id": parent_id}
+        session.execute(_DETACH_SUBTREE, params)
+        session.execute(_ATTACH_SUBTREE, params)
+
+    if name is not None or moved:
+        # названия категорий есть в закэшированных разбивках дашборда,
+        # дерево — в свёртке по верхнему уровню и фильтре по поддереву
+        mark_dirty(session, [CATEGORIES_SCOPE])
+    return _row_to_dto(row)
+
+
+# ---------- Обслуживание category_closure ----------
+
+def rebuild_category_closure(session: Session) -> int:
+    """Пересчитать category_closure по categories.parent_id."""
+    session.execute(delete(CategoryClosure))
+    session.execute(
+        insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            _EXPECTED_CLOSURE.columns(
+                CategoryClosure.ancestor_id,
+                CategoryClosure.descendant_id,
+                CategoryClosure.depth,
+            ),
+        )
+    )
+    mark_dirty(session, [CATEGORIES_SCOPE])
+    return int(session.execute(select(func.count()).select_from(CategoryClosure)).scalar_one())
+
+
+def verify_category_closure(session: Session) -> List[dict]:
+    """Расхождения category_closure с деревом parent_id (пустой список — всё сходится)."""
+    stored = {
+        (a, d): depth
+        for a, d, depth in session.execute(
+            select(CategoryClosure.ancestor_id, CategoryClosure.descendant_id, CategoryClosure.depth)
         )
-        session.add(cat)
-        session.flush()
-        session.refresh(cat)
-        return _to_dto(cat)
+    }
+    expected = {(a, d): depth for a, d, depth in session.execute(_EXPECTED_CLOSURE)}
+    return [
+        {
+            "ancestor_id": a,
+            "descendant_id": d,
+            "stored_depth": stored.get((a, d)),
+            "expected_depth": expected.get((a, d)),
+        }
+        for a, d in sorted(stored.keys() | expected.keys())
+        if stored.get((a, d)) != expected.get((a, d))
+    ]
+
+
+# ---------- Синхронный API ----------
+
+def create_category(
+    name: str,
+    type_: str,                  # 'income' / 'expense'
+    parent_id: Optional[int] = None,
+    is_active: bool = True,
+    *,
+    session: Optional[Session] = None,
+) -> CategoryDTO:
+    """Создать категорию дохода/расхода."""
+    with session_scope(session) as session:
+        return _create_category(session, name, type_, parent_id, is_active)
 
 
 def list_categories(
     type_: Optional[str] = None,
     active_only: bool = True,
+    *,
+    session: Optional[Session] = None,
 ) -> List[CategoryDTO]:
     """Список категорий, с фильтрами по типу и активности."""
-    with session_scope() as session:
-        query = session.query(Category)
-        if type_ is not None:
-            query = query.filter(Category.type == type_)
-        if active_only:
-            query = query.filter(Category.is_active.is_(True))
-        cats = query.order_by(Category.id).all()
-        return [_to_dto(c) for c in cats]
+    with session_scope(session) as session:
+        return _list_categories(session, type_, active_only)
 
 
-def get_category_by_id(category_id: int) -> Optional[CategoryDTO]:
+def get_category_by_id(
+    category_id: int,
+    *,
+    session: Optional[Session] = None,
+) -> Optional[CategoryDTO]:
     """Найти категорию по id."""
-    with session_scope() as session:
-        cat = (
-            session.query(Category)
-            .filter(Category.id == category_id)
-            .first()
-        )
-        if cat is None:
-            return None
-        return _to_dto(cat)
+    with session_scope(session) as session:
+        return _get_category_by_id(session, category_id)
 
 
-def deactivate_category(category_id: int) -> bool:
+def deactivate_category(category_id: int, *, session: Optional[Session] = None) -> bool:
     """Пометить категорию как неактивную."""
-    with session_scope() as session:
-        cat = (
-            session.query(Category)
-            .filter(Category.id == category_id)
-            .first()
-        )
-        if cat is None:
-            return False
-        cat.is_active = False
-        session.add(cat)
-        return True
+    with session_scope(session) as session:
+        return _deactivate_category(session, category_id)
 
 
 def update_category(
@@ -95,33 +315,84 @@ def update_category(
     type_: Optional[str] = None,  # "income" / "expense"
     parent_id: Optional[int] = None,
     is_active: Optional[bool] = None,
+    session: Optional[Session] = None,
 ) -> Optional[CategoryDTO]:
     """Обновить категорию по id, изменяя только переданные поля."""
+    with session_scope(session) as session:
+        return _update_category(
+            session,
+            category_id,
+            name=name,
+            type_=type_,
+            parent_id=parent_id,
+            is_active=is_active,
+        )
 
-    if type_ is not None and type_ not in ("income", "expense"):
-        raise ValueError("type_ must be 'income' or 'expense'")
 
-    with session_scope() as session:
-        cat = (
-            session.query(Category)
-            .filter(Category.id == category_id)
-            .first()
+# ---------- Асинхронный API ----------
+
+async def create_category_async(
+    name: str,
+    type_: str,
+    parent_id: Optional[int] = None,
+    is_active: bool = True,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> CategoryDTO:
+    """Асинхронный вариант create_category."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _create_category, name, type_, parent_id, is_active,
         )
 
-        if cat is None:
-            return None
 
-        if name is not None:
-            cat.name = name
-        if type_ is not None:
-            cat.type = type_
-        if parent_id is not None:
-            cat.parent_id = parent_id
-        if is_active is not None:
-            cat.is_active = is_active
+async def list_categories_async(
+    type_: Optional[str] = None,
+    active_only: bool = True,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[CategoryDTO]:
+    """Асинхронный вариант list_categories."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_categories, type_, active_only)
+
+
+async def get_category_by_id_async(
+    category_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[CategoryDTO]:
+    """Асинхронный вариант get_category_by_id."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_category_by_id, category_id)
+
+
+async def deactivate_category_async(
+    category_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    """Асинхронный вариант deactivate_category."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_deactivate_category, category_id)
 
-        session.add(cat)
-        session.flush()
-        session.refresh(cat)
 
-        return _to_dto(cat)
\ No newline at end of file
+async def update_category_async(
+    category_id: int,
+    *,
+    name: Optional[str] = None,
+    type_: Optional[str] = None,
+    parent_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    session: Optional[AsyncSession] = None,
+) -> Optional[CategoryDTO]:
+    """Асинхронный вариант update_category."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _update_category,
+            category_id,
+            name=name,
+            type_=type_,
+            parent_id=parent_id,
+            is_active=is_active,
+        )
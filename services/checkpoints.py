@@ -0,0 +1,648 @@
+"""
+Балансы на конец месяца (таблица balance_checkpoints): баланс на дату
+и график капитала без суммирования всей истории.
+
+Месяцы закрываются по порядку: close_months() дописывает закрывающие
+балансы всех пар (счёт, валюта) за месяцы после последнего закрытого
+(отметка в id_sequences, CHECKPOINT_SEQ) до прошлого месяца включительно.
+Запускается при старте приложения и первой записью операции в новом
+месяце — в её же транзакции. Чтения месяцы не закрывают: при отстающей
+отметке хвост операций после неё просто длиннее.
+
+Операции, попавшие в уже закрытые месяцы (задним числом, изменение,
+удаление), сервис транзакций учитывает через apply_checkpoint_changes()
+в той же сессии: дельта прибавляется ко всем закрытым месяцам от месяца
+операции до отметки. Операции текущего месяца в таблицу не попадают.
+
+Баланс на дату = баланс на конец предыдущего закрытого месяца + сумма
+операций после него (хвост не длиннее месяца с небольшим). Так же
+считается баланс после каждой операции страницы (running_balances).
+"""
+from __future__ import annotations
+
+import os
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Iterable, List, Literal, Optional, TypedDict
+
+from sqlalchemy import delete, event, func, insert, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
+from models.balance_checkpoint import BalanceCheckpoint
+from models.daily_rollup import DailyRollup
+from models.id_sequence import IdSequence
+from models.transaction import Transaction, month_key_to_date, to_day_key, to_month_key
+from services.rollups import rollup_range_filter
+
+if TYPE_CHECKING:
+    from services.transactions import TransactionDTO
+
+# строка id_sequences с последним закрытым месяцем (YYYYMM)
+CHECKPOINT_SEQ = "balance_checkpoints"
+
+# больше точек дневной график не отдаёт (10 лет)
+NET_WORTH_MAX_DAYS = int(os.getenv("NET_WORTH_MAX_DAYS", "3660"))
+
+Granularity = Literal["day", "month"]
+PairKey = tuple[int, str]
+
+# последний месяц, закрытый в этом процессе (после commit): пока он не
+# отстал от прошлого месяца, запись не читает отметку из id_sequences
+_closed_hint: Optional[int] = None
+# месяц, закрытый в ещё не зафиксированной транзакции сессии
+_CLOSING_KEY = "checkpoints_closing"
+
+# Дельта операции прибавляется к месяцам month_key..отметка; строки
+# пары, которых ещё нет (операция раньше первой), создаются. Если месяц
+# операции не закрыт (или отметки нет), CTE пуст и запрос ничего не делает.
+# CASE: следующий месяц для YYYYMM (декабрь -> январь следующего года).
+_UPSERT_CHECKPOINTS = text(
+    "WITH RECURSIVE "
+    "closed(w) AS (SELECT value FROM id_sequences WHERE name = '" + CHECKPOINT_SEQ + "'), "
+    "months(m) AS ("
+    "SELECT :month_key FROM closed WHERE :month_key <= w "
+    "UNION ALL "
+    "SELECT CASE WHEN m % 100 = 12 THEN m + 89 ELSE m + 1 END FROM months, closed WHERE m < w"
+    ") "
+    "INSERT INTO balance_checkpoints (account_id, currency, month_key, balance_minor) "
+    "SELECT :account_id, :currency, m, :balance_minor FROM months WHERE true "
+    "ON CONFLICT (account_id, currency, month_key) DO UPDATE SET "
+    "balance_minor = balance_minor + excluded.balance_minor"
+)
+
+
+class NetWorthPoint(TypedDict):
+    date: date            # конец дня / месяца (последний месяц — date_to)
+    balance_minor: int
+
+
+class NetWorthDTO(TypedDict):
+    currency: str
+    granularity: str
+    date_from: date
+    date_to: date
+    points: List[NetWorthPoint]
+
+
+# ---------- Месяцы YYYYMM ----------
+
+def _next_month(key: int) -> int:
+    return key + 89 if key % 100 == 12 else key + 1
+
+
+def _prev_month(key: int) -> int:
+    return key - 89 if key % 100 == 1 else key - 1
+
+
+def _month_start(key: int) -> datetime:
+    return datetime.combine(month_key_to_date(key), time.min)
+
+
+def _day_end(day: date) -> datetime:
+    """Граница «до конца дня day» для условия dt < ..."""
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def _is_month_end(day: date) -> bool:
+    return (day + timedelta(days=1)).day == 1
+
+
+def _last_closable_month(today: Optional[date] = None) -> int:
+    """Прошлый месяц: текущий ещё идёт и не закрывается."""
+    return _prev_month(to_month_key(today or date.today()))
+
+
+# ---------- Инкрементальное обновление ----------
+
+def apply_checkpoint_changes(
+    session: Session,
+    added: Iterable[TransactionDTO] = (),
+    removed: Iterable[TransactionDTO] = (),
+) -> None:
+    """
+    Учесть операции закрытых месяцев; смысл added/removed тот же,
+    что в apply_balance_changes(). Дельты сворачиваются по
+    (account_id, currency, month_key) и пишутся одним executemany.
+    """
+    current = to_month_key(date.today())
+    deltas: dict[tuple[int, str, int], int] = {}
+
+    for tx in added:
+        key = (tx.account_id, tx.currency, to_month_key(tx.dt))
+        deltas[key] = deltas.get(key, 0) + tx.amount_minor
+
+    for tx in removed:
+        key = (tx.account_id, tx.currency, to_month_key(tx.dt))
+        deltas[key] = deltas.get(key, 0) - tx.amount_minor
+
+    # текущий и будущие месяцы не закрыты: обычная запись сюда не ходит
+    rows = [
+        {
+            "account_id": account_id,
+            "currency": currency,
+            "month_key": month_key,
+            "balance_minor": amount,
+        }
+        for (account_id, currency, month_key), amount in deltas.items()
+        if amount != 0 and month_key < current
+    ]
+    if rows:
+        session.execute(_UPSERT_CHECKPOINTS, rows)
+    # после дельт: закрывающие строки считаются от уже поправленной отметки
+    _close_if_due(session)
+
+
+# ---------- Закрытие месяцев ----------
+
+def _close_if_due(session: Session) -> None:
+    """
+    Первая запись в новом месяце закрывает прошедшие месяцы в своей
+    транзакции (блокировка записи у неё уже есть). Дальше до следующего
+    месяца — ни одного лишнего запроса.
+    """
+    through = _last_closable_month()
+    if _closed_hint is not None and _closed_hint >= through:
+        return
+    _close_months(session, through)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_closed(session: Session) -> None:
+    global _closed_hint
+    through = session.info.pop(_CLOSING_KEY, None)
+    if through is not None:
+        _closed_hint = through
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_closing(session: Session) -> None:
+    session.info.pop(_CLOSING_KEY, None)
+
+def _closed_through(session: Session) -> Optional[int]:
+    """Последний закрытый месяц; None — таблица ещё не заполнялась."""
+    value = session.execute(
+        select(IdSequence.value).where(IdSequence.name == CHECKPOINT_SEQ)
+    ).scalar_one_or_none()
+    return value or None
+
+
+def _closing_rows(
+    session: Session,
+    after: Optional[int],
+    through: int,
+    opening: dict[PairKey, int],
+) -> List[dict]:
+    """
+    Строки balance_checkpoints за месяцы после after по through:
+    opening — балансы на конец after, к ним по месяцам прибавляются
+    суммы операций. Пара получает строки с месяца первой операции.
+    """
+    q = (
+        select(
+            Transaction.account_id,
+            Transaction.currency,
+            Transaction.month_key,
+            func.sum(Transaction.amount_minor).label("amount"),
+        )
+        .where(Transaction.dt < _month_start(_next_month(through)))
+        .group_by(Transaction.account_id, Transaction.currency, Transaction.month_key)
+    )
+    if after is not None:
+        q = q.where(Transaction.dt >= _month_start(_next_month(after)))
+
+    monthly: dict[PairKey, dict[int, int]] = {}
+    for r in session.execute(q):
+        monthly.setdefault((r.account_id, r.currency), {})[r.month_key] = int(r.amount)
+
+    rows = []
+    for pair in sorted(opening.keys() | monthly.keys()):
+        sums = monthly.get(pair, {})
+        balance = opening.get(pair, 0)
+        month = _next_month(after) if pair in opening else min(sums)
+        while month <= through:
+            balance += sums.get(month, 0)
+            rows.append({
+                "account_id": pair[0],
+                "currency": pair[1],
+                "month_key": month,
+                "balance_minor": balance,
+            })
+            month = _next_month(month)
+    return rows
+
+
+def _checkpoint_balances(session: Session, month_key: int) -> dict[PairKey, int]:
+    return {
+        (r.account_id, r.currency): r.balance_minor
+        for r in session.execute(
+            select(
+                BalanceCheckpoint.account_id,
+                BalanceCheckpoint.currency,
+                BalanceCheckpoint.balance_minor,
+            ).where(BalanceCheckpoint.month_key == month_key)
+        )
+    }
+
+
+def _close_months(session: Session, through: Optional[int] = None) -> int:
+    """
+    Закрыть месяцы по through (по умолчанию — прошлый) включительно.
+    Возвращает число добавленных строк; 0 — всё уже закрыто.
+    """
+    through = through or _last_closable_month()
+    # первая же запись берёт блокировку записи SQLite (до любого чтения —
+    # иначе транзакция со старым снимком не сможет стать пишущей);
+    # параллельный закрывающий дождётся commit и увидит новую отметку
+    session.execute(
+        sqlite_insert(IdSequence)
+        .values(name=CHECKPOINT_SEQ, value=0)
+        .on_conflict_do_nothing(index_elements=[IdSequence.name])
+    )
+    closed = _closed_through(session)
+    if closed is not None and closed >= through:
+        session.info[_CLOSING_KEY] = closed
+        return 0
+
+    opening = _checkpoint_balances(session, closed) if closed is not None else {}
+    rows = _closing_rows(session, closed, through, opening)
+    if rows:
+        session.execute(insert(BalanceCheckpoint), rows)
+    session.execute(
+        update(IdSequence)
+        .where(IdSequence.name == CHECKPOINT_SEQ)
+        .values(value=through)
+    )
+    session.info[_CLOSING_KEY] = through
+    return len(rows)
+
+
+# ---------- Баланс на дату ----------
+
+def _base_month(closed: Optional[int], as_of: date) -> Optional[int]:
+    """Закрытый месяц, от которого считается хвост до конца дня as_of."""
+    if closed is None:
+        return None
+    month = to_month_key(as_of)
+    if _is_month_end(as_of) and month <= closed:
+        return month
+    return min(closed, _prev_month(month))
+
+
+def balances_as_of(
+    session: Session,
+    as_of: date,
+    account_id: Optional[int] = None,
+) -> dict[PairKey, int]:
+    """
+    Балансы пар (счёт, валюта) на конец дня as_of: два запроса в сессии
+    вызывающего (services/accounts.py считает из них балансы счетов).
+    """
+    base = _base_month(_closed_through(session), as_of)
+
+    result: dict[PairKey, int] = {}
+    if base is not None:
+        q = select(
+            BalanceCheckpoint.account_id,
+            BalanceCheckpoint.currency,
+            BalanceCheckpoint.balance_minor,
+        ).where(BalanceCheckpoint.month_key == base)
+        if account_id is not None:
+            q = q.where(BalanceCheckpoint.account_id == account_id)
+        for r in session.execute(q):
+            result[(r.account_id, r.currency)] = r.balance_minor
+
+    tail_from = _month_start(_next_month(base)) if base is not None else None
+    tail_to = _day_end(as_of)
+    if tail_from is None or tail_from < tail_to:
+        q = (
+            select(
+                Transaction.account_id,
+                Transaction.currency,
+                func.sum(Transaction.amount_minor).label("amount"),
+            )
+            .where(Transaction.dt < tail_to)
+            .group_by(Transaction.account_id, Transaction.currency)
+        )
+        if tail_from is not None:
+            q = q.where(Transaction.dt >= tail_from)
+        if account_id is not None:
+            q = q.where(Transaction.account_id == account_id)
+        for r in session.execute(q):
+            key = (r.account_id, r.currency)
+            result[key] = result.get(key, 0) + int(r.amount)
+    return result
+
+
+def _total_as_of(session: Session, currency: str, as_of: date, closed: Optional[int]) -> int:
+    """Сумма балансов всех счетов в валюте на конец дня as_of."""
+    base = _base_month(closed, as_of)
+    total = 0
+    if base is not None:
+        total += session.execute(
+            select(func.coalesce(func.sum(BalanceCheckpoint.balance_minor), 0)).where(
+                BalanceCheckpoint.month_key == base,
+                BalanceCheckpoint.currency == currency,
+            )
+        ).scalar_one()
+
+    tail_from = _month_start(_next_month(base)) if base is not None else None
+    tail_to = _day_end(as_of)
+    if tail_from is None or tail_from < tail_to:
+        q = select(func.coalesce(func.sum(Transaction.amount_minor), 0)).where(
+            Transaction.currency == currency,
+            Transaction.dt < tail_to,
+        )
+        if tail_from is not None:
+            q = q.where(Transaction.dt >= tail_from)
+        total += session.execute(q).scalar_one()
+    return int(total)
+
+
+def running_balances(
+    session: Session,
+    account_id: int,
+    first: tuple[datetime, int],
+    last: tuple[datetime, int],
+) -> dict[int, int]:
+    """
+    Баланс счёта (в валюте операции) после каждой его операции с позиции
+    first по last включительно, в порядке (dt, id): {id: копейки}.
+    Начальный баланс — строка balance_checkpoints за закрытый месяц до
+    first, дальше SUM() OVER (ORDER BY dt, id) по операциям от начала
+    следующего месяца до last. Раньше этого месяца история не читается.
+    """
+    closed = _closed_through(session)
+    base = min(closed, _prev_month(to_month_key(first[0]))) if closed is not None else None
+
+    opening: dict[str, int] = {}
+    if base is not None:
+        opening = dict(
+            session.execute(
+                select(BalanceCheckpoint.currency, BalanceCheckpoint.balance_minor).where(
+                    BalanceCheckpoint.account_id == account_id,
+                    BalanceCheckpoint.month_key == base,
+                )
+            ).all()
+        )
+
+    conds = [
+        Transaction.account_id == account_id,
+        tuple_(Transaction.dt, Transaction.id) <= tuple_(*last),
+    ]
+    if base is not None:
+        conds.append(Transaction.dt >= _month_start(_next_month(base)))
+    window = (
+        select(
+            Transaction.id,
+            Transaction.currency,
+            Transaction.dt,
+            func.sum(Transaction.amount_minor).over(
+                partition_by=Transaction.currency,
+                order_by=(Transaction.dt, Transaction.id),
+            ).label("running"),
+        )
+        .where(*conds)
+        .subquery()
+    )
+    rows = session.execute(
+        select(window.c.id, window.c.currency, window.c.running).where(
+            tuple_(window.c.dt, window.c.id) >= tuple_(*first),
+        )
+    )
+    return {r.id: opening.get(r.currency, 0) + int(r.running) for r in rows}
+
+
+# ---------- График капитала ----------
+
+def _monthly_series(
+    session: Session,
+    currency: str,
+    date_from: date,
+    date_to: date,
+    closed: Optional[int],
+) -> List[NetWorthPoint]:
+    first = to_month_key(date_from)
+    last = to_month_key(date_to)
+
+    # последний месяц, конец которого целиком есть в balance_checkpoints
+    full_last = last if _is_month_end(date_to) else _prev_month(last)
+    if closed is None:
+        full_last = _prev_month(first)
+    else:
+        full_last = min(full_last, closed)
+
+    points: List[NetWorthPoint] = []
+    if full_last >= first:
+        totals = dict(
+            session.execute(
+                select(BalanceCheckpoint.month_key, func.sum(BalanceCheckpoint.balance_minor))
+                .where(
+                    BalanceCheckpoint.currency == currency,
+                    BalanceCheckpoint.month_key >= first,
+                    BalanceCheckpoint.month_key <= full_last,
+                )
+                .group_by(BalanceCheckpoint.month_key)
+            ).all()
+        )
+        month = first
+        while month <= full_last:
+            points.append(NetWorthPoint(
+                date=month_key_to_date(_next_month(month)) - timedelta(days=1),
+                balance_minor=int(totals.get(month, 0)),
+            ))
+            month = _next_month(month)
+
+    # остальные месяцы (не закрытые, неполный последний) — по операциям
+    tail_first = _next_month(max(full_last, _prev_month(first)))
+    if tail_first > last:
+        return points
+
+    if points:
+        balance = points[-1]["balance_minor"]
+    else:
+        balance = _total_as_of(
+            session, currency, month_key_to_date(tail_first) - timedelta(days=1), closed,
+        )
+    sums = dict(
+        session.execute(
+            select(Transaction.month_key, func.sum(Transaction.amount_minor))
+            .where(
+                Transaction.currency == currency,
+                Transaction.dt >= _month_start(tail_first),
+                Transaction.dt < _day_end(date_to),
+            )
+            .group_by(Transaction.month_key)
+        ).all()
+    )
+    month = tail_first
+    while month <= last:
+        balance += int(sums.get(month, 0))
+        month_end = month_key_to_date(_next_month(month)) - timedelta(days=1)
+        points.append(NetWorthPoint(date=min(month_end, date_to), balance_minor=balance))
+        month = _next_month(month)
+    return points
+
+
+def _daily_series(
+    session: Session,
+    currency: str,
+    date_from: date,
+    date_to: date,
+    closed: Optional[int],
+) -> List[NetWorthPoint]:
+    # переводы внутри валюты взаимно гасятся, поэтому дневное изменение
+    # капитала = доходы - расходы из daily_rollups
+    balance = _total_as_of(session, currency, date_from - timedelta(days=1), closed)
+    net = dict(
+        session.execute(
+            select(DailyRollup.day_key, func.sum(DailyRollup.sign * DailyRollup.amount_minor))
+            .where(rollup_range_filter(currency, date_from, date_to))
+            .group_by(DailyRollup.day_key)
+        ).all()
+    )
+    points: List[NetWorthPoint] = []
+    day = date_from
+    while day <= date_to:
+        balance += int(net.get(to_day_key(day), 0))
+        points.append(NetWorthPoint(date=day, balance_minor=balance))
+        day += timedelta(days=1)
+    return points
+
+
+def _net_worth_series(
+    session: Session,
+    currency: str,
+    date_from: date,
+    date_to: date,
+    granularity: Granularity = "month",
+) -> NetWorthDTO:
+    """
+    Капитал (сумма балансов всех счетов, включая неактивные, в валюте
+    currency) на конец каждого месяца или дня периода.
+    """
+    if date_from > date_to:
+        raise ValueError("date_from must be <= date_to")
+    if granularity == "day":
+        if (date_to - date_from).days + 1 > NET_WORTH_MAX_DAYS:
+            raise ValueError(f"daily series is limited to {NET_WORTH_MAX_DAYS} days")
+        series = _daily_series
+    elif granularity == "month":
+        series = _monthly_series
+    else:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    closed = _closed_through(session)
+    return NetWorthDTO(
+        currency=currency,
+        granularity=granularity,
+        date_from=date_from,
+        date_to=date_to,
+        points=series(session, currency, date_from, date_to, closed),
+    )
+
+
+# ---------- Обслуживание ----------
+
+def rebuild_balance_checkpoints(session: Session, through: Optional[int] = None) -> int:
+    """Пересчитать таблицу целиком по transactions. Возвращает число строк."""
+    session.execute(delete(BalanceCheckpoint))
+    session.execute(delete(IdSequence).where(IdSequence.name == CHECKPOINT_SEQ))
+    return _close_months(session, through)
+
+
+def verify_balance_checkpoints(session: Session) -> List[dict]:
+    """
+    Сравнить сохранённые балансы на конец месяцев с пересчётом по
+    transactions. Возвращает список расхождений (пустой — всё сходится).
+    """
+    closed = _closed_through(session)
+    expected = (
+        {
+            (r["account_id"], r["currency"], r["month_key"]): r["balance_minor"]
+            for r in _closing_rows(session, None, closed, {})
+        }
+        if closed is not None
+        else {}
+    )
+    stored = {
+        (r.account_id, r.currency, r.month_key): r.balance_minor
+        for r in session.execute(select(BalanceCheckpoint)).scalars()
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        # строка с нулём и отсутствие строки до первой операции равнозначны
+        want, got = expected.get(key), stored.get(key)
+        if (want or 0) != (got or 0) or (want is not None and got is None):
+            mismatches.append(
+                {
+                    "account_id": key[0],
+                    "currency": key[1],
+                    "month_key": key[2],
+                    "expected_balance_minor": want or 0,
+                    "stored_balance_minor": got,
+                }
+            )
+    return mismatches
+
+
+# ---------- Синхронный API ----------
+
+def close_months(through: Optional[int] = None, *, session: Optional[Session] = None) -> int:
+    """Закрыть прошедшие месяцы (по умолчанию по прошлый включительно)."""
+    with session_scope(session) as session:
+        return _close_months(session, through)
+
+
+def get_balances_as_of(
+    as_of: date,
+    account_id: Optional[int] = None,
+    *,
+    session: Optional[Session] = None,
+) -> dict[PairKey, int]:
+    """Балансы {(account_id, currency): копейки} на конец дня as_of."""
+    with session_scope(session) as session:
+        return balances_as_of(session, as_of, account_id)
+
+
+def get_net_worth_series(
+    currency: str,
+    date_from: date,
+    date_to: date,
+    granularity: Granularity = "month",
+    *,
+    session: Optional[Session] = None,
+) -> NetWorthDTO:
+    """График капитала в валюте по месяцам или дням."""
+    with session_scope(session) as session:
+        return _net_worth_series(session, currency, date_from, date_to, granularity)
+
+
+# ---------- Асинхронный API ----------
+
+async def get_balances_as_of_async(
+    as_of: date,
+    account_id: Optional[int] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> dict[PairKey, int]:
+    """Асинхронный вариант get_balances_as_of."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(balances_as_of, as_of, account_id)
+
+
+async def get_net_worth_series_async(
+    currency: str,
+    date_from: date,
+    date_to: date,
+    granularity: Granularity = "month",
+    *,
+    session: Optional[AsyncSession] = None,
+) -> NetWorthDTO:
+    """Асинхронный вариант get_net_worth_series."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _net_worth_series, currency, date_from, date_to, granularity,
+        )
@@ -0,0 +1,410 @@
+"""
+Колоночный движок аналитики в памяти (NumPy), включается COLUMNAR_ENGINE=1.
+
+Операции без переводов (ровно то, что считает дашборд) лежат в массивах:
+  day       int64  — дни от 1970-01-01
+  month     int32  — месяцы от 1970-01
+  amount    int64  — amount_minor со знаком
+  currency  int16  — код валюты (словарь currencies)
+  category  int32  — код категории (словарь category_ids, 0 — без категории)
+  account   int32  — код счёта (словарь account_ids)
+Основные массивы отсортированы по (валюта, день): период в одной валюте —
+непрерывный срез, его границы ищет searchsorted, группировка — bincount.
+
+Записи применяются инкрементально после commit (services/transactions.py
+кладёт изменения в session.info, listener after_commit переносит их сюда):
+новые строки копятся в небольшом delta-буфере, удалённые помечаются
+в маске alive; когда буфер разрастается, всё сливается в основные
+массивы. Движок видит только записи своего процесса — как и кэш
+дашборда, он рассчитан на один worker.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость
+    np = None
+
+if TYPE_CHECKING:
+    from services.transactions import TransactionDTO
+
+# включить движок (нужен numpy)
+COLUMNAR_ENGINE = os.getenv("COLUMNAR_ENGINE", "0") == "1"
+# сколько строк копить в delta-буфере до слияния с основными массивами
+COLUMNAR_DELTA_LIMIT = int(os.getenv("COLUMNAR_DELTA_LIMIT", "4096"))
+
+logger = logging.getLogger("myfinance.columnar")
+
+_EPOCH = date(1970, 1, 1)
+_PENDING_KEY = "columnar_pending"
+_LOAD_CHUNK = 100_000
+# ключ сортировки основных массивов: валюта * _DAY_SPAN + день
+_DAY_SPAN = 1 << 32
+
+
+def _to_day(value: date) -> int:
+    return (value - _EPOCH).days
+
+
+def _day_to_date(day: int) -> date:
+    return _EPOCH + timedelta(days=int(day))
+
+
+def _day_to_month(day: int) -> int:
+    d = _day_to_date(day)
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def _month_to_key(month: int) -> int:
+    """Месяц от 1970-01 -> month_key (YYYYMM)."""
+    return (1970 + month // 12) * 100 + month % 12 + 1
+
+
+class ColumnarStore:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self.ready = False
+
+        self.currencies: List[str] = []
+        self.category_ids: List[Optional[int]] = [None]
+        self.account_ids: List[int] = []
+        self._currency_codes: dict[str, int] = {}
+        self._category_codes: dict[Optional[int], int] = {None: 0}
+        self._account_codes: dict[int, int] = {}
+
+        self._main: dict = {}
+        self._delta: dict[str, list] = {}
+        self._delta_arrays: Optional[dict] = None
+        self._delta_pos: dict[int, int] = {}
+        self._reset_delta()
+
+    # ---------- словари ----------
+
+    def _code(self, codes: dict, values: list, value) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            codes[value] = code
+            values.append(value)
+        return code
+
+    def currency_code(self, currency: str) -> Optional[int]:
+        return self._currency_codes.get(currency)
+
+    # ---------- загрузка ----------
+
+    def load(self, engine: Engine) -> int:
+        """Прочитать transactions целиком. Возвращает число строк."""
+        if np is None:
+            raise RuntimeError("COLUMNAR_ENGINE=1 requires numpy (pip install numpy)")
+
+        chunks = []
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                text(
+                    "SELECT id, day_key, amount_minor, currency, category_id, account_id "
+                    "FROM transactions WHERE transfer_group_id IS NULL "
+                    "ORDER BY day_key, id"
+                )
+            )
+            while True:
+                rows = result.fetchmany(_LOAD_CHUNK)
+                if not rows:
+                    break
+                chunks.append(self._encode_rows(rows))
+
+        with self._lock:
+            if chunks:
+                self._main = {
+                    name: np.concatenate([c[name] for c in chunks])
+                    for name in chunks[0]
+                }
+            else:
+                self._main = self._empty_columns()
+            self._sort_main()
+            self._reset_delta()
+            self.ready = True
+            return len(self._main["id"])
+
+    def _encode_rows(self, rows) -> dict:
+        ids, day_keys, amounts, currencies, categories, accounts = zip(*rows)
+        day_keys = np.array(day_keys, dtype=np.int64)
+        # YYYYMMDD -> дни от эпохи без разбора строк
+        months = (day_keys // 10000 - 1970) * 12 + (day_keys // 100 % 100 - 1)
+        days = (
+            months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+            + day_keys % 100
+            - 1
+        )
+        return {
+            "id": np.array(ids, dtype=np.int64),
+            "day": days,
+            "month": months.astype(np.int32),
+            "amount": np.array(amounts, dtype=np.int64),
+            "currency": np.array(
+                [self._code(self._currency_codes, self.currencies, c) for c in currencies],
+                dtype=np.int16,
+            ),
+            "category": np.array(
+                [self._code(self._category_codes, self.category_ids, c) for c in categories],
+                dtype=np.int32,
+            ),
+            "account": np.array(
+                [self._code(self._account_codes, self.account_ids, a) for a in accounts],
+                dtype=np.int32,
+            ),
+            "alive": np.ones(len(ids), dtype=bool),
+        }
+
+    def _empty_columns(self) -> dict:
+        return {
+            "id": np.empty(0, dtype=np.int64),
+            "day": np.empty(0, dtype=np.int64),
+            "month": np.empty(0, dtype=np.int32),
+            "amount": np.empty(0, dtype=np.int64),
+            "currency": np.empty(0, dtype=np.int16),
+            "category": np.empty(0, dtype=np.int32),
+            "account": np.empty(0, dtype=np.int32),
+            "alive": np.empty(0, dtype=bool),
+        }
+
+    def _sort_main(self) -> None:
+        main = self._main
+        keys = main["currency"].astype(np.int64) * _DAY_SPAN + main["day"]
+        order = np.argsort(keys, kind="stable")
+        self._main = {name: col[order] for name, col in main.items()}
+        self._keys = keys[order]
+        # удалённых строк в основных массивах нет до первого _remove
+        self._main_dead = 0
+        # поиск строки по id для удалений: argsort + searchsorted
+        self._id_order = np.argsort(self._main["id"], kind="stable")
+        self._ids_sorted = self._main["id"][self._id_order]
+
+    def _reset_delta(self) -> None:
+        self._delta = {name: [] for name in ("id", "day", "month", "amount",
+                                             "currency", "category", "account", "alive")}
+        self._delta_arrays = None
+        self._delta_pos = {}
+
+    # ---------- инкрементальные изменения ----------
+
+    def apply(self, added: Iterable, removed: Iterable) -> None:
+        """removed — состояние записей до изменения, added — после."""
+        with self._lock:
+            if not self.ready:
+                return
+            for tx in removed:
+                if tx.transfer_group_id is None:
+                    self._remove(tx.id)
+            for tx in added:
+                if tx.transfer_group_id is None:
+                    self._append(tx)
+            self._delta_arrays = None
+            if len(self._delta["id"]) > COLUMNAR_DELTA_LIMIT:
+                self._merge()
+
+    def _remove(self, tx_id: int) -> None:
+        pos = self._delta_pos.pop(tx_id, None)
+        if pos is not None:
+            self._delta["alive"][pos] = False
+            return
+        i = int(np.searchsorted(self._ids_sorted, tx_id))
+        if i < len(self._ids_sorted) and self._ids_sorted[i] == tx_id:
+            self._main["alive"][self._id_order[i]] = False
+            self._main_dead += 1
+
+    def _append(self, tx: "TransactionDTO") -> None:
+        day = _to_day(tx.dt.date())
+        self._delta_pos[tx.id] = len(self._delta["id"])
+        self._delta["id"].append(tx.id)
+        self._delta["day"].append(day)
+        self._delta["month"].append(_day_to_month(day))
+        self._delta["amount"].append(tx.amount_minor)
+        self._delta["currency"].append(
+            self._code(self._currency_codes, self.currencies, tx.currency)
+        )
+        self._delta["category"].append(
+            self._code(self._category_codes, self.category_ids, tx.category_id)
+        )
+        self._delta["account"].append(
+            self._code(self._account_codes, self.account_ids, tx.account_id)
+        )
+        self._delta["alive"].append(True)
+
+    def _delta_columns(self) -> dict:
+        if self._delta_arrays is None:
+            self._delta_arrays = {
+                name: np.array(values, dtype=self._main[name].dtype)
+                for name, values in self._delta.items()
+            }
+        return self._delta_arrays
+
+    def _merge(self) -> None:
+        delta = self._delta_columns()
+        merged = {}
+        keep_main = self._main["alive"]
+        keep_delta = delta["alive"]
+        for name in self._main:
+            merged[name] = np.concatenate(
+                [self._main[name][keep_main], delta[name][keep_delta]]
+            )
+        self._main = merged
+        self._sort_main()
+        self._reset_delta()
+
+    # ---------- запросы ----------
+
+    def _range(self, currency: str, date_from: date, date_to: date):
+        """Столбцы day/month/amount/category строк валюты за период."""
+        code = self.currency_code(currency)
+        if code is None:
+            return None
+
+        day_from, day_to = _to_day(date_from), _to_day(date_to)
+        main = self._main
+        lo = int(np.searchsorted(self._keys, code * _DAY_SPAN + day_from, side="left"))
+        hi = int(np.searchsorted(self._keys, code * _DAY_SPAN + day_to, side="right"))
+        # срез — представление без копирования, пока нечего отфильтровывать
+        parts = [{name: main[name][lo:hi] for name in ("day", "month", "amount", "category")}]
+        if self._main_dead:
+            alive = main["alive"][lo:hi]
+            parts[0] = {name: col[alive] for name, col in parts[0].items()}
+
+        if self._delta["id"]:
+            delta = self._delta_columns()
+            dmask = (
+                delta["alive"]
+                & (delta["currency"] == code)
+                & (delta["day"] >= day_from)
+                & (delta["day"] <= day_to)
+            )
+            parts.append({name: delta[name][dmask] for name in parts[0]})
+
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+    def totals(self, currency: str, date_from: date, date_to: date) -> tuple[int, int]:
+        """(доходы, расходы) за период, расходы по модулю."""
+        with self._lock:
+            cols = self._range(currency, date_from, date_to)
+        if cols is None:
+            return 0, 0
+        amount = cols["amount"]
+        income = int(amount[amount > 0].sum())
+        expense = int(-amount[amount < 0].sum())
+        return income, expense
+
+    def points(
+        self,
+        currency: str,
+        date_from: date,
+        date_to: date,
+        monthly: bool,
+    ) -> List[tuple[int, int, int]]:
+        """
+        [(day_key или month_key, доходы, расходы)] только по дням/месяцам,
+        в которых есть операции.
+        """
+        with self._lock:
+            cols = self._range(currency, date_from, date_to)
+        if cols is None or not len(cols["amount"]):
+            return []
+
+        amount = cols["amount"]
+        if monthly:
+            base = _day_to_month(_to_day(date_from))
+            idx = cols["month"].astype(np.int64) - base
+        else:
+            base = _to_day(date_from)
+            idx = cols["day"] - base
+
+        # веса float64 точны до 2**53 копеек — с запасом для личных финансов
+        counts = np.bincount(idx)
+        income = np.bincount(idx, weights=np.where(amount > 0, amount, 0))
+        expense = np.bincount(idx, weights=np.where(amount < 0, -amount, 0))
+
+        result = []
+        for i in np.flatnonzero(counts):
+            if monthly:
+                key = _month_to_key(base + int(i))
+            else:
+                d = _day_to_date(base + int(i))
+                key = d.year * 10000 + d.month * 100 + d.day
+            result.append((key, int(round(income[i])), int(round(expense[i]))))
+        return result
+
+    def category_totals(
+        self,
+        currency: str,
+        date_from: date,
+        date_to: date,
+        sign: int,
+    ) -> List[tuple[int, int]]:
+        """[(category_id, сумма по модулю)] по убыванию суммы; без категории не входят."""
+        with self._lock:
+            cols = self._range(currency, date_from, date_to)
+            category_ids = list(self.category_ids)
+        if cols is None:
+            return []
+
+        amount = cols["amount"]
+        mask = amount > 0 if sign > 0 else amount < 0
+        sums = np.bincount(
+            cols["category"][mask],
+            weights=np.abs(amount[mask]),
+            minlength=len(category_ids),
+        )
+        sums[0] = 0  # NO_CATEGORY
+        order = np.argsort(-sums, kind="stable")
+        return [
+            (category_ids[i], int(round(sums[i])))
+            for i in order
+            if sums[i] > 0
+        ]
+
+
+store = ColumnarStore()
+
+
+def is_ready() -> bool:
+    return COLUMNAR_ENGINE and store.ready
+
+
+def load(engine: Engine) -> None:
+    """Загрузить transactions при старте приложения (если движок включён)."""
+    if not COLUMNAR_ENGINE:
+        return
+    rows = store.load(engine)
+    logger.info("columnar engine loaded %d transactions", rows)
+
+
+def stage(session: Session, added: Iterable, removed: Iterable) -> None:
+    """Запомнить изменения; в движок они попадут после commit сессии."""
+    if not is_ready():
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    pending.append((list(added), list(removed)))
+
+
+# insert=True: изменения должны попасть в движок раньше, чем кэш дашборда
+# поднимет версии данных (его listener тоже висит на after_commit)
+@event.listens_for(Session, "after_commit", insert=True)
+def _apply_after_commit(session: Session) -> None:
+    for added, removed in session.info.pop(_PENDING_KEY, ()):
+        store.apply(added, removed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
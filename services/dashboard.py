@@ -1,18 +1,39 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
-from typing import Literal
+from datetime import date, timedelta
+from typing import List, Literal, Optional
 
-from sqlalchemy import case, func, select
+from sqlalchemy import and_, case, func, join, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from db import session_scope
-from models.account import Account
+from db import async_session_scope, session_scope
 from models.category import Category
-from models.transaction import Transaction
+from models.category_closure import CategoryClosure
+from models.daily_rollup import DailyRollup
+from models.transaction import month_key_to_date, to_day_key, to_month_key
+from services import columnar
+from services.dashboard_cache import (
+    ACCOUNTS_SCOPE,
+    ALL_CURRENCIES,
+    CATEGORIES_SCOPE,
+    FX_SCOPE,
+    balance_scope,
+    dashboard_cache,
+    dashboard_flights,
+    has_pending,
+    month_scope,
+    signature,
+)
+from services.balances import get_active_accounts_balance, get_active_accounts_balance_in
+from services.fx import converter
+from services.rollups import rollup_range_filter
 
 
 PeriodType = Literal["day", "week", "month", "quarter", "year"]
+# разбивка по категориям: leaf — как есть, parent — к категориям верхнего уровня
+CategoryRollup = Literal["leaf", "parent"]
 
 
 @dataclass
@@ -71,112 +92,160 @@ def _get_period_range(period: PeriodType, base_date: date) -> DateRange:
     raise ValueError(f"Unsupported period: {period}")
 
 
-def _base_tx_query(session, drange: DateRange):
-    return (
-        session.query(Transaction)
-        .filter(
-            Transaction.dt
-            >= datetime.combine(drange.date_from, datetime.min.time()),
-            Transaction.dt
-            <= datetime.combine(drange.date_to, datetime.max.time()),
-        )
+def _sum_by_sign(sign: int):
+    """SUM(amount_minor) по строкам daily_rollups с заданным знаком."""
+    return func.coalesce(
+        func.sum(
+            case(
+                (DailyRollup.sign == sign, DailyRollup.amount_minor),
+                else_=0,
+            ),
+        ),
+        0,
     )
 
 
-def get_summary(
+def _monthly_buckets(period: PeriodType) -> bool:
+    """day/week/month – разбивка по дням, quarter/year – по месяцам."""
+    return period in ("quarter", "year")
+
+
+def _trend_point(key: int, monthly: bool, income: int, expense: int) -> dict:
+    """Точка графика; подпись собирается из day_key/month_key без разбора строк."""
+    if monthly:
+        label = month_key_to_date(key).strftime("%b")  # Jan, Feb... (потом можно локализовать)
+    else:
+        label = f"{key % 100:02d}.{key // 100 % 100:02d}"
+    return {
+        "label": label,
+        "income_minor": int(income),
+        "expense_minor": int(expense),
+    }
+
+
+def _category_items(rows, limit: int) -> tuple[int, list]:
+    """
+    rows — (category_id, name, amount), уже по убыванию amount.
+    Возвращает общий итог и топ-limit категорий с долями.
+    """
+    total = sum(int(amount) for _, _, amount in rows)
+    categories = []
+    if total > 0:
+        for category_id, name, amount in rows[:limit]:
+            categories.append(
+                {
+                    "category_id": category_id,
+                    "name": name,
+                    "amount_minor": int(amount),
+                    "share": float(int(amount) / total),
+                },
+            )
+    return total, categories
+
+
+# ---------- Дерево категорий ----------
+# Свёртка и фильтр по поддереву идут через category_closure (см.
+# services/categories.py). Колоночный движок дерева не знает, в этих
+# режимах считаем по daily_rollups.
+
+def _use_columnar(rollup: CategoryRollup = "leaf", category_subtree: Optional[int] = None) -> bool:
+    return columnar.is_ready() and rollup == "leaf" and category_subtree is None
+
+
+def _subtree_filter(category_subtree: Optional[int]):
+    """
+    Условие на daily_rollups: категория category_subtree и все её потомки
+    (диапазон первичного ключа category_closure); None — без фильтра.
+    """
+    if category_subtree is None:
+        return true()
+    return DailyRollup.category_id.in_(
+        select(CategoryClosure.descendant_id)
+        .where(CategoryClosure.ancestor_id == category_subtree)
+    )
+
+
+def _join_category(query, category_id, rollup: CategoryRollup):
+    """
+    Присоединить к query (уже сгруппированные строки с колонкой category_id)
+    категорию для разбивки: leaf — саму категорию, parent — её предка
+    верхнего уровня (он у категории ровно один). Нет категории — NULL.
+    """
+    if rollup == "parent":
+        # предки категории по индексу (descendant_id), из них — без parent_id
+        roots = join(
+            CategoryClosure,
+            Category,
+            and_(Category.id == CategoryClosure.ancestor_id, Category.parent_id.is_(None)),
+        )
+        return query.outerjoin(roots, CategoryClosure.descendant_id == category_id)
+    return query.outerjoin(Category, Category.id == category_id)
+
+
+# Все агрегаты дашборда читаются из daily_rollups (дневные итоги,
+# переводы туда не попадают), поэтому время ответа зависит от числа
+# дней в периоде, а не от числа транзакций.
+
+def _accounts_balance(session: Session, currency: str) -> int:
+    """
+    Общий баланс активных счетов (учитывает все операции, включая переводы);
+    берём из материализованной таблицы account_balances.
+    """
+    return get_active_accounts_balance(session, currency)
+
+
+def _get_summary(
+    session: Session,
     period: PeriodType,
     base_date: date,
     currency: str = "RUB",
+    category_subtree: Optional[int] = None,
 ) -> dict:
     """
     Агрегаты для верхних карточек:
     чистый поток, доходы, расходы, суммарный баланс активных счетов.
     Переводы между счетами не учитываются.
+    category_subtree — только операции этой категории и её потомков.
     """
     drange = _get_period_range(period, base_date)
 
-    with session_scope() as session:
-        q = _base_tx_query(session, drange).filter(
-            Transaction.currency == currency,
-            Transaction.transfer_group_id.is_(None),  # исключаем переводы
+    if _use_columnar(category_subtree=category_subtree):
+        income_sum, expense_sum = columnar.store.totals(
+            currency, drange.date_from, drange.date_to,
         )
-
-        subq = q.with_entities(Transaction.id).subquery()
-
-        income_sum = (
+    else:
+        income_sum, expense_sum = (
             session.query(
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (Transaction.amount_minor > 0,
-                             Transaction.amount_minor),
-                            else_=0,
-                        ),
-                    ),
-                    0,
-                ),
+                _sum_by_sign(1),
+                _sum_by_sign(-1),
             )
-            .filter(Transaction.id.in_(select(subq.c.id)))
-            .scalar()
-        )
-
-        expense_sum = (
-            session.query(
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (Transaction.amount_minor < 0,
-                             -Transaction.amount_minor),
-                            else_=0,
-                        ),
-                    ),
-                    0,
-                ),
-            )
-            .filter(Transaction.id.in_(select(subq.c.id)))
-            .scalar()
-        )
-
-        net_flow = int(income_sum) - int(expense_sum)
-
-        # общий баланс активных счетов (баланс считаем по всем операциям,
-        # включая переводы, чтобы баланс по счёту был честный)
-        accounts_subq = (
-            session.query(Account.id)
             .filter(
-                Account.is_active == True,  # noqa: E712
-                Account.currency == currency,
+                rollup_range_filter(currency, drange.date_from, drange.date_to),
+                _subtree_filter(category_subtree),
             )
-            .subquery()
+            .one()
         )
 
-        balance_sum = (
-            session.query(
-                func.coalesce(func.sum(Transaction.amount_minor), 0),
-            )
-            .filter(
-                Transaction.account_id.in_(select(accounts_subq.c.id)),
-                Transaction.currency == currency,
-            )
-            .scalar()
-        )
+    net_flow = int(income_sum) - int(expense_sum)
 
-        return {
-            "period": period,
-            "date_from": drange.date_from,
-            "date_to": drange.date_to,
-            "income_minor": int(income_sum),
-            "expense_minor": int(expense_sum),
-            "net_flow_minor": int(net_flow),
-            "accounts_balance_minor": int(balance_sum),
-            "currency": currency,
-        }
+    return {
+        "period": period,
+        "date_from": drange.date_from,
+        "date_to": drange.date_to,
+        "income_minor": int(income_sum),
+        "expense_minor": int(expense_sum),
+        "net_flow_minor": int(net_flow),
+        "accounts_balance_minor": _accounts_balance(session, currency),
+        "currency": currency,
+    }
 
 
-def get_trends(
+def _get_trends(
+    session: Session,
     period: PeriodType,
     base_date: date,
     currency: str = "RUB",
+    category_subtree: Optional[int] = None,
 ) -> dict:
     """
     Точки для графика доходов/расходов.
@@ -185,283 +254,740 @@ def get_trends(
     """
     drange = _get_period_range(period, base_date)
 
-    with session_scope() as session:
-        if period in ("day", "week", "month"):
-            # разбивка по дням
-            q = (
-                session.query(
-                    func.date(Transaction.dt).label("d"),
-                    func.coalesce(
-                        func.sum(
-                            case(
-                                (Transaction.amount_minor > 0,
-                                 Transaction.amount_minor),
-                                else_=0,
-                            ),
-                        ),
-                        0,
-                    ).label("income"),
-                    func.coalesce(
-                        func.sum(
-                            case(
-                                (Transaction.amount_minor < 0,
-                                 -Transaction.amount_minor),
-                                else_=0,
-                            ),
-                        ),
-                        0,
-                    ).label("expense"),
-                )
-                .filter(
-                    Transaction.dt
-                    >= datetime.combine(
-                        drange.date_from,
-                        datetime.min.time(),
-                    ),
-                    Transaction.dt
-                    <= datetime.combine(
-                        drange.date_to,
-                        datetime.max.time(),
-                    ),
-                    Transaction.currency == currency,
-                    Transaction.transfer_group_id.is_(None),  # исключаем переводы
-                )
-                .group_by(func.date(Transaction.dt))
-                .order_by(func.date(Transaction.dt))
+    if _use_columnar(category_subtree=category_subtree):
+        monthly = _monthly_buckets(period)
+        points = [
+            _trend_point(key, monthly, income, expense)
+            for key, income, expense in columnar.store.points(
+                currency, drange.date_from, drange.date_to, monthly,
+            )
+        ]
+    # группируем по целочисленным ключам (индексы по currency + ключ),
+    # подписи собираем из ключа арифметикой, без разбора строк
+    elif not _monthly_buckets(period):
+        # разбивка по дням
+        q = (
+            session.query(
+                DailyRollup.day_key.label("key"),
+                _sum_by_sign(1).label("income"),
+                _sum_by_sign(-1).label("expense"),
+            )
+            .filter(
+                rollup_range_filter(currency, drange.date_from, drange.date_to),
+                _subtree_filter(category_subtree),
             )
+            .group_by(DailyRollup.day_key)
+            .order_by(DailyRollup.day_key)
+        )
 
-            rows = q.all()
-            points = []
-            for r in rows:
-                # SQLite часто отдаёт date как строку
-                if isinstance(r.d, str):
-                    d = datetime.strptime(r.d, "%Y-%m-%d").date()
-                else:
-                    d = r.d
-                points.append(
-                    {
-                        "label": d.strftime("%d.%m"),
-                        "income_minor": int(r.income),
-                        "expense_minor": int(r.expense),
-                    },
-                )
-        else:
-            # year/quarter – помесячная разбивка
-            q = (
-                session.query(
-                    func.strftime("%Y-%m-01", Transaction.dt).label("m"),
-                    func.coalesce(
-                        func.sum(
-                            case(
-                                (Transaction.amount_minor > 0,
-                                 Transaction.amount_minor),
-                                else_=0,
-                            ),
-                        ),
-                        0,
-                    ).label("income"),
-                    func.coalesce(
-                        func.sum(
-                            case(
-                                (Transaction.amount_minor < 0,
-                                 -Transaction.amount_minor),
-                                else_=0,
-                            ),
-                        ),
-                        0,
-                    ).label("expense"),
-                )
-                .filter(
-                    Transaction.dt
-                    >= datetime.combine(
-                        drange.date_from,
-                        datetime.min.time(),
-                    ),
-                    Transaction.dt
-                    <= datetime.combine(
-                        drange.date_to,
-                        datetime.max.time(),
-                    ),
-                    Transaction.currency == currency,
-                    Transaction.transfer_group_id.is_(None),  # исключаем переводы
-                )
-                .group_by("m")
-                .order_by("m")
+        points = [
+            _trend_point(r.key, False, r.income, r.expense) for r in q.all()
+        ]
+    else:
+        # year/quarter – помесячная разбивка
+        q = (
+            session.query(
+                DailyRollup.month_key.label("key"),
+                _sum_by_sign(1).label("income"),
+                _sum_by_sign(-1).label("expense"),
+            )
+            .filter(
+                DailyRollup.currency == currency,
+                DailyRollup.month_key >= to_month_key(drange.date_from),
+                DailyRollup.month_key <= to_month_key(drange.date_to),
+                _subtree_filter(category_subtree),
             )
+            .group_by(DailyRollup.month_key)
+            .order_by(DailyRollup.month_key)
+        )
 
-            rows = q.all()
-            points = []
-            for r in rows:
-                d = datetime.strptime(r.m, "%Y-%m-01").date()
-                label = d.strftime("%b")  # Jan, Feb... (потом можно локализовать)
-                points.append(
-                    {
-                        "label": label,
-                        "income_minor": int(r.income),
-                        "expense_minor": int(r.expense),
-                    },
-                )
+        points = [
+            _trend_point(r.key, True, r.income, r.expense) for r in q.all()
+        ]
+
+    return {
+        "period": period,
+        "date_from": drange.date_from,
+        "date_to": drange.date_to,
+        "points": points,
+        "currency": currency,
+    }
+
+
+def _top_categories(
+    session: Session,
+    drange: DateRange,
+    currency: str,
+    sign: int,
+    limit: int,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+) -> tuple[int, list]:
+    """
+    Суммы по категориям за период для одного знака (1 доходы, -1 расходы):
+    общий итог и топ-limit категорий по убыванию суммы.
+    Операции без категории в топ не попадают.
+    """
+    if _use_columnar(rollup, category_subtree):
+        totals = columnar.store.category_totals(
+            currency, drange.date_from, drange.date_to, sign,
+        )
+        # из SQLite — только названия (поиск по первичному ключу)
+        names = dict(
+            session.query(Category.id, Category.name)
+            .filter(Category.id.in_([cid for cid, _ in totals]))
+            .all()
+        ) if totals else {}
+        rows = [(cid, names[cid], amount) for cid, amount in totals if cid in names]
+        return _category_items(rows, limit)
+
+    # сначала группируем по категории, потом присоединяем категорию
+    # (или её верхний уровень) к сгруппированным строкам
+    grouped = (
+        session.query(
+            DailyRollup.category_id.label("category_id"),
+            func.sum(DailyRollup.amount_minor).label("amount"),
+        )
+        .filter(
+            rollup_range_filter(currency, drange.date_from, drange.date_to),
+            DailyRollup.sign == sign,
+            _subtree_filter(category_subtree),
+        )
+        .group_by(DailyRollup.category_id)
+        .subquery()
+    )
+    amount = func.sum(grouped.c.amount)
+    q = (
+        _join_category(
+            session.query(
+                Category.id.label("category_id"),
+                Category.name.label("name"),
+                amount.label("amount"),
+            ).select_from(grouped),
+            grouped.c.category_id,
+            rollup,
+        )
+        .filter(Category.id.isnot(None))
+        .group_by(Category.id, Category.name)
+        .order_by(amount.desc())
+    )
 
-        return {
-            "period": period,
-            "date_from": drange.date_from,
-            "date_to": drange.date_to,
-            "points": points,
-            "currency": currency,
-        }
+    return _category_items(q.all(), limit)
 
 
-def get_categories_summary(
+def _get_categories_summary(
+    session: Session,
     period: PeriodType,
     base_date: date,
     currency: str = "RUB",
     limit: int = 5,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
 ) -> dict:
     """
     Данные для круговой диаграммы и топ-таблицы категорий (только расходы).
     Переводы не учитываются.
     """
     drange = _get_period_range(period, base_date)
+    total_expense, categories = _top_categories(
+        session, drange, currency, -1, limit, rollup, category_subtree,
+    )
 
-    with session_scope() as session:
-        q = (
-            session.query(
-                Category.id.label("category_id"),
-                Category.name.label("name"),
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (Transaction.amount_minor < 0,
-                             -Transaction.amount_minor),
-                            else_=0,
-                        ),
-                    ),
-                    0,
-                ).label("amount"),
-            )
-            .join(Transaction, Transaction.category_id == Category.id)
-            .filter(
-                Transaction.dt
-                >= datetime.combine(
-                    drange.date_from,
-                    datetime.min.time(),
-                ),
-                Transaction.dt
-                <= datetime.combine(
-                    drange.date_to,
-                    datetime.max.time(),
-                ),
-                Transaction.currency == currency,
-                Transaction.amount_minor < 0,
-                Transaction.transfer_group_id.is_(None),  # только реальные расходы
-            )
-            .group_by(Category.id, Category.name)
-            # самые большие расходы (amount отрицательный в Transaction,
-            # но мы уже перевернули знак в case, сортируем по сумме по возрастанию)
-            .order_by(func.sum(Transaction.amount_minor))
-        )
-
-        rows = q.all()
-
-        total_expense = sum(int(r.amount) for r in rows)
-        if total_expense == 0:
-            categories = []
-        else:
-            categories = []
-            for r in rows[:limit]:
-                amount = int(r.amount)
-                share = amount / total_expense if total_expense > 0 else 0
-                categories.append(
-                    {
-                        "category_id": r.category_id,
-                        "name": r.name,
-                        "amount_minor": amount,
-                        "share": float(share),
-                    },
-                )
+    return {
+        "period": period,
+        "date_from": drange.date_from,
+        "date_to": drange.date_to,
+        "total_amount_minor": int(total_expense),
+        "currency": currency,
+        "categories": categories,
+    }
 
-        return {
-            "period": period,
-            "date_from": drange.date_from,
-            "date_to": drange.date_to,
-            "total_amount_minor": int(total_expense),
-            "currency": currency,
-            "categories": categories,
-        }
 
-def get_income_categories_summary(
+def _get_income_categories_summary(
+    session: Session,
     period: PeriodType,
     base_date: date,
     currency: str = "RUB",
     limit: int = 5,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
 ) -> dict:
     """
     Данные для круговой диаграммы и топ-таблицы категорий (только доходы).
     Переводы не учитываются.
     """
     drange = _get_period_range(period, base_date)
+    total_income, categories = _top_categories(
+        session, drange, currency, 1, limit, rollup, category_subtree,
+    )
 
-    with session_scope() as session:
-        q = (
+    return {
+        "period": period,
+        "date_from": drange.date_from,
+        "date_to": drange.date_to,
+        "total_amount_minor": int(total_income),
+        "currency": currency,
+        "categories": categories,
+    }
+
+
+def _get_bundle(
+    session: Session,
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+) -> dict:
+    """
+    Все виджеты дашборда разом: summary, trends, categories, income_categories.
+    Итоги, точки графика и обе разбивки по категориям считаются из одного
+    сгруппированного прохода по daily_rollups за период
+    (корзина × категория × знак); вторым запросом — баланс счетов.
+    """
+    if _use_columnar(rollup, category_subtree):
+        # в движке каждый виджет — срез массивов и bincount,
+        # общий проход по rollups здесь ничего не экономит
+        return {
+            "summary": _get_summary(session, period, base_date, currency),
+            "trends": _get_trends(session, period, base_date, currency),
+            "categories": _get_categories_summary(
+                session, period, base_date, currency, limit,
+            ),
+            "income_categories": _get_income_categories_summary(
+                session, period, base_date, currency, limit,
+            ),
+        }
+
+    drange = _get_period_range(period, base_date)
+    monthly = _monthly_buckets(period)
+    bucket = DailyRollup.month_key if monthly else DailyRollup.day_key
+
+    # сначала группируем, потом подтягиваем имена категорий —
+    # join идёт по сгруппированным строкам, а не по каждому дню
+    grouped = (
+        session.query(
+            bucket.label("key"),
+            DailyRollup.category_id.label("category_id"),
+            DailyRollup.sign.label("sign"),
+            func.sum(DailyRollup.amount_minor).label("amount"),
+        )
+        .filter(
+            rollup_range_filter(currency, drange.date_from, drange.date_to),
+            _subtree_filter(category_subtree),
+        )
+        .group_by(bucket, DailyRollup.category_id, DailyRollup.sign)
+        .subquery()
+    )
+    rows = (
+        _join_category(
             session.query(
-                Category.id.label("category_id"),
-                Category.name.label("name"),
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (Transaction.amount_minor > 0,
-                             Transaction.amount_minor),
-                            else_=0,
-                        ),
-                    ),
-                    0,
-                ).label("amount"),
-            )
-            .join(Transaction, Transaction.category_id == Category.id)
-            .filter(
-                Transaction.dt
-                >= datetime.combine(
-                    drange.date_from,
-                    datetime.min.time(),
-                ),
-                Transaction.dt
-                <= datetime.combine(
-                    drange.date_to,
-                    datetime.max.time(),
-                ),
-                Transaction.currency == currency,
-                Transaction.amount_minor > 0,
-                Transaction.transfer_group_id.is_(None),  # только реальные доходы
-            )
-            .group_by(Category.id, Category.name)
-            # самые большие доходы (сортируем по сумме по убыванию)
-            .order_by(func.sum(Transaction.amount_minor).desc())
+                grouped.c.key,
+                Category.id,
+                Category.name,
+                grouped.c.sign,
+                grouped.c.amount,
+            ).select_from(grouped),
+            grouped.c.category_id,
+            rollup,
         )
+        .order_by(grouped.c.key)
+        .all()
+    )
+    return _bundle_payload(
+        period, drange, monthly, currency, limit, rows, _accounts_balance(session, currency),
+    )
 
-        rows = q.all()
 
-        total_income = sum(int(r.amount) for r in rows)
-        if total_income == 0:
-            categories = []
-        else:
-            categories = []
-            for r in rows[:limit]:
-                amount = int(r.amount)
-                share = amount / total_income if total_income > 0 else 0
-                categories.append(
-                    {
-                        "category_id": r.category_id,
-                        "name": r.name,
-                        "amount_minor": amount,
-                        "share": float(share),
-                    },
-                )
+def _bundle_payload(
+    period: PeriodType,
+    drange: DateRange,
+    monthly: bool,
+    currency: str,
+    limit: int,
+    rows,
+    accounts_balance: int,
+) -> dict:
+    """
+    Все виджеты из строк (корзина, category_id, название, знак, сумма),
+    отсортированных по корзине.
+    """
+    totals = {1: 0, -1: 0}
+    buckets: dict[int, dict[int, int]] = {}
+    by_category: dict[int, dict[tuple[int, str], int]] = {1: {}, -1: {}}
+    # распаковка кортежа заметно быстрее доступа к атрибутам Row
+    for key, category_id, name, sign, amount in rows:
+        amount = int(amount)
+        totals[sign] += amount
+        point = buckets.setdefault(key, {1: 0, -1: 0})
+        point[sign] += amount
+        # в разбивку по категориям идут только существующие категории
+        if name is not None:
+            cat_key = (category_id, name)
+            by_category[sign][cat_key] = by_category[sign].get(cat_key, 0) + amount
+
+    header = {
+        "period": period,
+        "date_from": drange.date_from,
+        "date_to": drange.date_to,
+        "currency": currency,
+    }
+
+    def categories_payload(sign: int) -> dict:
+        ranked = sorted(
+            ((cid, name, amount) for (cid, name), amount in by_category[sign].items()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+        total, categories = _category_items(ranked, limit)
+        return {**header, "total_amount_minor": total, "categories": categories}
+
+    return {
+        "summary": {
+            **header,
+            "income_minor": totals[1],
+            "expense_minor": totals[-1],
+            "net_flow_minor": totals[1] - totals[-1],
+            "accounts_balance_minor": accounts_balance,
+        },
+        "trends": {
+            **header,
+            "points": [
+                _trend_point(key, monthly, point[1], point[-1])
+                for key, point in buckets.items()
+            ],
+        },
+        "categories": categories_payload(-1),
+        "income_categories": categories_payload(1),
+    }
+
+
+# ---------- Пересчёт в валюту отчёта ----------
+
+def _bucket_date(key: int, monthly: bool) -> date:
+    """День корзины графика; у месяца — последний день."""
+    if monthly:
+        return (month_key_to_date(key) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return date(key // 10000, key // 100 % 100, key % 100)
+
+
+def _get_report_bundle(
+    session: Session,
+    period: PeriodType,
+    base_date: date,
+    report_currency: str,
+    limit: int = 5,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+) -> dict:
+    """
+    Виджеты дашборда по операциям во всех валютах в пересчёте
+    в report_currency. Тот же проход по daily_rollups, что в _get_bundle,
+    только группы ещё и по валюте; каждая группа (корзина × валюта ×
+    категория × знак) пересчитывается одним курсом на день корзины
+    (у месяца — на последний день), баланс счетов — по сегодняшнему.
+    Колоночный движок здесь не используется.
+    """
+    drange = _get_period_range(period, base_date)
+    monthly = _monthly_buckets(period)
+    bucket = DailyRollup.month_key if monthly else DailyRollup.day_key
+
+    grouped = (
+        session.query(
+            bucket.label("key"),
+            DailyRollup.currency.label("currency"),
+            DailyRollup.category_id.label("category_id"),
+            DailyRollup.sign.label("sign"),
+            func.sum(DailyRollup.amount_minor).label("amount"),
+        )
+        .filter(
+            DailyRollup.day_key >= to_day_key(drange.date_from),
+            DailyRollup.day_key <= to_day_key(drange.date_to),
+            _subtree_filter(category_subtree),
+        )
+        .group_by(bucket, DailyRollup.currency, DailyRollup.category_id, DailyRollup.sign)
+        .subquery()
+    )
+    rows = (
+        _join_category(
+            session.query(
+                grouped.c.key,
+                grouped.c.currency,
+                Category.id,
+                Category.name,
+                grouped.c.sign,
+                grouped.c.amount,
+            ).select_from(grouped),
+            grouped.c.category_id,
+            rollup,
+        )
+        .order_by(grouped.c.key)
+        .all()
+    )
 
-        return {
-            "period": period,
-            "date_from": drange.date_from,
-            "date_to": drange.date_to,
-            "total_amount_minor": int(total_income),
-            "currency": currency,
-            "categories": categories,
-        }
\ No newline at end of file
+    convert = converter(session, report_currency)
+    converted = [
+        (key, category_id, name, sign, convert(int(amount), currency, _bucket_date(key, monthly)))
+        for key, currency, category_id, name, sign, amount in rows
+    ]
+    return _bundle_payload(
+        period,
+        drange,
+        monthly,
+        report_currency,
+        limit,
+        converted,
+        get_active_accounts_balance_in(session, report_currency),
+    )
+
+
+def _report_core(name: str):
+    """Виджет name из _get_report_bundle (сигнатура как у обычных функций)."""
+    def core(session, period, base_date, report_currency, limit=5, **options):
+        bundle = _get_report_bundle(
+            session, period, base_date, report_currency, limit, **options,
+        )
+        return bundle if name == "bundle" else bundle[name]
+
+    return core
+
+
+_REPORT_CORES = {
+    name: _report_core(name)
+    for name in ("summary", "trends", "categories", "income_categories", "bundle")
+}
+
+
+# ---------- Кэш ----------
+# Результат зависит от месяцев периода в валюте; summary и bundle — ещё
+# и от балансов/счетов, разбивки по категориям — от названий категорий.
+
+_CACHE_DEPS = {
+    # функция: (балансы счетов, категории)
+    "summary": (True, False),
+    "trends": (False, False),
+    "categories": (False, True),
+    "income_categories": (False, True),
+    "bundle": (True, True),
+}
+
+
+def _period_month_keys(drange: DateRange) -> List[int]:
+    keys = []
+    month = drange.date_from.replace(day=1)
+    while month <= drange.date_to:
+        keys.append(to_month_key(month))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return keys
+
+
+def _cache_entry(
+    name: str,
+    period: PeriodType,
+    base_date: date,
+    currency: str,
+    limit: Optional[int],
+    report: bool = False,
+    options: Optional[dict] = None,
+) -> tuple[tuple, tuple]:
+    """
+    Ключ и подпись (версии данных) результата.
+    base_date приводится к началу периода: любая дата внутри месяца
+    даёт один и тот же результат и одну запись в кэше.
+    report — currency это валюта отчёта: результат зависит от операций
+    во всех валютах и от курсов.
+    options — rollup / category_subtree: результат зависит ещё и от
+    дерева категорий.
+    """
+    options = options or {}
+    drange = _get_period_range(period, base_date)
+    key = (name, period, drange.date_from, currency, limit, report, tuple(sorted(options.items())))
+
+    with_balance, with_categories = _CACHE_DEPS[name]
+    with_categories = with_categories or (
+        options.get("rollup", "leaf") != "leaf" or options.get("category_subtree") is not None
+    )
+    data_currency = ALL_CURRENCIES if report else currency
+    scopes = [month_scope(data_currency, m) for m in _period_month_keys(drange)]
+    if with_balance:
+        scopes += [balance_scope(data_currency), ACCOUNTS_SCOPE]
+    if with_categories:
+        scopes.append(CATEGORIES_SCOPE)
+    if report:
+        scopes.append(FX_SCOPE)
+    return key, signature(scopes)
+
+
+def _cacheable(session: Optional[Session]) -> bool:
+    """
+    Не кэшируем результат, посчитанный в сессии с собственными
+    незакоммиченными изменениями дашбордных данных.
+    """
+    return dashboard_cache.enabled and (session is None or not has_pending(session))
+
+
+def _cached(
+    name, core, session, period, base_date, currency, *args, report_currency=None, **options,
+):
+    # report_currency: все валюты в пересчёте, currency не используется;
+    # options — rollup / category_subtree, передаются в core как есть
+    if report_currency is not None:
+        core, currency = _REPORT_CORES[name], report_currency
+    report = report_currency is not None
+
+    if not _cacheable(session):
+        with session_scope(session) as session:
+            return core(session, period, base_date, currency, *args, **options)
+
+    key, sig = _cache_entry(
+        name, period, base_date, currency, args[0] if args else None, report, options,
+    )
+    data = dashboard_cache.get(key, sig)
+    if data is None:
+        with session_scope(session) as session:
+            data = core(session, period, base_date, currency, *args, **options)
+        dashboard_cache.put(key, sig, data)
+    return data
+
+
+async def _cached_async(
+    name, core, session, period, base_date, currency, *args, report_currency=None, **options,
+):
+    """
+    Асинхронный путь: кэш + single-flight. Одинаковые параллельные запросы
+    (несколько вкладок, несколько членов семьи) ждут один расчёт.
+    Ключ расчёта включает подпись версий: вызов, пришедший после записи,
+    не получит результат расчёта, начатого до неё.
+    """
+    if report_currency is not None:
+        core, currency = _REPORT_CORES[name], report_currency
+    report = report_currency is not None
+
+    if session is not None and has_pending(session.sync_session):
+        return await session.run_sync(core, period, base_date, currency, *args, **options)
+
+    key, sig = _cache_entry(
+        name, period, base_date, currency, args[0] if args else None, report, options,
+    )
+    if dashboard_cache.enabled:
+        data = dashboard_cache.get(key, sig)
+        if data is not None:
+            return data
+
+    async def compute():
+        async with async_session_scope(session) as scoped:
+            data = await scoped.run_sync(core, period, base_date, currency, *args, **options)
+        if dashboard_cache.enabled:
+            dashboard_cache.put(key, sig, data)
+        return data
+
+    return await dashboard_flights.run((key, sig), compute)
+
+
+def get_cache_stats() -> dict:
+    """Метрики кэша дашборда и склейки параллельных запросов."""
+    return {**dashboard_cache.stats(), **dashboard_flights.stats()}
+
+
+# ---------- Синхронный API ----------
+# Результаты берутся из кэша; возвращаемые dict общие для всех
+# вызывающих, изменять их нельзя.
+# category_subtree — только операции категории и её потомков,
+# rollup="parent" — разбивка по категориям верхнего уровня.
+
+def get_summary(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    *,
+    report_currency: Optional[str] = None,
+    category_subtree: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> dict:
+    """Агрегаты для верхних карточек (см. _get_summary)."""
+    return _cached(
+        "summary", _get_summary, session, period, base_date, currency,
+        report_currency=report_currency,
+        category_subtree=category_subtree,
+    )
+
+
+def get_trends(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    *,
+    report_currency: Optional[str] = None,
+    category_subtree: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> dict:
+    """Точки для графика доходов/расходов (см. _get_trends)."""
+    return _cached(
+        "trends", _get_trends, session, period, base_date, currency,
+        report_currency=report_currency,
+        category_subtree=category_subtree,
+    )
+
+
+def get_categories_summary(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> dict:
+    """Топ категорий расходов (см. _get_categories_summary)."""
+    return _cached(
+        "categories", _get_categories_summary, session, period, base_date, currency, limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
+
+
+def get_income_categories_summary(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> dict:
+    """Топ категорий доходов (см. _get_income_categories_summary)."""
+    return _cached(
+        "income_categories",
+        _get_income_categories_summary,
+        session,
+        period,
+        base_date,
+        currency,
+        limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
+
+
+def get_bundle(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[Session] = None,
+) -> dict:
+    """Все виджеты дашборда одним проходом (см. _get_bundle)."""
+    return _cached(
+        "bundle", _get_bundle, session, period, base_date, currency, limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
+
+
+# ---------- Асинхронный API ----------
+
+async def get_summary_async(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    *,
+    report_currency: Optional[str] = None,
+    category_subtree: Optional[int] = None,
+    session: Optional[AsyncSession] = None,
+) -> dict:
+    return await _cached_async(
+        "summary", _get_summary, session, period, base_date, currency,
+        report_currency=report_currency,
+        category_subtree=category_subtree,
+    )
+
+
+async def get_trends_async(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    *,
+    report_currency: Optional[str] = None,
+    category_subtree: Optional[int] = None,
+    session: Optional[AsyncSession] = None,
+) -> dict:
+    return await _cached_async(
+        "trends", _get_trends, session, period, base_date, currency,
+        report_currency=report_currency,
+        category_subtree=category_subtree,
+    )
+
+
+async def get_categories_summary_async(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[AsyncSession] = None,
+) -> dict:
+    return await _cached_async(
+        "categories", _get_categories_summary, session, period, base_date, currency, limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
+
+
+async def get_income_categories_summary_async(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[AsyncSession] = None,
+) -> dict:
+    return await _cached_async(
+        "income_categories",
+        _get_income_categories_summary,
+        session,
+        period,
+        base_date,
+        currency,
+        limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
+
+
+async def get_bundle_async(
+    period: PeriodType,
+    base_date: date,
+    currency: str = "RUB",
+    limit: int = 5,
+    *,
+    report_currency: Optional[str] = None,
+    rollup: CategoryRollup = "leaf",
+    category_subtree: Optional[int] = None,
+    session: Optional[AsyncSession] = None,
+) -> dict:
+    return await _cached_async(
+        "bundle", _get_bundle, session, period, base_date, currency, limit,
+        report_currency=report_currency,
+        rollup=rollup,
+        category_subtree=category_subtree,
+    )
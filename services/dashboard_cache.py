@@ -0,0 +1,261 @@
+"""
+Кэш результатов дашборда с версионной инвалидацией.
+
+Каждый результат хранится вместе с «подписью» — версиями данных, из которых
+он посчитан: (currency, month_key) для месяцев периода, баланс валюты,
+справочник категорий. Запись операций поднимает версии только затронутых
+месяцев и валют, поэтому прошлые месяцы остаются в кэше, пока в них ничего
+не меняется.
+
+Версии поднимаются после commit (Session.after_commit): если поднять их
+раньше, параллельный читатель может посчитать старые данные и сохранить
+их под новой версией. Кэш живёт в памяти процесса; при нескольких
+worker-процессах записи в одном не видны другим, их ограничивает TTL.
+
+Одинаковые параллельные расчёты склеиваются (single-flight): пока расчёт
+по ключу идёт, остальные вызовы с тем же ключом ждут его результат.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.transaction import to_month_key
+
+# сколько результатов держать в памяти (0 — кэш выключен)
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "512"))
+# сколько секунд результат считается свежим даже без записей
+DASHBOARD_CACHE_TTL_S = float(os.getenv("DASHBOARD_CACHE_TTL_S", "300"))
+
+# ключ в session.info, где копятся затронутые области до commit
+_PENDING_KEY = "dashboard_cache_pending"
+
+Scope = tuple
+
+# «все валюты»: отчёты с пересчётом в одну валюту (report_currency)
+# зависят от операций в любой валюте
+ALL_CURRENCIES = "*"
+
+
+def month_scope(currency: str, month_key: int) -> Scope:
+    """Итоги операций в валюте за месяц (daily_rollups)."""
+    return ("month", currency, month_key)
+
+
+def balance_scope(currency: str) -> Scope:
+    """Балансы счетов в валюте (account_balances)."""
+    return ("balance", currency)
+
+
+ACCOUNTS_SCOPE: Scope = ("accounts",)      # активность / валюта счетов
+CATEGORIES_SCOPE: Scope = ("categories",)  # названия категорий
+FX_SCOPE: Scope = ("fx",)                  # курсы валют (fx_rates)
+
+
+# ---------- Версии данных ----------
+
+_versions: dict[Scope, int] = defaultdict(int)
+_versions_lock = threading.Lock()
+
+
+def signature(scopes: Iterable[Scope]) -> tuple:
+    """Текущие версии перечисленных областей."""
+    with _versions_lock:
+        return tuple(_versions[s] for s in scopes)
+
+
+def bump(scopes: Iterable[Scope]) -> None:
+    with _versions_lock:
+        for s in scopes:
+            _versions[s] += 1
+
+
+def mark_dirty(session: Session, scopes: Iterable[Scope]) -> None:
+    """Запомнить затронутые области; версии поднимутся после commit сессии."""
+    session.info.setdefault(_PENDING_KEY, set()).update(scopes)
+
+
+def has_pending(session: Session) -> bool:
+    """Есть ли в сессии незакоммиченные изменения данных дашборда."""
+    return bool(session.info.get(_PENDING_KEY))
+
+
+def mark_transactions(session: Session, rows: Iterable) -> None:
+    """
+    Области, затронутые изменением записей transactions:
+    баланс валюты — всегда, месяц — только для операций вне переводов;
+    то же для ALL_CURRENCIES.
+    """
+    scopes = set()
+    for tx in rows:
+        scopes.add(balance_scope(tx.currency))
+        scopes.add(balance_scope(ALL_CURRENCIES))
+        if tx.transfer_group_id is None:
+            month_key = to_month_key(tx.dt)
+            scopes.add(month_scope(tx.currency, month_key))
+            scopes.add(month_scope(ALL_CURRENCIES, month_key))
+    if scopes:
+        mark_dirty(session, scopes)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        bump(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ---------- LRU/TTL-кэш ----------
+
+@dataclass
+class CacheStats:
+    size: int = 0
+    max_size: int = 0
+    ttl_s: float = 0.0
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0        # промах из-за изменившейся версии данных
+    expired: int = 0      # промах по TTL
+    evictions: int = 0    # вытеснено по LRU
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class DashboardCache:
+    def __init__(self, max_size: int, ttl_s: float) -> None:
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._items: OrderedDict[Hashable, tuple[tuple, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats(max_size=max_size, ttl_s=ttl_s)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable, sig: tuple) -> Optional[Any]:
+        """Значение, если оно посчитано по тем же версиям и не устарело по TTL."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._stats.misses += 1
+                return None
+
+            item_sig, stored_at, value = item
+            if item_sig != sig:
+                del self._items[key]
+                self._stats.misses += 1
+                self._stats.stale += 1
+                return None
+            if time.monotonic() - stored_at > self.ttl_s:
+                del self._items[key]
+                self._stats.misses += 1
+                self._stats.expired += 1
+                return None
+
+            self._items.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def put(self, key: Hashable, sig: tuple, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (sig, time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self._stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._stats.size = len(self._items)
+            data = asdict(self._stats)
+            data["hit_ratio"] = self._stats.hit_ratio
+            return data
+
+
+dashboard_cache = DashboardCache(DASHBOARD_CACHE_SIZE, DASHBOARD_CACHE_TTL_S)
+
+
+# ---------- Single-flight ----------
+
+@dataclass
+class FlightStats:
+    flights: int = 0      # расчётов реально запущено
+    coalesced: int = 0    # вызовов, дождавшихся чужого расчёта
+    in_flight: int = 0    # расчётов идёт прямо сейчас
+    max_waiters: int = 0  # максимум ожидающих одного расчёта
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых конкурентных вызовов в пределах event loop.
+    Первый вызов по ключу считает результат, остальные ждут его future.
+    Ошибка расчёта передаётся всем ожидающим; если первый вызов отменён
+    (клиент закрыл соединение), ожидающие считают сами.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, tuple[asyncio.Future, list]] = {}
+        self._stats = FlightStats()
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is not None:
+            future, waiters = flight
+            waiters[0] += 1
+            self._stats.coalesced += 1
+            self._stats.max_waiters = max(self._stats.max_waiters, waiters[0])
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # отменили сам ожидающий вызов
+            return await fn()
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = (future, [0])
+        self._stats.flights += 1
+        self._stats.in_flight += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # исключение уже отдано вызывающему; future без ожидающих
+            # не должен ругаться "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._stats.in_flight -= 1
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return asdict(self._stats)
+
+
+dashboard_flights = SingleFlight()
@@ -0,0 +1,158 @@
+"""
+Поиск дублей операций (повторный импорт выписки, повторный ввод вручную).
+
+Кандидат считается дублем существующей операции того же счёта, если:
+  - совпадает отпечаток transactions.fingerprint (сумма со знаком, день,
+    нормализованное описание) — индекс ix_transactions_fingerprint;
+  - или, при window_days > 0, есть операция с той же суммой не дальше
+    чем за window_days дней — индекс (account_id, amount_minor, dt).
+Оба поиска — индексные запросы на всю пачку, без просмотра transactions.
+Каждая существующая операция закрывает не больше одного кандидата:
+две одинаковые покупки в выписке при одной в базе — одна из них новая.
+Переводы в поиске не участвуют.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.transaction import Transaction, to_day_key, transaction_fingerprint
+
+# allow — записать, reject — не записывать, flag — записать с duplicate_of_id
+DuplicatePolicy = Literal["allow", "reject", "flag"]
+DUPLICATE_POLICIES = ("allow", "reject", "flag")
+
+# политика по умолчанию для add_income / add_expense / bulk
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "allow")
+# окно нечёткого совпадения (та же сумма ± N дней); 0 — только отпечаток
+DUPLICATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_WINDOW_DAYS", "0"))
+
+# параметров в одном IN (...) — с запасом до лимита SQLite
+_IN_CHUNK = 500
+
+
+class DuplicateTransactionError(ValueError):
+    """Операция отклонена политикой reject: такая уже есть."""
+
+    def __init__(self, duplicate_of: int):
+        super().__init__(f"duplicate of transaction {duplicate_of}")
+        self.duplicate_of = duplicate_of
+
+
+@dataclass
+class DuplicateCandidate:
+    account_id: int
+    amount_minor: int          # со знаком, как в transactions
+    dt: datetime
+    description: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        return transaction_fingerprint(
+            self.account_id, self.amount_minor, to_day_key(self.dt), self.description,
+        )
+
+
+def resolve_policy(policy: Optional[str]) -> str:
+    policy = policy or DUPLICATE_POLICY
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError("on_duplicate must be 'allow', 'reject' or 'flag'")
+    return policy
+
+
+def _chunked(values: list, size: int = _IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def find_duplicates(
+    session: Session,
+    candidates: Sequence[DuplicateCandidate],
+    window_days: Optional[int] = None,
+    max_id: Optional[int] = None,
+) -> List[Optional[int]]:
+    """
+    Для каждого кандидата — id существующей операции, дублем которой
+    он является, или None. max_id — сравнивать только с операциями
+    id <= max_id (импорт не сравнивает выписку сама с собой).
+    """
+    result: List[Optional[int]] = [None] * len(candidates)
+    if not candidates:
+        return result
+    if window_days is None:
+        window_days = DUPLICATE_WINDOW_DAYS
+
+    base = [Transaction.transfer_group_id.is_(None)]
+    if max_id is not None:
+        base.append(Transaction.id <= max_id)
+    used: set[int] = set()
+
+    # 1. точное совпадение отпечатка
+    fingerprints = [c.fingerprint for c in candidates]
+    by_fp: dict[str, List[int]] = {}
+    for part in _chunked(sorted(set(fingerprints))):
+        rows = session.execute(
+            select(Transaction.fingerprint, Transaction.id)
+            .where(Transaction.fingerprint.in_(part), *base)
+            .order_by(Transaction.id)
+        )
+        for fp, tx_id in rows:
+            by_fp.setdefault(fp, []).append(tx_id)
+
+    for n, fp in enumerate(fingerprints):
+        ids = by_fp.get(fp)
+        while ids:
+            tx_id = ids.pop(0)
+            if tx_id not in used:
+                used.add(tx_id)
+                result[n] = tx_id
+                break
+
+    # 2. та же сумма в окне ±window_days (описание не сравнивается)
+    pending = [n for n in range(len(candidates)) if result[n] is None]
+    if window_days <= 0 or not pending:
+        return result
+
+    window = timedelta(days=window_days)
+    by_account: dict[int, List[int]] = {}
+    for n in pending:
+        by_account.setdefault(candidates[n].account_id, []).append(n)
+
+    nearby: dict[tuple[int, int], List[tuple[datetime, int]]] = {}
+    for account_id, numbers in by_account.items():
+        dts = [candidates[n].dt for n in numbers]
+        # день целиком: окно считается в днях, а не от времени операции
+        lo = datetime.combine(min(dts).date() - window, datetime.min.time())
+        hi = datetime.combine(max(dts).date() + window + timedelta(days=1), datetime.min.time())
+        amounts = sorted({candidates[n].amount_minor for n in numbers})
+        for part in _chunked(amounts):
+            rows = session.execute(
+                select(Transaction.amount_minor, Transaction.dt, Transaction.id).where(
+                    Transaction.account_id == account_id,
+                    Transaction.amount_minor.in_(part),
+                    Transaction.dt >= lo,
+                    Transaction.dt < hi,
+                    *base,
+                )
+            )
+            for amount, dt, tx_id in rows:
+                nearby.setdefault((account_id, amount), []).append((dt, tx_id))
+
+    for n in pending:
+        c = candidates[n]
+        best = None
+        for dt, tx_id in nearby.get((c.account_id, c.amount_minor), ()):
+            if tx_id in used:
+                continue
+            days = abs((dt.date() - c.dt.date()).days)
+            if days <= window_days and (best is None or days < best[0]):
+                best = (days, tx_id)
+        if best is not None:
+            used.add(best[1])
+            result[n] = best[1]
+    return result
@@ -0,0 +1,230 @@
+"""
+Курсы валют (таблица fx_rates) и пересчёт сумм в валюту отчёта.
+
+Курсы читаются из кэша в памяти процесса: для каждой пары (base, quote)
+отсортированные даты и курсы, поиск курса на дату — bisect, курс на
+дату без котировки — последний известный до неё. Обратная пара
+считается как 1 / rate, пара без своих курсов — через общую третью
+валюту (EUR -> USD по EUR/RUB и USD/RUB). Кэш перечитывает таблицу,
+когда курсы меняются через этот сервис (версия FX_SCOPE поднимается
+после commit) и не реже раза в FX_CACHE_TTL_S — на случай записи
+другим процессом.
+
+Отчёты пересчитывают уже сгруппированные суммы (валюта × день/месяц),
+а не каждую операцию: курсов нужно столько, сколько групп.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
+from models.fx_rate import FxRate
+from services.dashboard_cache import FX_SCOPE, mark_dirty, signature
+
+# не дольше скольких секунд кэш курсов живёт без перечитывания
+FX_CACHE_TTL_S = float(os.getenv("FX_CACHE_TTL_S", "300"))
+
+_UPSERT_RATE = text(
+    "INSERT INTO fx_rates (base, quote, rate_date, rate) "
+    "VALUES (:base, :quote, :rate_date, :rate) "
+    "ON CONFLICT (base, quote, rate_date) DO UPDATE SET rate = excluded.rate"
+)
+
+
+class FxRateError(ValueError):
+    """Нет курса для пересчёта."""
+
+    def __init__(self, base: str, quote: str, on: date) -> None:
+        super().__init__(f"no FX rate {base}/{quote} on or before {on.isoformat()}")
+        self.base = base
+        self.quote = quote
+        self.on = on
+
+
+@dataclass
+class FxRateDTO:
+    rate_date: date
+    base: str
+    quote: str
+    rate: float
+
+
+# (base, quote) -> (ordinal дат по возрастанию, курсы)
+_Series = tuple[List[int], List[float]]
+
+
+class FxRateCache:
+    def __init__(self, ttl_s: float) -> None:
+        self.ttl_s = ttl_s
+        self._pairs: dict[tuple[str, str], _Series] = {}
+        self._sig: Optional[tuple] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self) -> bool:
+        return (
+            self._sig is not None
+            and self._sig == signature([FX_SCOPE])
+            and time.monotonic() - self._loaded_at < self.ttl_s
+        )
+
+    def _load(self, session: Session) -> dict[tuple[str, str], _Series]:
+        with self._lock:
+            if self._fresh():
+                return self._pairs
+            sig = signature([FX_SCOPE])
+            pairs: dict[tuple[str, str], _Series] = {}
+            rows = session.execute(
+                select(FxRate.base, FxRate.quote, FxRate.rate_date, FxRate.rate)
+                .order_by(FxRate.base, FxRate.quote, FxRate.rate_date)
+            )
+            for base, quote, rate_date, rate in rows:
+                days, rates = pairs.setdefault((base, quote), ([], []))
+                days.append(rate_date.toordinal())
+                rates.append(rate)
+            self._pairs, self._sig, self._loaded_at = pairs, sig, time.monotonic()
+            return pairs
+
+    @staticmethod
+    def _lookup(pairs: dict, base: str, quote: str, day: int) -> Optional[float]:
+        """Курс пары или обратной пары на день; None — курса нет."""
+        series = pairs.get((base, quote))
+        if series is not None:
+            i = bisect.bisect_right(series[0], day) - 1
+            if i >= 0:
+                return series[1][i]
+        series = pairs.get((quote, base))
+        if series is not None:
+            i = bisect.bisect_right(series[0], day) - 1
+            if i >= 0:
+                return 1.0 / series[1][i]
+        return None
+
+    def rate(self, session: Session, base: str, quote: str, on: date) -> float:
+        """Курс base -> quote на дату on (последний известный не позже неё)."""
+        if base == quote:
+            return 1.0
+        pairs = self._pairs if self._fresh() else self._load(session)
+        day = on.toordinal()
+        rate = self._lookup(pairs, base, quote, day)
+        if rate is not None:
+            return rate
+        # кросс-курс через валюту, с которой котируются обе
+        for pivot in sorted({c for pair in pairs if base in pair for c in pair} - {base, quote}):
+            first = self._lookup(pairs, base, pivot, day)
+            second = self._lookup(pairs, pivot, quote, day)
+            if first is not None and second is not None:
+                return first * second
+        raise FxRateError(base, quote, on)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pairs, self._sig = {}, None
+
+
+fx_cache = FxRateCache(FX_CACHE_TTL_S)
+
+
+def converter(session: Session, report_currency: str) -> Callable[[int, str, date], int]:
+    """
+    Функция пересчёта суммы (копейки) из валюты группы в report_currency
+    по курсу на дату; результат округляется до копеек.
+    """
+    def convert(amount_minor: int, currency: str, on: date) -> int:
+        if currency == report_currency:
+            return amount_minor
+        return round(amount_minor * fx_cache.rate(session, currency, report_currency, on))
+
+    return convert
+
+
+# ---------- Запись и чтение курсов ----------
+
+def _set_rates(session: Session, rates: Iterable[FxRateDTO]) -> int:
+    """Записать курсы (существующие на ту же дату заменяются)."""
+    rows = [
+        {"base": r.base, "quote": r.quote, "rate_date": r.rate_date, "rate": r.rate}
+        for r in rates
+    ]
+    if not rows:
+        return 0
+    session.execute(_UPSERT_RATE, rows)
+    # кэш курсов и отчёты в валюте пересчитаются после commit
+    mark_dirty(session, [FX_SCOPE])
+    return len(rows)
+
+
+def _list_rates(
+    session: Session,
+    base: Optional[str] = None,
+    quote: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> List[FxRateDTO]:
+    q = select(FxRate.rate_date, FxRate.base, FxRate.quote, FxRate.rate)
+    if base is not None:
+        q = q.where(FxRate.base == base)
+    if quote is not None:
+        q = q.where(FxRate.quote == quote)
+    if date_from is not None:
+        q = q.where(FxRate.rate_date >= date_from)
+    if date_to is not None:
+        q = q.where(FxRate.rate_date <= date_to)
+    q = q.order_by(FxRate.base, FxRate.quote, FxRate.rate_date)
+    return [FxRateDTO(*row) for row in session.execute(q)]
+
+
+# ---------- Синхронный API ----------
+
+def set_rates(rates: Iterable[FxRateDTO], *, session: Optional[Session] = None) -> int:
+    """Записать курсы; возвращает число записанных."""
+    with session_scope(session) as session:
+        return _set_rates(session, rates)
+
+
+def list_rates(
+    base: Optional[str] = None,
+    quote: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    *,
+    session: Optional[Session] = None,
+) -> List[FxRateDTO]:
+    """Курсы по паре и диапазону дат."""
+    with session_scope(session) as session:
+        return _list_rates(session, base, quote, date_from, date_to)
+
+
+# ---------- Асинхронный API ----------
+
+async def set_rates_async(
+    rates: Iterable[FxRateDTO],
+    *,
+    session: Optional[AsyncSession] = None,
+) -> int:
+    """Асинхронный вариант set_rates."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_set_rates, list(rates))
+
+
+async def list_rates_async(
+    base: Optional[str] = None,
+    quote: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[FxRateDTO]:
+    """Асинхронный вариант list_rates."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_rates, base, quote, date_from, date_to)
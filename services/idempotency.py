@@ -0,0 +1,168 @@
+"""
+Idempotency-Key для создающих запросов (таблица idempotency_keys).
+
+Ключ занимается (claim_key) в той же транзакции, что и сама запись
+операций, и фиксируется вместе с ней одним commit:
+  - повтор после успешного запроса находит ключ одним поиском
+    по первичному ключу и получает сохранённый ответ;
+  - параллельный повтор ждёт блокировку записи SQLite, а после commit
+    первого запроса видит занятый ключ и тоже получает его ответ;
+  - если запрос упал, откатывается и ключ — повтор выполнит его заново.
+Ключи живут IDEMPOTENCY_TTL_S; просроченные удаляются каждые
+IDEMPOTENCY_PURGE_EVERY занятий ключа и при старте приложения.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
+from models.idempotency_key import IdempotencyKey
+
+# сколько секунд хранится ответ (сутки: за это время клиент перестаёт повторять)
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", "86400"))
+# раз в сколько занятых ключей удалять просроченные
+IDEMPOTENCY_PURGE_EVERY = int(os.getenv("IDEMPOTENCY_PURGE_EVERY", "1000"))
+
+_claims = 0
+_claims_lock = threading.Lock()
+
+
+@dataclass
+class StoredResponse:
+    request_hash: str
+    status_code: Optional[int]   # None — первый запрос ещё не завершён
+    body: Any
+
+
+def request_hash(method: str, path: str, payload: str) -> str:
+    """Отпечаток запроса: тот же ключ с другим телом — ошибка клиента."""
+    raw = f"{method} {path}\n{payload}".encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _cutoff() -> datetime:
+    return datetime.now() - timedelta(seconds=IDEMPOTENCY_TTL_S)
+
+
+def _get_response(session: Session, user_id: int, key: str) -> Optional[StoredResponse]:
+    row = session.get(IdempotencyKey, (user_id, key))
+    if row is None or row.created_at < _cutoff():
+        return None
+    return StoredResponse(
+        request_hash=row.request_hash,
+        status_code=row.status_code,
+        body=json.loads(row.response_body) if row.response_body is not None else None,
+    )
+
+
+def _claim_key(session: Session, user_id: int, key: str, req_hash: str) -> bool:
+    """
+    Занять ключ в текущей транзакции. False — ключ уже занят другим
+    (не просроченным) запросом. Просроченная запись перезаписывается.
+    """
+    global _claims
+    table = IdempotencyKey.__table__
+    now = datetime.now()
+    stmt = (
+        sqlite_insert(table)
+        .values(user_id=user_id, key=key, request_hash=req_hash, created_at=now)
+        .on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.key],
+            set_={
+                "request_hash": req_hash,
+                "status_code": None,
+                "response_body": None,
+                "created_at": now,
+            },
+            where=table.c.created_at < _cutoff(),
+        )
+    )
+    claimed = session.execute(stmt).rowcount == 1
+
+    with _claims_lock:
+        _claims += 1
+        purge = IDEMPOTENCY_PURGE_EVERY > 0 and _claims % IDEMPOTENCY_PURGE_EVERY == 0
+    if purge:
+        _purge_expired(session)
+    return claimed
+
+
+def _save_response(
+    session: Session,
+    user_id: int,
+    key: str,
+    status_code: int,
+    body: Any,
+) -> None:
+    session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(
+            status_code=status_code,
+            response_body=json.dumps(body, ensure_ascii=False, separators=(",", ":")),
+        )
+    )
+
+
+def _purge_expired(session: Session) -> int:
+    result = session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < _cutoff())
+    )
+    return result.rowcount
+
+
+# ---------- Синхронный API ----------
+
+def purge_expired_keys(*, session: Optional[Session] = None) -> int:
+    """Удалить просроченные ключи; возвращает число удалённых."""
+    with session_scope(session) as session:
+        return _purge_expired(session)
+
+
+# ---------- Асинхронный API ----------
+
+async def get_response_async(
+    user_id: int,
+    key: str,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[StoredResponse]:
+    """Сохранённый ответ по ключу (None — ключа нет или он просрочен)."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_response, user_id, key)
+
+
+async def claim_key_async(
+    user_id: int,
+    key: str,
+    req_hash: str,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    """Занять ключ в транзакции запроса (см. _claim_key)."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_claim_key, user_id, key, req_hash)
+
+
+async def save_response_async(
+    user_id: int,
+    key: str,
+    status_code: int,
+    body: Any,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> None:
+    """Записать ответ под занятым ключом; фиксируется вместе с запросом."""
+    async with async_session_scope(session) as session:
+        await session.run_sync(_save_response, user_id, key, status_code, body)
@@ -0,0 +1,661 @@
+"""
+Импорт банковских выписок (CSV, OFX) в счёт.
+
+Выписка обрабатывается конвейером генераторов:
+
+    parse_csv / parse_ofx -> normalize -> map_lines -> (пачками) дубли и вставка
+
+В памяти одновременно держится только одна пачка (chunk_size записей),
+поэтому размер выписки не ограничен. Каждая пачка записывается через
+пакетную вставку сервиса транзакций и фиксируется одним commit вместе
+с прогрессом задачи (import_jobs.committed_records). Если импорт прервался,
+он продолжается с первой незафиксированной записи.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
+from models.account import Account
+from models.category import Category
+from models.import_job import ImportJob
+from models.transaction import Transaction
+from services.duplicates import DuplicatePolicy, resolve_policy
+from services.transactions import (
+    TRANSACTIONS_BULK_MAX_ITEMS,
+    NewTransaction,
+    _add_transactions_bulk,
+)
+
+# куда сохраняются загруженные выписки до окончания импорта
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+# сколько записей выписки фиксировать одним commit
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+IMPORT_FORMATS = ("csv", "ofx")
+
+logger = logging.getLogger("myfinance.imports")
+
+
+@dataclass
+class ImportJobDTO:
+    id: int
+    account_id: int
+    format: str
+    filename: Optional[str]
+    status: str
+    chunk_size: int
+    on_duplicate: str
+    total_records: Optional[int]
+    committed_records: int
+    inserted_count: int
+    duplicate_count: int
+    error_count: int
+    last_record_error: Optional[str]
+    error: Optional[str]
+    progress: Optional[float]      # 0..1, если известно total_records
+    records_per_s: Optional[float]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+
+def _to_dto(job: ImportJob) -> ImportJobDTO:
+    progress = None
+    if job.total_records:
+        progress = min(job.committed_records / job.total_records, 1.0)
+    elif job.status == "done":
+        progress = 1.0
+    return ImportJobDTO(
+        id=job.id,
+        account_id=job.account_id,
+        format=job.format,
+        filename=job.filename,
+        status=job.status,
+        chunk_size=job.chunk_size,
+        on_duplicate=job.on_duplicate,
+        total_records=job.total_records,
+        committed_records=job.committed_records,
+        inserted_count=job.inserted_count,
+        duplicate_count=job.duplicate_count,
+        error_count=job.error_count,
+        last_record_error=job.last_record_error,
+        error=job.error,
+        progress=progress,
+        records_per_s=(
+            round(job.committed_records / job.elapsed_s, 1) if job.elapsed_s else None
+        ),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+# ---------- Разбор ----------
+
+def _open_text(path: str):
+    """UTF-8 (с BOM или без), иначе cp1251 — в нём выгружают многие банки."""
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+    try:
+        head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as exc:
+        # обрезанный в конце блока многобайтовый символ — не повод менять кодировку
+        encoding = "utf-8-sig" if exc.start >= len(head) - 3 else "cp1251"
+    return open(path, encoding=encoding, newline="")
+
+
+def parse_csv(path: str) -> Iterator[dict]:
+    """Строки CSV как словари {заголовок в нижнем регистре: значение}."""
+    with _open_text(path) as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        keys = [h.strip().lower() for h in header]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            yield dict(zip(keys, row))
+
+
+_OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+_OFX_BLOCK_END = "</STMTTRN>"
+
+
+def parse_ofx(path: str) -> Iterator[dict]:
+    """
+    Операции <STMTTRN> из OFX 1.x (SGML) и 2.x (XML) как словари
+    {ТЕГ: значение}; валюта выписки (CURDEF) подставляется в каждую.
+    Файл читается блоками, в буфере — только текущая операция.
+    """
+    currency = None
+    buf = ""
+    with _open_text(path) as f:
+        while True:
+            block = f.read(64 * 1024)
+            if block:
+                buf += block
+            while True:
+                start = buf.find("<STMTTRN>")
+                head = buf if start < 0 else buf[:start]
+                m = re.search(r"<CURDEF>([A-Za-z]{3})", head)
+                if m:
+                    currency = m.group(1).upper()
+                if start < 0:
+                    # хвост может оборвать тег на середине
+                    buf = buf[-64:]
+                    break
+                end = buf.find(_OFX_BLOCK_END, start)
+                if end < 0:
+                    buf = buf[start:]
+                    break
+                body = buf[start + len("<STMTTRN>"):end]
+                buf = buf[end + len(_OFX_BLOCK_END):]
+                record = {tag.upper(): value.strip() for tag, value in _OFX_TAG.findall(body)}
+                if currency and "CURRENCY" not in record:
+                    record["CURRENCY"] = currency
+                yield record
+            if not block:
+                return
+
+
+def count_records(path: str, fmt: str) -> int:
+    """Число записей в выписке (проход по файлу без разбора)."""
+    with _open_text(path) as f:
+        if fmt == "ofx":
+            return sum(line.count("<STMTTRN>") for line in f)
+        # строки данных CSV без заголовка и пустых строк;
+        # переносы внутри кавычек дадут завышенную оценку — это только прогресс
+        return max(sum(1 for line in f if line.strip()) - 1, 0)
+
+
+# ---------- Нормализация ----------
+
+@dataclass
+class StatementLine:
+    record_no: int                   # номер записи в выписке, с 1
+    dt: Optional[datetime] = None
+    amount_minor: int = 0            # со знаком: + поступление, - списание
+    currency: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None   # название категории из выписки
+    error: Optional[str] = None
+
+
+_CSV_COLUMNS = {
+    "date": ("date", "дата", "дата операции", "дата платежа", "transaction date",
+             "posting date", "booking date"),
+    "amount": ("amount", "сумма", "сумма операции", "сумма в валюте счёта",
+               "сумма в валюте счета"),
+    "credit": ("credit", "приход", "поступление", "зачисление"),
+    "debit": ("debit", "расход", "списание"),
+    "currency": ("currency", "валюта", "валюта операции"),
+    "description": ("description", "описание", "назначение платежа", "назначение",
+                    "memo", "payee", "наименование", "details"),
+    "category": ("category", "категория"),
+}
+
+# 2025-01-31[ 12:00[:00]] и 31.01.2025 / 31/01/2025 / 31.01.25[ 12:00[:00]];
+# регулярные выражения вместо перебора форматов strptime — он был
+# основной статьёй расхода времени на запись
+_ISO_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?")
+_DMY_DATE = re.compile(r"(\d{1,2})[./](\d{1,2})[./](\d{4}|\d{2})(?: (\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+
+
+def _pick(record: dict, field: str) -> Optional[str]:
+    for name in _CSV_COLUMNS[field]:
+        value = record.get(name)
+        if value is not None and value.strip():
+            return value.strip()
+    return None
+
+
+def parse_amount(value: str) -> int:
+    """'-1 234,56' / '1234.56' / '(12.00)' -> копейки со знаком."""
+    s = value.replace(" ", "").replace(" ", "").replace("−", "-")
+    negative = s.startswith("(") and s.endswith(")")
+    s = s.strip("()")
+    if "," in s and "." in s:
+        s = s.replace(",", "")          # 1,234.56
+    else:
+        s = s.replace(",", ".")         # 1234,56
+    try:
+        amount = Decimal(s) * 100
+    except InvalidOperation:
+        raise ValueError(f"bad amount: {value!r}")
+    if amount != amount.to_integral_value():
+        raise ValueError(f"amount has more than 2 decimals: {value!r}")
+    return -int(amount) if negative else int(amount)
+
+
+def parse_date(value: str) -> datetime:
+    m = _ISO_DATE.fullmatch(value)
+    if m:
+        y, mo, d = m.group(1, 2, 3)
+    else:
+        m = _DMY_DATE.fullmatch(value)
+        if not m:
+            raise ValueError(f"bad date: {value!r}")
+        d, mo, y = m.group(1, 2, 3)
+        if len(y) == 2:
+            y = "20" + y
+    hh, mm, ss = m.group(4, 5, 6)
+    try:
+        return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0), int(ss or 0))
+    except ValueError:
+        raise ValueError(f"bad date: {value!r}")
+
+
+def _parse_ofx_date(value: str) -> datetime:
+    # 20240115, 20240115120000, 20240115120000.000[+3:MSK]
+    m = re.match(r"(\d{8})(\d{6})?", value)
+    if not m:
+        raise ValueError(f"bad date: {value!r}")
+    v = m.group(1) + (m.group(2) or "000000")
+    try:
+        return datetime(int(v[:4]), int(v[4:6]), int(v[6:8]), int(v[8:10]), int(v[10:12]), int(v[12:14]))
+    except ValueError:
+        raise ValueError(f"bad date: {value!r}")
+
+
+def _normalize_csv(record_no: int, record: dict) -> StatementLine:
+    line = StatementLine(record_no=record_no)
+    date_value = _pick(record, "date")
+    if date_value is None:
+        raise ValueError("no date column")
+    line.dt = parse_date(date_value)
+
+    amount = _pick(record, "amount")
+    if amount is not None:
+        line.amount_minor = parse_amount(amount)
+    else:
+        credit, debit = _pick(record, "credit"), _pick(record, "debit")
+        if credit is None and debit is None:
+            raise ValueError("no amount column")
+        line.amount_minor = (
+            (parse_amount(credit) if credit else 0)
+            - abs(parse_amount(debit) if debit else 0)
+        )
+
+    currency = _pick(record, "currency")
+    line.currency = currency.upper() if currency else None
+    line.description = _pick(record, "description")
+    line.category = _pick(record, "category")
+    return line
+
+
+def _normalize_ofx(record_no: int, record: dict) -> StatementLine:
+    if "DTPOSTED" not in record or "TRNAMT" not in record:
+        raise ValueError("STMTTRN without DTPOSTED/TRNAMT")
+    parts = [record.get("NAME"), record.get("MEMO")]
+    return StatementLine(
+        record_no=record_no,
+        dt=_parse_ofx_date(record["DTPOSTED"]),
+        amount_minor=parse_amount(record["TRNAMT"]),
+        currency=record.get("CURRENCY"),
+        description=" / ".join(p for p in parts if p) or None,
+    )
+
+
+def normalize(records: Iterable[dict], fmt: str) -> Iterator[StatementLine]:
+    """Записи выписки -> StatementLine; ошибка записи не останавливает импорт."""
+    convert = _normalize_ofx if fmt == "ofx" else _normalize_csv
+    for record_no, record in enumerate(records, start=1):
+        try:
+            line = convert(record_no, record)
+            if line.amount_minor == 0:
+                raise ValueError("zero amount")
+        except ValueError as exc:
+            line = StatementLine(record_no=record_no, error=str(exc))
+        yield line
+
+
+# ---------- Сопоставление со счётом и категориями ----------
+
+def map_lines(
+    lines: Iterable[StatementLine],
+    account_id: int,
+    account_currency: str,
+    categories: dict[tuple[str, str], int],
+) -> Iterator[tuple[StatementLine, Optional[NewTransaction]]]:
+    """
+    StatementLine -> NewTransaction: знак суммы задаёт доход/расход,
+    категория ищется по названию среди категорий того же типа.
+    """
+    for line in lines:
+        if line.error is not None:
+            yield line, None
+            continue
+        kind = "income" if line.amount_minor > 0 else "expense"
+        category_id = None
+        if line.category:
+            category_id = categories.get((line.category.lower(), kind))
+        yield line, NewTransaction(
+            kind=kind,
+            account_id=account_id,
+            amount_minor=abs(line.amount_minor),
+            category_id=category_id,
+            dt=line.dt,
+            description=line.description,
+            currency=line.currency or account_currency,
+        )
+
+
+def _load_categories(session: Session) -> dict[tuple[str, str], int]:
+    return {
+        (name.lower(), type_): cid
+        for cid, name, type_ in session.execute(
+            select(Category.id, Category.name, Category.type).where(Category.is_active.is_(True))
+        )
+    }
+
+
+# ---------- Запись пачки ----------
+
+def _commit_chunk(
+    session: Session,
+    job_id: int,
+    base_tx_id: int,
+    on_duplicate: str,
+    chunk: List[tuple[StatementLine, Optional[NewTransaction]]],
+    elapsed_s: float,
+) -> None:
+    """
+    Вставить пачку и сдвинуть прогресс задачи — в одной транзакции.
+    Дубли ищутся среди операций, существовавших до начала импорта
+    (id <= base_tx_id): строки самой выписки друг с другом не сравниваются.
+    """
+    errors = [line for line, item in chunk if item is None]
+    items = [item for _, item in chunk if item is not None]
+
+    results = _add_transactions_bulk(
+        session, items, on_duplicate, duplicates_max_id=base_tx_id,
+    )
+    duplicates = sum(1 for r in results if r.duplicate_of is not None)
+    failed = [r for r in results if r.error is not None and r.duplicate_of is None]
+    inserted = sum(1 for r in results if r.error is None)
+
+    last_error = None
+    if errors:
+        last_error = f"record {errors[-1].record_no}: {errors[-1].error}"
+    elif failed:
+        last_error = failed[-1].error
+
+    values = dict(
+        committed_records=ImportJob.committed_records + len(chunk),
+        inserted_count=ImportJob.inserted_count + inserted,
+        duplicate_count=ImportJob.duplicate_count + duplicates,
+        error_count=ImportJob.error_count + len(errors) + len(failed),
+        elapsed_s=elapsed_s,
+        updated_at=datetime.now(),
+    )
+    if last_error is not None:
+        values["last_record_error"] = last_error
+    session.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+
+
+def _chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _set_status(job_id: int, status: str, **values) -> None:
+    with session_scope() as session:
+        session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id)
+            .values(status=status, updated_at=datetime.now(), **values)
+        )
+
+
+def run_import(job_id: int) -> None:
+    """
+    Выполнить (или продолжить) импорт. Синхронная функция: её запускают
+    BackgroundTasks в пуле потоков, пачки фиксируются отдельными commit.
+    """
+    with session_scope() as session:
+        # захват задачи одним UPDATE: из двух одновременных запусков
+        # (два /resume или /resume и исходная фоновая задача) строку
+        # получит только один, второй выходит, ничего не вставив
+        now = datetime.now()
+        job = session.execute(
+            update(ImportJob)
+            .where(
+                ImportJob.id == job_id,
+                ImportJob.status.in_(("pending", "failed", "interrupted")),
+            )
+            .values(
+                status="running",
+                error=None,
+                started_at=func.coalesce(ImportJob.started_at, now),
+                updated_at=now,
+            )
+            .returning(
+                ImportJob.account_id,
+                ImportJob.path,
+                ImportJob.format,
+                ImportJob.chunk_size,
+                ImportJob.base_tx_id,
+                ImportJob.committed_records,
+                ImportJob.on_duplicate,
+                ImportJob.elapsed_s,
+                ImportJob.total_records,
+            )
+            .execution_options(synchronize_session=False)
+        ).first()
+        if job is None:
+            return
+        account = session.get(Account, job.account_id)
+        categories = _load_categories(session)
+        path, fmt, chunk_size = job.path, job.format, job.chunk_size
+        account_id, account_currency = job.account_id, account.currency
+        base_tx_id, skip = job.base_tx_id, job.committed_records
+        on_duplicate = job.on_duplicate
+        elapsed_before = job.elapsed_s
+        need_total = job.total_records is None
+
+    try:
+        if need_total:
+            _set_status(job_id, "running", total_records=count_records(path, fmt))
+
+        records = parse_ofx(path) if fmt == "ofx" else parse_csv(path)
+        lines = normalize(records, fmt)
+        # продолжение: уже зафиксированные записи пропускаем без вставки
+        lines = islice(lines, skip, None)
+        pairs = map_lines(lines, account_id, account_currency, categories)
+
+        started = time.perf_counter()
+        for chunk in _chunks(pairs, chunk_size):
+            with session_scope() as session:
+                _commit_chunk(
+                    session, job_id, base_tx_id, on_duplicate, chunk,
+                    elapsed_before + time.perf_counter() - started,
+                )
+    except Exception as exc:
+        logger.exception("import %s failed", job_id)
+        _set_status(job_id, "failed", error=str(exc) or type(exc).__name__)
+        return
+
+    _set_status(job_id, "done", finished_at=datetime.now())
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def mark_interrupted_imports() -> int:
+    """
+    При старте приложения: импорты, оставшиеся в running, прерваны.
+    pending тоже: процесс остановился между ответом 202 и запуском
+    фоновой задачи, и сама она уже не запустится.
+    """
+    with session_scope() as session:
+        result = session.execute(
+            update(ImportJob)
+            .where(ImportJob.status.in_(("pending", "running")))
+            .values(status="interrupted", updated_at=datetime.now())
+        )
+        return result.rowcount
+
+
+# ---------- Задачи импорта ----------
+
+def import_path(fmt: str) -> str:
+    """Путь для сохранения загружаемой выписки."""
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    return os.path.join(IMPORT_DIR, f"{stamp}.{fmt}")
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str]) -> str:
+    if fmt is None and filename:
+        fmt = os.path.splitext(filename)[1].lstrip(".").lower() or None
+    if fmt == "qfx":
+        fmt = "ofx"
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError("format must be 'csv' or 'ofx'")
+    return fmt
+
+
+def _create_import_job(
+    session: Session,
+    account_id: int,
+    fmt: str,
+    path: str,
+    filename: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+) -> ImportJobDTO:
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError("format must be 'csv' or 'ofx'")
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    if not 1 <= chunk_size <= TRANSACTIONS_BULK_MAX_ITEMS:
+        raise ValueError(f"chunk_size must be between 1 and {TRANSACTIONS_BULK_MAX_ITEMS}")
+    # повторная загрузка выписки по умолчанию пропускает уже записанное
+    on_duplicate = resolve_policy(on_duplicate or "reject")
+
+    if session.get(Account, account_id) is None:
+        raise ValueError("account not found")
+
+    job = ImportJob(
+        account_id=account_id,
+        format=fmt,
+        filename=filename,
+        path=path,
+        status="pending",
+        chunk_size=chunk_size,
+        on_duplicate=on_duplicate,
+        base_tx_id=session.execute(
+            select(func.coalesce(func.max(Transaction.id), 0))
+        ).scalar_one(),
+        committed_records=0,
+        inserted_count=0,
+        duplicate_count=0,
+        error_count=0,
+        elapsed_s=0.0,
+    )
+    session.add(job)
+    session.flush()
+    session.refresh(job)
+    return _to_dto(job)
+
+
+def _get_import_job(session: Session, job_id: int) -> Optional[ImportJobDTO]:
+    job = session.get(ImportJob, job_id)
+    return _to_dto(job) if job is not None else None
+
+
+def _list_import_jobs(session: Session, limit: int = 50) -> List[ImportJobDTO]:
+    jobs = session.query(ImportJob).order_by(ImportJob.id.desc()).limit(limit).all()
+    return [_to_dto(job) for job in jobs]
+
+
+# ---------- Синхронный API ----------
+
+def create_import_job(
+    account_id: int,
+    fmt: str,
+    path: str,
+    filename: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    *,
+    session: Optional[Session] = None,
+) -> ImportJobDTO:
+    """Задача импорта для уже сохранённого файла выписки; запуск — run_import()."""
+    with session_scope(session) as session:
+        return _create_import_job(
+            session, account_id, fmt, path, filename, chunk_size, on_duplicate,
+        )
+
+
+def get_import_job(job_id: int, *, session: Optional[Session] = None) -> Optional[ImportJobDTO]:
+    with session_scope(session) as session:
+        return _get_import_job(session, job_id)
+
+
+def list_import_jobs(limit: int = 50, *, session: Optional[Session] = None) -> List[ImportJobDTO]:
+    """Последние задачи импорта, новые первыми."""
+    with session_scope(session) as session:
+        return _list_import_jobs(session, limit)
+
+
+# ---------- Асинхронный API ----------
+
+async def create_import_job_async(
+    account_id: int,
+    fmt: str,
+    path: str,
+    filename: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> ImportJobDTO:
+    """Асинхронный вариант create_import_job."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _create_import_job, account_id, fmt, path, filename, chunk_size, on_duplicate,
+        )
+
+
+async def get_import_job_async(
+    job_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[ImportJobDTO]:
+    """Асинхронный вариант get_import_job."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_import_job, job_id)
+
+
+async def list_import_jobs_async(
+    limit: int = 50,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[ImportJobDTO]:
+    """Асинхронный вариант list_import_jobs."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_import_jobs, limit)
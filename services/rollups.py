@@ -0,0 +1,188 @@
+"""
+Дневные итоги операций (таблица daily_rollups) для дашборда.
+
+Как и account_balances, обновляются сервисом транзакций в той же сессии,
+что и сами операции. Переводы в итоги не попадают.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING, Iterable, List
+
+from sqlalchemy import and_, case, delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from models.daily_rollup import NO_CATEGORY, DailyRollup
+from models.transaction import Transaction, to_day_key
+
+if TYPE_CHECKING:
+    from services.transactions import TransactionDTO
+
+RollupKey = tuple[int, str, int, int]
+
+# текстом по той же причине, что _UPSERT_BALANCE в services/balances.py
+_UPSERT_ROLLUP = text(
+    "INSERT INTO daily_rollups (day_key, month_key, currency, category_id, sign, amount_minor, tx_count) "
+    "VALUES (:day_key, :month_key, :currency, :category_id, :sign, :amount_minor, :tx_count) "
+    "ON CONFLICT (day_key, currency, category_id, sign) DO UPDATE SET "
+    "amount_minor = amount_minor + excluded.amount_minor, "
+    "tx_count = tx_count + excluded.tx_count"
+)
+
+
+def _rollup_key(tx: TransactionDTO) -> RollupKey:
+    return (
+        to_day_key(tx.dt),
+        tx.currency,
+        tx.category_id if tx.category_id is not None else NO_CATEGORY,
+        1 if tx.amount_minor > 0 else -1,
+    )
+
+
+def apply_rollup_changes(
+    session: Session,
+    added: Iterable[TransactionDTO] = (),
+    removed: Iterable[TransactionDTO] = (),
+) -> None:
+    """
+    Учесть добавленные и удалённые записи transactions в daily_rollups.
+    Смысл added/removed тот же, что в apply_balance_changes().
+    """
+    deltas: dict[RollupKey, list] = {}
+
+    for tx in added:
+        if tx.transfer_group_id is not None:
+            continue
+        d = deltas.setdefault(_rollup_key(tx), [0, 0])
+        d[0] += abs(tx.amount_minor)
+        d[1] += 1
+
+    for tx in removed:
+        if tx.transfer_group_id is not None:
+            continue
+        d = deltas.setdefault(_rollup_key(tx), [0, 0])
+        d[0] -= abs(tx.amount_minor)
+        d[1] -= 1
+
+    rows = []
+    emptied = []
+    for key, (amount, count) in deltas.items():
+        if amount == 0 and count == 0:
+            continue
+        day_key, currency, category_id, sign = key
+        rows.append(
+            {
+                "day_key": day_key,
+                "month_key": day_key // 100,
+                "currency": currency,
+                "category_id": category_id,
+                "sign": sign,
+                "amount_minor": amount,
+                "tx_count": count,
+            }
+        )
+        if count < 0:
+            emptied.append(key)
+
+    if rows:
+        session.execute(_UPSERT_ROLLUP, rows)
+
+    # строки, из которых ушли все операции, не храним
+    for day_key, currency, category_id, sign in emptied:
+        session.execute(
+            delete(DailyRollup).where(
+                DailyRollup.day_key == day_key,
+                DailyRollup.currency == currency,
+                DailyRollup.category_id == category_id,
+                DailyRollup.sign == sign,
+                DailyRollup.tx_count <= 0,
+            )
+        )
+
+
+def _rollup_source_query():
+    """Агрегат transactions в форме daily_rollups (для rebuild и verify)."""
+    category_id = func.coalesce(Transaction.category_id, NO_CATEGORY)
+    sign = case((Transaction.amount_minor > 0, 1), else_=-1)
+    return (
+        select(
+            Transaction.day_key,
+            Transaction.month_key,
+            Transaction.currency,
+            category_id.label("category_id"),
+            sign.label("sign"),
+            func.sum(func.abs(Transaction.amount_minor)).label("amount_minor"),
+            func.count().label("tx_count"),
+        )
+        .where(Transaction.transfer_group_id.is_(None))
+        .group_by(
+            Transaction.day_key,
+            Transaction.month_key,
+            Transaction.currency,
+            category_id,
+            sign,
+        )
+    )
+
+
+def rebuild_daily_rollups(session: Session) -> int:
+    """Пересчитать daily_rollups целиком. Возвращает число строк."""
+    session.execute(delete(DailyRollup))
+    session.execute(
+        insert(DailyRollup).from_select(
+            [
+                "day_key",
+                "month_key",
+                "currency",
+                "category_id",
+                "sign",
+                "amount_minor",
+                "tx_count",
+            ],
+            _rollup_source_query(),
+        )
+    )
+    return int(session.execute(select(func.count()).select_from(DailyRollup)).scalar_one())
+
+
+def verify_daily_rollups(session: Session) -> List[dict]:
+    """
+    Сравнить daily_rollups с пересчётом по transactions.
+    Возвращает список расхождений (пустой — всё сходится).
+    """
+    expected = {
+        (r.day_key, r.currency, r.category_id, r.sign): (int(r.amount_minor), int(r.tx_count))
+        for r in session.execute(_rollup_source_query())
+    }
+    stored = {
+        (r.day_key, r.currency, r.category_id, r.sign): (r.amount_minor, r.tx_count)
+        for r in session.execute(select(DailyRollup)).scalars()
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want = expected.get(key, (0, 0))
+        got = stored.get(key, (0, 0))
+        if want != got:
+            mismatches.append(
+                {
+                    "day_key": key[0],
+                    "currency": key[1],
+                    "category_id": key[2],
+                    "sign": key[3],
+                    "expected_amount_minor": want[0],
+                    "expected_tx_count": want[1],
+                    "stored_amount_minor": got[0],
+                    "stored_tx_count": got[1],
+                }
+            )
+    return mismatches
+
+
+def rollup_range_filter(currency: str, date_from: date, date_to: date):
+    """Условие WHERE для диапазона дней (включительно) в одной валюте."""
+    return and_(
+        DailyRollup.currency == currency,
+        DailyRollup.day_key >= to_day_key(date_from),
+        DailyRollup.day_key <= to_day_key(date_to),
+    )
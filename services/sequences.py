@@ -0,0 +1,39 @@
+"""
+Выдача номеров из таблицы id_sequences одним UPDATE ... RETURNING.
+
+Счётчик меняется в транзакции вызывающего, поэтому номера, выданные
+откатившейся транзакции, не пропадают, а параллельные писатели SQLite
+всё равно сериализуются блокировкой записи.
+"""
+from __future__ import annotations
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models.id_sequence import IdSequence
+from models.transaction import Transaction
+
+TRANSFER_GROUP_SEQ = "transfer_group"
+
+# начальное значение счётчика, если его строки ещё нет (база создана
+# через create_all, а не миграцией): продолжаем уже выданные номера
+_SEEDS = {
+    TRANSFER_GROUP_SEQ: lambda: select(func.coalesce(func.max(Transaction.transfer_group_id), 0)),
+}
+
+
+def next_ids(session: Session, name: str, count: int = 1) -> range:
+    """Зарезервировать count номеров подряд; возвращает их диапазон."""
+    if count <= 0:
+        return range(0)
+    last = session.execute(
+        update(IdSequence)
+        .where(IdSequence.name == name)
+        .values(value=IdSequence.value + count)
+        .returning(IdSequence.value)
+    ).scalar_one_or_none()
+    if last is None:
+        start = session.execute(_SEEDS[name]()).scalar_one() if name in _SEEDS else 0
+        last = start + count
+        session.execute(insert(IdSequence).values(name=name, value=last))
+    return range(last - count + 1, last + 1)
@@ -1,15 +1,50 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime
-from typing import List, Optional, Literal
+import base64
+import json
+import os
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Literal, Sequence
 
-from db import session_scope
-from models.transaction import Transaction
+from sqlalchemy import bindparam, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db import async_session_scope, session_scope
+from models.account_balance import AccountBalance
+from models.daily_rollup import DailyRollup
+from models.transaction import Transaction, to_day_key, to_month_key, transaction_fingerprint
 from models.account import Account
+from models.category import Category
+from services import columnar
+from services.balances import apply_balance_changes, get_balance
+from services.checkpoints import apply_checkpoint_changes, running_balances
+from services.dashboard_cache import mark_transactions
+from services.duplicates import (
+    DuplicateCandidate,
+    DuplicatePolicy,
+    DuplicateTransactionError,
+    find_duplicates,
+    resolve_policy,
+)
+from services.rollups import apply_rollup_changes
+from services.sequences import TRANSFER_GROUP_SEQ, next_ids
 
 
 MoneySign = Literal["income", "expense"]
+TransactionKind = Literal["income", "expense", "transfer"]
+
+# до скольких строк честно считать total, если его нельзя взять
+# из account_balances / daily_rollups
+TRANSACTIONS_COUNT_LIMIT = int(os.getenv("TRANSACTIONS_COUNT_LIMIT", "10000"))
+# максимум элементов в одном POST /transactions/bulk
+TRANSACTIONS_BULK_MAX_ITEMS = int(os.getenv("TRANSACTIONS_BULK_MAX_ITEMS", "10000"))
+# по сколько элементов пачка пишется одним INSERT ... RETURNING
+BULK_INSERT_CHUNK = int(os.getenv("BULK_INSERT_CHUNK", "1000"))
+# по сколько строк выгрузка читает из курсора БД
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
 
 
 @dataclass
@@ -22,6 +57,23 @@ class TransactionDTO:
     dt: datetime
     description: Optional[str]
     transfer_group_id: Optional[int]
+    created_at: Optional[datetime] = None
+    duplicate_of_id: Optional[int] = None  # помечена как возможный дубль
+
+
+# колонки transactions в порядке полей TransactionDTO: TransactionDTO(*row)
+_DTO_COLUMNS = (
+    Transaction.id,
+    Transaction.account_id,
+    Transaction.category_id,
+    Transaction.amount_minor,
+    Transaction.currency,
+    Transaction.dt,
+    Transaction.description,
+    Transaction.transfer_group_id,
+    Transaction.created_at,
+    Transaction.duplicate_of_id,
+)
 
 
 def _to_dto(tx: Transaction) -> TransactionDTO:
@@ -34,73 +86,166 @@ def _to_dto(tx: Transaction) -> TransactionDTO:
         dt=tx.dt,
         description=tx.description,
         transfer_group_id=tx.transfer_group_id,
+        created_at=tx.created_at,
+        duplicate_of_id=tx.duplicate_of_id,
     )
 
 
-def add_income(
+@dataclass
+class NewTransaction:
+    """Элемент пакетной загрузки; amount_minor > 0, знак задаёт kind."""
+    kind: TransactionKind
+    account_id: int
+    amount_minor: int
+    category_id: Optional[int] = None
+    to_account_id: Optional[int] = None  # только для перевода
+    dt: Optional[datetime] = None
+    description: Optional[str] = None
+    currency: str = "RUB"
+
+
+@dataclass
+class BulkItemResult:
+    index: int                                     # позиция во входном списке
+    ids: List[int] = field(default_factory=list)   # перевод — две записи
+    error: Optional[str] = None
+    duplicate_of: Optional[int] = None             # найденный дубль (reject / flag)
+    transactions: List[TransactionDTO] = field(default_factory=list)  # записанные строки
+
+
+@dataclass
+class TransactionFilters:
+    """Фильтры списка операций; None — без ограничения."""
+    account_id: Optional[int] = None
+    category_id: Optional[int] = None
+    kind: Optional[TransactionKind] = None
+    currency: Optional[str] = None
+    date_from: Optional[date] = None   # включительно
+    date_to: Optional[date] = None     # включительно
+    amount_min: Optional[int] = None   # сумма по модулю, копейки
+    amount_max: Optional[int] = None
+
+
+@dataclass
+class TransactionPage:
+    items: List[TransactionDTO] = field(default_factory=list)
+    next_cursor: Optional[str] = None  # None — это последняя страница
+    total: Optional[int] = None        # всего по фильтрам (если просили)
+    total_exact: Optional[bool] = None  # False — total это нижняя граница
+    # {id: баланс счёта после операции} — только с running_balance
+    running_balances: Optional[Dict[int, int]] = None
+
+
+def encode_cursor(dt: datetime, tx_id: int) -> str:
+    """Курсор страницы — позиция (dt, id) последней отданной записи."""
+    raw = json.dumps([dt.isoformat(), tx_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        dt_value, tx_id = json.loads(raw)
+        return datetime.fromisoformat(dt_value), int(tx_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def _apply_effects(
+    session: Session,
+    added: Sequence[TransactionDTO] = (),
+    removed: Sequence[TransactionDTO] = (),
+) -> None:
+    """
+    Производные данные, которые меняются вместе с transactions.
+    Вызывается в той же сессии, поэтому фиксируется одним commit с операцией.
+    removed — состояние записей до изменения, added — после.
+    """
+    apply_balance_changes(session, added, removed)
+    apply_rollup_changes(session, added, removed)
+    apply_checkpoint_changes(session, added, removed)
+    # колоночный движок и кэш дашборда обновятся после commit
+    columnar.stage(session, added, removed)
+    mark_transactions(session, [*added, *removed])
+
+
+def _check_duplicate(
+    session: Session,
+    on_duplicate: Optional[str],
+    account_id: int,
+    amount_minor: int,
+    dt: datetime,
+    description: Optional[str],
+) -> Optional[int]:
+    """id существующей операции-дубля по политике on_duplicate (reject — исключение)."""
+    policy = resolve_policy(on_duplicate)
+    if policy == "allow":
+        return None
+    match = find_duplicates(
+        session, [DuplicateCandidate(account_id, amount_minor, dt, description)],
+    )[0]
+    if match is not None and policy == "reject":
+        raise DuplicateTransactionError(match)
+    return match
+
+
+# ---------- Логика поверх открытой сессии ----------
+# Используется и синхронными обёртками (session_scope),
+# и асинхронными (AsyncSession.run_sync).
+
+def _add_income(
+    session: Session,
     account_id: int,
     category_id: Optional[int] = None,
     amount_minor: int = 0,
     dt: Optional[datetime] = None,
     description: Optional[str] = None,
     currency: str = "RUB",
+    on_duplicate: Optional[DuplicatePolicy] = None,
 ) -> TransactionDTO:
-    """Доход: сумма > 0."""
     if amount_minor <= 0:
         raise ValueError("amount_minor for income must be > 0")
 
-    dt = dt or datetime.now()
-
-    with session_scope() as session:
-        # проверим, что счёт существует
-        session.query(Account).filter(Account.id == account_id).one()
-
-        tx = Transaction(
-            account_id=account_id,
-            category_id=category_id,
-            amount_minor=amount_minor,
-            currency=currency,
-            dt=dt,
-            description=description,
-        )
-        session.add(tx)
-        session.flush()
-        session.refresh(tx)
-        return _to_dto(tx)
+    item = NewTransaction("income", account_id, amount_minor, category_id,
+                          dt=dt or datetime.now(), description=description, currency=currency)
+    duplicate_of = _check_duplicate(
+        session, on_duplicate, account_id, amount_minor, item.dt, description,
+    )
+    # существование счёта проверяет внешний ключ — отдельного SELECT нет
+    [dto] = _insert_transactions(session, [_transaction_row(
+        item, item.dt, account_id, amount_minor, category_id, duplicate_of_id=duplicate_of,
+    )])
+    _apply_effects(session, added=[dto])
+    return dto
 
 
-def add_expense(
+def _add_expense(
+    session: Session,
     account_id: int,
     category_id: int,
     amount_minor: int,
     dt: Optional[datetime] = None,
     description: Optional[str] = None,
     currency: str = "RUB",
+    on_duplicate: Optional[DuplicatePolicy] = None,
 ) -> TransactionDTO:
-    """Расход: сумма < 0 (отрицательная)."""
     if amount_minor <= 0:
         raise ValueError("amount_minor for expense must be > 0")
 
-    dt = dt or datetime.now()
-
-    with session_scope() as session:
-        session.query(Account).filter(Account.id == account_id).one()
-
-        tx = Transaction(
-            account_id=account_id,
-            category_id=category_id,
-            amount_minor=-amount_minor,  # делаем отрицательной
-            currency=currency,
-            dt=dt,
-            description=description,
-        )
-        session.add(tx)
-        session.flush()
-        session.refresh(tx)
-        return _to_dto(tx)
+    item = NewTransaction("expense", account_id, amount_minor, category_id,
+                          dt=dt or datetime.now(), description=description, currency=currency)
+    duplicate_of = _check_duplicate(
+        session, on_duplicate, account_id, -amount_minor, item.dt, description,
+    )
+    [dto] = _insert_transactions(session, [_transaction_row(
+        item, item.dt, account_id, -amount_minor, category_id, duplicate_of_id=duplicate_of,
+    )])
+    _apply_effects(session, added=[dto])
+    return dto
 
 
-def add_transfer(
+def _add_transfer(
+    session: Session,
     from_account_id: int,
     to_account_id: int,
     amount_minor: int,
@@ -108,87 +253,664 @@ def add_transfer(
     description: Optional[str] = None,
     currency: str = "RUB",
 ) -> List[TransactionDTO]:
-    """Перевод между счетами (две записи с общим transfer_group_id)."""
     if amount_minor <= 0:
         raise ValueError("amount_minor for transfer must be > 0")
 
-    dt = dt or datetime.now()
+    item = NewTransaction("transfer", from_account_id, amount_minor, to_account_id=to_account_id,
+                          dt=dt or datetime.now(), description=description, currency=currency)
+    # номер группы выдаётся заранее, и обе записи (списание, зачисление)
+    # пишутся одним INSERT ... RETURNING
+    [group_id] = next_ids(session, TRANSFER_GROUP_SEQ)
+    dtos = _insert_transactions(session, [
+        _transaction_row(item, item.dt, from_account_id, -amount_minor, transfer_group_id=group_id),
+        _transaction_row(item, item.dt, to_account_id, amount_minor, transfer_group_id=group_id),
+    ])
+    _apply_effects(session, added=dtos)
+    return dtos
+
+
+def _bulk_item_error(
+    item: NewTransaction,
+    known_accounts: set[int],
+    known_categories: set[int],
+) -> Optional[str]:
+    if item.amount_minor <= 0:
+        return "amount_minor must be > 0"
+    if item.account_id not in known_accounts:
+        return f"account {item.account_id} not found"
+    if item.category_id is not None and item.category_id not in known_categories:
+        return f"category {item.category_id} not found"
+    if item.kind == "transfer":
+        if item.to_account_id is None:
+            return "to_account_id is required for transfer"
+        if item.to_account_id not in known_accounts:
+            return f"account {item.to_account_id} not found"
+    elif item.kind not in ("income", "expense"):
+        return f"invalid kind: {item.kind}"
+    return None
+
+
+def _transaction_row(
+    item: NewTransaction,
+    now: datetime,
+    account_id: int,
+    amount_minor: int,
+    category_id: Optional[int] = None,
+    transfer_group_id: Optional[int] = None,
+    duplicate_of_id: Optional[int] = None,
+) -> dict:
+    dt = item.dt or now
+    day_key = to_day_key(dt)
+    return {
+        "account_id": account_id,
+        "category_id": category_id,
+        "amount_minor": amount_minor,
+        "currency": item.currency,
+        "dt": dt,
+        "day_key": day_key,
+        "month_key": to_month_key(dt),
+        "description": item.description,
+        "transfer_group_id": transfer_group_id,
+        "fingerprint": transaction_fingerprint(account_id, amount_minor, day_key, item.description),
+        "duplicate_of_id": duplicate_of_id,
+    }
+
+
+# колонки, по которым строка RETURNING сопоставляется с элементом rows
+_MATCH_COLUMNS = (
+    "account_id", "category_id", "amount_minor", "currency", "dt",
+    "description", "transfer_group_id", "duplicate_of_id",
+)
+
+
+def _match_key(values) -> tuple:
+    # DateTime в SQLite хранит время без пояса: приводим dt к тому же виду,
+    # в каком его вернёт RETURNING
+    return tuple(
+        values[name].replace(tzinfo=None) if name == "dt" else values[name]
+        for name in _MATCH_COLUMNS
+    )
+
+
+def _insert_returning(session: Session, rows: list[dict]) -> List[TransactionDTO]:
+    """executemany INSERT ... RETURNING; DTO в порядке rows."""
+    if not rows:
+        return []
+    # Core-таблица, а не ORM-сущность: ORM bulk insert дробит пачку
+    # на отдельные INSERT по составу значений
+    table = Transaction.__table__
+    stmt = insert(table).returning(
+        table.c.id, table.c.created_at, *(table.c[name] for name in _MATCH_COLUMNS)
+    )
+    # Порядок RETURNING в SQLite не гарантирован, а sort_by_parameter_order
+    # без sentinel-колонки откатывается к INSERT на каждую строку. Поэтому
+    # строка RETURNING находит свой элемент rows по вставленным значениям;
+    # совпадающие по ним строки неразличимы и получают id по возрастанию.
+    returned: dict[tuple, list] = {}
+    for r in sorted(session.execute(stmt, rows), key=lambda r: r[0], reverse=True):
+        returned.setdefault(_match_key(r._mapping), []).append((r[0], r[1]))
+    matched = [returned[_match_key(row)].pop() for row in rows]
+    return [
+        TransactionDTO(
+            id=tx_id,
+            account_id=row["account_id"],
+            category_id=row["category_id"],
+            amount_minor=row["amount_minor"],
+            currency=row["currency"],
+            dt=row["dt"],
+            description=row["description"],
+            transfer_group_id=row["transfer_group_id"],
+            created_at=created_at,
+            duplicate_of_id=row["duplicate_of_id"],
+        )
+        for row, (tx_id, created_at) in zip(rows, matched)
+    ]
+
+
+def _known_ids(session: Session, model, ids: set) -> set[int]:
+    """Какие из ids есть в таблице model (один запрос)."""
+    if not ids:
+        return set()
+    return set(session.execute(select(model.id).where(model.id.in_(ids))).scalars())
 
-    with session_scope() as session:
-        # проверим, что оба счета существуют
-        session.query(Account).filter(Account.id == from_account_id).one()
-        session.query(Account).filter(Account.id == to_account_id).one()
 
-        # создаём списание
-        out_tx = Transaction(
-            account_id=from_account_id,
-            category_id=None,
-            amount_minor=-amount_minor,
-            currency=currency,
-            dt=dt,
-            description=description,
+def _reference_error(session: Session, rows: Sequence[dict]) -> Optional[ValueError]:
+    """
+    Ошибка для нарушения внешнего ключа: какой счёт или категория не найдены.
+    Запросы выполняются только на пути ошибки — успешная запись их не делает.
+    """
+    account_ids = {row["account_id"] for row in rows if "account_id" in row}
+    missing = sorted(account_ids - _known_ids(session, Account, account_ids))
+    if missing:
+        return ValueError(f"account {missing[0]} not found")
+    category_ids = {row["category_id"] for row in rows if row.get("category_id") is not None}
+    missing = sorted(category_ids - _known_ids(session, Category, category_ids))
+    if missing:
+        return ValueError(f"category {missing[0]} not found")
+    return None
+
+
+def _insert_transactions(session: Session, rows: list[dict]) -> List[TransactionDTO]:
+    """_insert_returning, где нарушение внешнего ключа — ValueError."""
+    try:
+        return _insert_returning(session, rows)
+    except IntegrityError as exc:
+        error = _reference_error(session, rows)
+        if error is None:
+            raise
+        raise error from exc
+
+
+def _add_transactions_bulk(
+    session: Session,
+    items: Sequence[NewTransaction],
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    duplicates_max_id: Optional[int] = None,
+) -> List[BulkItemResult]:
+    """
+    Пакетная вставка операций одной транзакцией БД.
+    Счета и категории проверяются одним запросом на весь пакет; ошибочные элементы
+    пропускаются и возвращаются с error, остальные пишутся пачками
+    по BULK_INSERT_CHUNK одним INSERT ... RETURNING (executemany) —
+    переводы обеими записями сразу, номера групп выдаются заранее
+    одним next_ids() на пачку. Производные таблицы обновляются один раз
+    на пачку.
+    Доходы и расходы проверяются на дубли одним поиском на весь пакет
+    (политика on_duplicate); duplicates_max_id — сравнивать только
+    с операциями id <= duplicates_max_id.
+    """
+    if len(items) > TRANSACTIONS_BULK_MAX_ITEMS:
+        raise ValueError(f"too many items: {len(items)} > {TRANSACTIONS_BULK_MAX_ITEMS}")
+
+    account_ids = {i.account_id for i in items} | {
+        i.to_account_id for i in items if i.to_account_id is not None
+    }
+    known_accounts = _known_ids(session, Account, account_ids)
+    # категории тоже заранее: нарушение внешнего ключа откатило бы всю пачку
+    known_categories = _known_ids(
+        session, Category, {i.category_id for i in items if i.category_id is not None},
+    )
+
+    results = [
+        BulkItemResult(index=n, error=_bulk_item_error(item, known_accounts, known_categories))
+        for n, item in enumerate(items)
+    ]
+    now = datetime.now()
+
+    policy = resolve_policy(on_duplicate)
+    if policy != "allow":
+        checked = [
+            r.index for r in results
+            if r.error is None and items[r.index].kind != "transfer"
+        ]
+        matches = find_duplicates(
+            session,
+            [
+                DuplicateCandidate(
+                    items[n].account_id,
+                    items[n].amount_minor if items[n].kind == "income" else -items[n].amount_minor,
+                    items[n].dt or now,
+                    items[n].description,
+                )
+                for n in checked
+            ],
+            max_id=duplicates_max_id,
         )
-        session.add(out_tx)
-        session.flush()
+        for n, match in zip(checked, matches):
+            if match is not None:
+                results[n].duplicate_of = match
+                if policy == "reject":
+                    results[n].error = f"duplicate of transaction {match}"
+
+    valid = [r.index for r in results if r.error is None]
+    for start in range(0, len(valid), BULK_INSERT_CHUNK):
+        chunk = valid[start:start + BULK_INSERT_CHUNK]
+
+        groups = iter(next_ids(
+            session, TRANSFER_GROUP_SEQ, sum(items[n].kind == "transfer" for n in chunk),
+        ))
+        rows = []
+        owners = []  # номер элемента для каждой строки rows
+        for n in chunk:
+            item = items[n]
+            if item.kind == "transfer":
+                group_id = next(groups)
+                rows.append(_transaction_row(item, now, item.account_id, -item.amount_minor,
+                                             transfer_group_id=group_id))
+                rows.append(_transaction_row(item, now, item.to_account_id, item.amount_minor,
+                                             transfer_group_id=group_id))
+                owners += [n, n]
+            else:
+                sign = 1 if item.kind == "income" else -1
+                rows.append(_transaction_row(
+                    item, now, item.account_id, sign * item.amount_minor, item.category_id,
+                    duplicate_of_id=results[n].duplicate_of,
+                ))
+                owners.append(n)
+        added = _insert_returning(session, rows)
+        for n, dto in zip(owners, added):
+            results[n].ids.append(dto.id)
+            results[n].transactions.append(dto)
 
-        transfer_group_id = out_tx.id  # id первой записи как идентификатор группы
-        out_tx.transfer_group_id = transfer_group_id
+        _apply_effects(session, added=added)
 
-        # создаём зачисление
-        in_tx = Transaction(
-            account_id=to_account_id,
-            category_id=None,
-            amount_minor=amount_minor,
-            currency=currency,
-            dt=dt,
-            description=description,
-            transfer_group_id=transfer_group_id,
+    return results
+
+
+def _list_transactions(session: Session) -> List[TransactionDTO]:
+    txs = session.query(Transaction).order_by(Transaction.id).all()
+    return [_to_dto(tx) for tx in txs]
+
+
+def _filter_conditions(filters: TransactionFilters) -> list:
+    """
+    Условия WHERE для фильтров. Индексы под сортировку (dt, id):
+    (dt), (account_id, dt), (category_id, dt), (currency, dt) и частичный
+    (dt) для переводов. SQLite идёт по одному из них в порядке выдачи,
+    а доход/расход и диапазон сумм проверяет по ходу, останавливаясь
+    на limit + 1 строке.
+    """
+    f = filters
+    conds = []
+    if f.account_id is not None:
+        conds.append(Transaction.account_id == f.account_id)
+    if f.category_id is not None:
+        conds.append(Transaction.category_id == f.category_id)
+    if f.currency is not None:
+        conds.append(Transaction.currency == f.currency)
+    if f.date_from is not None:
+        conds.append(Transaction.dt >= datetime.combine(f.date_from, time.min))
+    if f.date_to is not None:
+        conds.append(
+            Transaction.dt < datetime.combine(f.date_to + timedelta(days=1), time.min)
         )
-        session.add(in_tx)
-        session.flush()
 
-        session.refresh(out_tx)
-        session.refresh(in_tx)
+    if f.kind == "transfer":
+        conds.append(Transaction.transfer_group_id.is_not(None))
+    elif f.kind is not None:
+        conds.append(Transaction.transfer_group_id.is_(None))
+        conds.append(
+            Transaction.amount_minor > 0 if f.kind == "income" else Transaction.amount_minor < 0
+        )
 
-        return [_to_dto(out_tx), _to_dto(in_tx)]
+    # суммы задаются по модулю; при известном знаке — условие прямо на amount_minor
+    if f.amount_min is not None or f.amount_max is not None:
+        if f.kind == "income":
+            amount, lo, hi = Transaction.amount_minor, f.amount_min, f.amount_max
+        elif f.kind == "expense":
+            amount = Transaction.amount_minor
+            lo = -f.amount_max if f.amount_max is not None else None
+            hi = -f.amount_min if f.amount_min is not None else None
+        else:
+            amount, lo, hi = func.abs(Transaction.amount_minor), f.amount_min, f.amount_max
+        if lo is not None:
+            conds.append(amount >= lo)
+        if hi is not None:
+            conds.append(amount <= hi)
+    return conds
 
 
-def get_account_balance(account_id: int, currency: str | None = None) -> int:
-    """Текущий баланс счёта в копейках."""
-    from sqlalchemy import func
+def _count_transactions(session: Session, filters: TransactionFilters) -> tuple[int, bool]:
+    """
+    (total, exact). Где можно, число берётся из производных таблиц:
+    счёт/валюта — tx_count в account_balances, доходы/расходы/категория
+    по дням — tx_count в daily_rollups. Иначе строки считаются по индексу,
+    но не дальше TRANSACTIONS_COUNT_LIMIT.
+    """
+    f = filters
+    by_day = (
+        f.date_from is not None or f.date_to is not None
+        or f.category_id is not None or f.kind is not None
+    )
+
+    if not by_day and f.amount_min is None and f.amount_max is None:
+        q = select(func.coalesce(func.sum(AccountBalance.tx_count), 0))
+        if f.account_id is not None:
+            q = q.where(AccountBalance.account_id == f.account_id)
+        if f.currency is not None:
+            q = q.where(AccountBalance.currency == f.currency)
+        return int(session.execute(q).scalar_one()), True
+
+    rollup_ok = (
+        f.account_id is None
+        and f.amount_min is None and f.amount_max is None
+        and f.kind != "transfer"
+        # без вида и категории в выборку попали бы и переводы
+        and (f.kind is not None or f.category_id is not None)
+    )
+    if rollup_ok:
+        q = select(func.coalesce(func.sum(DailyRollup.tx_count), 0))
+        if f.kind is not None:
+            q = q.where(DailyRollup.sign == (1 if f.kind == "income" else -1))
+        if f.category_id is not None:
+            q = q.where(DailyRollup.category_id == f.category_id)
+        if f.currency is not None:
+            q = q.where(DailyRollup.currency == f.currency)
+        if f.date_from is not None:
+            q = q.where(DailyRollup.day_key >= to_day_key(f.date_from))
+        if f.date_to is not None:
+            q = q.where(DailyRollup.day_key <= to_day_key(f.date_to))
+        return int(session.execute(q).scalar_one()), True
+
+    limited = (
+        select(Transaction.id)
+        .where(*_filter_conditions(filters))
+        .limit(TRANSACTIONS_COUNT_LIMIT)
+        .subquery()
+    )
+    total = int(session.execute(select(func.count()).select_from(limited)).scalar_one())
+    return total, total < TRANSACTIONS_COUNT_LIMIT
+
+
+def _export_query(filters: TransactionFilters):
+    # без ORM-объектов и identity map
+    return (
+        select(*_DTO_COLUMNS)
+        .where(*_filter_conditions(filters))
+        .order_by(Transaction.dt, Transaction.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def _list_transactions_page(
+    session: Session,
+    filters: TransactionFilters,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    with_total: bool = False,
+    running_balance: bool = False,
+) -> TransactionPage:
+    """
+    Страница операций от новых к старым, keyset-пагинация по (dt, id):
+    следующая страница начинается строго после курсора, поэтому её
+    стоимость не зависит от того, как далеко пролистали.
+    running_balance — баланс счёта после каждой операции страницы
+    (нужен фильтр по счёту; считается по всем операциям счёта, а не
+    только попавшим под остальные фильтры).
+    """
+    if running_balance and filters.account_id is None:
+        raise ValueError("running_balance requires account_id")
+
+    q = session.query(Transaction).filter(*_filter_conditions(filters))
+    if cursor is not None:
+        cursor_dt, cursor_id = decode_cursor(cursor)
+        q = q.filter(tuple_(Transaction.dt, Transaction.id) < tuple_(cursor_dt, cursor_id))
+
+    # limit + 1: лишняя строка говорит, что дальше ещё есть
+    txs = q.order_by(Transaction.dt.desc(), Transaction.id.desc()).limit(limit + 1).all()
+    page = TransactionPage(items=[_to_dto(tx) for tx in txs[:limit]])
+    if len(txs) > limit:
+        last = page.items[-1]
+        page.next_cursor = encode_cursor(last.dt, last.id)
+
+    if running_balance:
+        page.running_balances = {}
+        if page.items:
+            newest, oldest = page.items[0], page.items[-1]
+            page.running_balances = running_balances(
+                session,
+                filters.account_id,
+                (oldest.dt, oldest.id),
+                (newest.dt, newest.id),
+            )
+
+    if with_total:
+        page.total, page.total_exact = _count_transactions(session, filters)
+    return page
+
+
+def _get_account_balance(
+    session: Session,
+    account_id: int,
+    currency: str | None = None,
+) -> int:
+    # Баланс читается из account_balances по первичному ключу.
+    # Если явно передали валюту — учитываем, иначе суммируем всё по счёту
+    return get_balance(session, account_id, currency)
+
+
+def _with_transfer_group(transaction_id: int):
+    """Условие: сама запись и, если это перевод, вторая запись его группы."""
+    group_id = (
+        select(Transaction.transfer_group_id)
+        .where(Transaction.id == transaction_id)
+        .scalar_subquery()
+    )
+    return or_(Transaction.id == transaction_id, Transaction.transfer_group_id == group_id)
+
+
+def _delete_transaction(session: Session, transaction_id: int) -> bool:
+    # одним DELETE ... RETURNING: старое состояние нужно только для _apply_effects
+    removed = [
+        TransactionDTO(*row)
+        for row in session.execute(
+            delete(Transaction)
+            .where(_with_transfer_group(transaction_id))
+            .returning(*_DTO_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+    ]
+    if not removed:
+        return False
+
+    _apply_effects(session, removed=removed)
+    return True
+
+
+def _update_transaction(
+    session: Session,
+    transaction_id: int,
+    category_id: Optional[int] = None,
+    description: Optional[str] = None,
+    amount_minor: Optional[int] = None,
+) -> Optional[TransactionDTO]:
+    """
+    Один SELECT записи вместе с группой перевода и один UPDATE (executemany):
+    старое состояние всё равно нужно для _apply_effects, а новое
+    (сумма со знаком, отпечаток) считается в Python. Если правка меняет
+    отпечаток, duplicate_of_id сбрасывается.
+    """
+    removed = [
+        TransactionDTO(*row)
+        for row in session.execute(
+            select(*_DTO_COLUMNS).where(_with_transfer_group(transaction_id))
+        )
+    ]
+    if not removed:
+        return None
+    if amount_minor is not None and amount_minor <= 0:
+        raise ValueError("amount_minor for update must be > 0")
+
+    added = []
+    params = []
+    for old in removed:
+        new = replace(old)
+        if category_id is not None:
+            new.category_id = category_id
+        if description is not None:
+            new.description = description
+        if amount_minor is not None:
+            # знак (и у обычной операции, и у половины перевода) сохраняется
+            new.amount_minor = -amount_minor if old.amount_minor < 0 else amount_minor
+        day_key = to_day_key(new.dt)
+        fingerprint = transaction_fingerprint(
+            new.account_id, new.amount_minor, day_key, new.description,
+        )
+        # после правки суммы или описания пометка дубля устарела
+        if fingerprint != transaction_fingerprint(
+            old.account_id, old.amount_minor, day_key, old.description,
+        ):
+            new.duplicate_of_id = None
+        added.append(new)
+        params.append({
+            "tx_id": new.id,
+            "category_id": new.category_id,
+            "description": new.description,
+            "amount_minor": new.amount_minor,
+            "fingerprint": fingerprint,
+            "duplicate_of_id": new.duplicate_of_id,
+        })
+
+    try:
+        session.execute(
+            update(Transaction.__table__)
+            .where(Transaction.__table__.c.id == bindparam("tx_id"))
+            .values(
+                category_id=bindparam("category_id"),
+                description=bindparam("description"),
+                amount_minor=bindparam("amount_minor"),
+                fingerprint=bindparam("fingerprint"),
+                duplicate_of_id=bindparam("duplicate_of_id"),
+            ),
+            params,
+        )
+    except IntegrityError as exc:
+        error = _reference_error(session, [{"category_id": category_id}])
+        if error is None:
+            raise
+        raise error from exc
+    _apply_effects(session, added=added, removed=removed)
+    return next(t for t in added if t.id == transaction_id)
+
+
+# ---------- Синхронный API ----------
+
+def add_income(
+    account_id: int,
+    category_id: Optional[int] = None,
+    amount_minor: int = 0,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[Session] = None,
+) -> TransactionDTO:
+    """
+    Доход: сумма > 0.
+    on_duplicate: allow / reject (DuplicateTransactionError) / flag
+    (записать с duplicate_of_id); по умолчанию DUPLICATE_POLICY.
+    """
+    with session_scope(session) as session:
+        return _add_income(
+            session, account_id, category_id, amount_minor, dt, description, currency,
+            on_duplicate,
+        )
+
+
+def add_expense(
+    account_id: int,
+    category_id: int,
+    amount_minor: int,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[Session] = None,
+) -> TransactionDTO:
+    """Расход: сумма < 0 (отрицательная). on_duplicate — как у add_income."""
+    with session_scope(session) as session:
+        return _add_expense(
+            session, account_id, category_id, amount_minor, dt, description, currency,
+            on_duplicate,
+        )
+
+
+def add_transfer(
+    from_account_id: int,
+    to_account_id: int,
+    amount_minor: int,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    session: Optional[Session] = None,
+) -> List[TransactionDTO]:
+    """Перевод между счетами (две записи с общим transfer_group_id)."""
+    with session_scope(session) as session:
+        return _add_transfer(
+            session,
+            from_account_id,
+            to_account_id,
+            amount_minor,
+            dt,
+            description,
+            currency,
+        )
 
-    with session_scope() as session:
-        q = session.query(func.coalesce(func.sum(Transaction.amount_minor), 0)).filter(
-            Transaction.account_id == account_id,
+
+def add_transactions_bulk(
+    items: Sequence[NewTransaction],
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[Session] = None,
+) -> List[BulkItemResult]:
+    """Пакет доходов, расходов и переводов одним commit; ошибки — по элементам."""
+    with session_scope(session) as session:
+        return _add_transactions_bulk(session, items, on_duplicate)
+
+
+def list_transactions(*, session: Optional[Session] = None) -> List[TransactionDTO]:
+    """Все транзакции по возрастанию id."""
+    with session_scope(session) as session:
+        return _list_transactions(session)
+
+
+def list_transactions_page(
+    filters: Optional[TransactionFilters] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    with_total: bool = False,
+    running_balance: bool = False,
+    *,
+    session: Optional[Session] = None,
+) -> TransactionPage:
+    """Страница операций по фильтрам, от новых к старым."""
+    with session_scope(session) as session:
+        return _list_transactions_page(
+            session, filters or TransactionFilters(), cursor, limit, with_total, running_balance,
         )
-        # Если явно передали валюту — учитываем, иначе суммируем всё по счёту
-        if currency is not None:
-            q = q.filter(Transaction.currency == currency)
 
-        total = q.scalar()
-        return int(total)
+
+def iter_transactions(
+    filters: Optional[TransactionFilters] = None,
+    *,
+    session: Optional[Session] = None,
+) -> Iterator[List[TransactionDTO]]:
+    """
+    Все операции по фильтрам от старых к новым, пачками по EXPORT_BATCH_SIZE.
+    Строки читаются из курсора по мере обхода, в памяти — одна пачка.
+    """
+    with session_scope(session) as session:
+        result = session.execute(_export_query(filters or TransactionFilters()))
+        for rows in result.partitions():
+            yield [TransactionDTO(*row) for row in rows]
 
 
-def delete_transaction(transaction_id: int) -> bool:
+def get_account_balance(
+    account_id: int,
+    currency: str | None = None,
+    *,
+    session: Optional[Session] = None,
+) -> int:
+    """Текущий баланс счёта в копейках."""
+    with session_scope(session) as session:
+        return _get_account_balance(session, account_id, currency)
+
+
+def delete_transaction(
+    transaction_id: int,
+    *,
+    session: Optional[Session] = None,
+) -> bool:
     """
     Удаляет одну транзакцию.
     Если это часть перевода (есть transfer_group_id),
     удаляет обе записи перевода.
     """
-    with session_scope() as session:
-        tx = session.query(Transaction).filter(Transaction.id == transaction_id).first()
-        if not tx:
-            return False
-
-        if tx.transfer_group_id is not None:
-            session.query(Transaction).filter(
-                Transaction.transfer_group_id == tx.transfer_group_id
-            ).delete(synchronize_session=False)
-        else:
-            session.delete(tx)
-
-        session.commit()
-        return True
+    with session_scope(session) as session:
+        return _delete_transaction(session, transaction_id)
 
 
 def update_transaction(
@@ -196,6 +918,8 @@ def update_transaction(
     category_id: Optional[int] = None,
     description: Optional[str] = None,
     amount_minor: Optional[int] = None,
+    *,
+    session: Optional[Session] = None,
 ) -> Optional[TransactionDTO]:
     """
     Обновляет одну транзакцию.
@@ -207,46 +931,159 @@ def update_transaction(
       - расход: amount_minor < 0 (храним со знаком минус)
       - перевод: две записи, -amount_minor и +amount_minor.
     """
-    with session_scope() as session:
-        tx = session.query(Transaction).filter(Transaction.id == transaction_id).first()
-        if not tx:
-            return None
-
-        # helper для обновления суммы с правильным знаком
-        def apply_amount(t: Transaction) -> None:
-            nonlocal amount_minor
-            if amount_minor is None:
-                return
-            if amount_minor <= 0:
-                raise ValueError("amount_minor for update must be > 0")
-            if t.transfer_group_id is not None:
-                # для переводов знак определяем по текущему знаку записи
-                t.amount_minor = -amount_minor if t.amount_minor < 0 else amount_minor
-            else:
-                # обычная операция: знак берём по текущему amount_minor
-                t.amount_minor = -amount_minor if t.amount_minor < 0 else amount_minor
-
-        if tx.transfer_group_id is not None:
-            group_txs = (
-                session.query(Transaction)
-                .filter(Transaction.transfer_group_id == tx.transfer_group_id)
-                .all()
-            )
-            for t in group_txs:
-                if category_id is not None:
-                    t.category_id = category_id
-                if description is not None:
-                    t.description = description
-                apply_amount(t)
-            session.flush()
-            session.refresh(tx)
-            return _to_dto(tx)
-        else:
-            if category_id is not None:
-                tx.category_id = category_id
-            if description is not None:
-                tx.description = description
-            apply_amount(tx)
-            session.flush()
-            session.refresh(tx)
-            return _to_dto(tx)
\ No newline at end of file
+    with session_scope(session) as session:
+        return _update_transaction(
+            session, transaction_id, category_id, description, amount_minor,
+        )
+
+
+# ---------- Асинхронный API ----------
+
+async def add_income_async(
+    account_id: int,
+    category_id: Optional[int] = None,
+    amount_minor: int = 0,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[AsyncSession] = None,
+) -> TransactionDTO:
+    """Асинхронный вариант add_income."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _add_income, account_id, category_id, amount_minor, dt, description, currency,
+            on_duplicate,
+        )
+
+
+async def add_expense_async(
+    account_id: int,
+    category_id: int,
+    amount_minor: int,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[AsyncSession] = None,
+) -> TransactionDTO:
+    """Асинхронный вариант add_expense."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _add_expense, account_id, category_id, amount_minor, dt, description, currency,
+            on_duplicate,
+        )
+
+
+async def add_transfer_async(
+    from_account_id: int,
+    to_account_id: int,
+    amount_minor: int,
+    dt: Optional[datetime] = None,
+    description: Optional[str] = None,
+    currency: str = "RUB",
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[TransactionDTO]:
+    """Асинхронный вариант add_transfer."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _add_transfer,
+            from_account_id,
+            to_account_id,
+            amount_minor,
+            dt,
+            description,
+            currency,
+        )
+
+
+async def add_transactions_bulk_async(
+    items: Sequence[NewTransaction],
+    *,
+    on_duplicate: Optional[DuplicatePolicy] = None,
+    session: Optional[AsyncSession] = None,
+) -> List[BulkItemResult]:
+    """Асинхронный вариант add_transactions_bulk."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_add_transactions_bulk, items, on_duplicate)
+
+
+async def list_transactions_async(
+    *,
+    session: Optional[AsyncSession] = None,
+) -> List[TransactionDTO]:
+    """Асинхронный вариант list_transactions."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_list_transactions)
+
+
+async def list_transactions_page_async(
+    filters: Optional[TransactionFilters] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    with_total: bool = False,
+    running_balance: bool = False,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> TransactionPage:
+    """Асинхронный вариант list_transactions_page."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _list_transactions_page,
+            filters or TransactionFilters(),
+            cursor,
+            limit,
+            with_total,
+            running_balance,
+        )
+
+
+async def stream_transactions_async(
+    filters: Optional[TransactionFilters] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> AsyncIterator[List[TransactionDTO]]:
+    """Асинхронный вариант iter_transactions (AsyncSession.stream)."""
+    async with async_session_scope(session) as session:
+        result = await session.stream(_export_query(filters or TransactionFilters()))
+        async for rows in result.partitions():
+            yield [TransactionDTO(*row) for row in rows]
+
+
+async def get_account_balance_async(
+    account_id: int,
+    currency: str | None = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> int:
+    """Асинхронный вариант get_account_balance."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_get_account_balance, account_id, currency)
+
+
+async def delete_transaction_async(
+    transaction_id: int,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    """Асинхронный вариант delete_transaction."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(_delete_transaction, transaction_id)
+
+
+async def update_transaction_async(
+    transaction_id: int,
+    category_id: Optional[int] = None,
+    description: Optional[str] = None,
+    amount_minor: Optional[int] = None,
+    *,
+    session: Optional[AsyncSession] = None,
+) -> Optional[TransactionDTO]:
+    """Асинхронный вариант update_transaction."""
+    async with async_session_scope(session) as session:
+        return await session.run_sync(
+            _update_transaction, transaction_id, category_id, description, amount_minor,
+        )
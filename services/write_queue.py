@@ -0,0 +1,237 @@
+"""
+Очередь записи с групповым commit (write-behind) для потока одиночных
+операций POST /transactions.
+
+SQLite пишет одним писателем, и каждый commit — отдельный fsync журнала,
+поэтому параллельные одиночные записи выстраиваются в очередь на commit.
+Очередь складывает их в пачку и пишет одним commit:
+  - вызывающий кладёт операцию (NewTransaction) и получает future;
+  - отдельный поток-писатель забирает всё, что накопилось, дожидается
+    ещё до WRITE_QUEUE_MAX_DELAY_MS или WRITE_QUEUE_MAX_BATCH операций
+    и пишет пачку через _add_transactions_bulk в одной транзакции
+    (операции с on_duplicate reject/flag — по одной, см. _runs);
+  - future получает записи (с id) только после commit — надёжность та же,
+    что у записи в транзакции запроса; ошибка одного элемента (нет счёта,
+    дубль по политике reject) достаётся только его вызывающему.
+Включается WRITE_QUEUE_ENABLED=1; запуск и остановка — в lifespan
+приложения. Очередь живёт в памяти процесса, у каждого worker-процесса
+своя.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from db import session_scope
+from services.duplicates import DuplicatePolicy, DuplicateTransactionError, resolve_policy
+from services.transactions import (
+    TRANSACTIONS_BULK_MAX_ITEMS,
+    NewTransaction,
+    TransactionDTO,
+    _add_transactions_bulk,
+)
+
+# включить очередь для POST /transactions (без Idempotency-Key)
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "0") == "1"
+# сколько операций максимум в одном commit
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "500"))
+# сколько ждать попутных операций после первой в пачке
+WRITE_QUEUE_MAX_DELAY_MS = float(os.getenv("WRITE_QUEUE_MAX_DELAY_MS", "2"))
+
+_STOP = object()
+
+
+@dataclass
+class _Entry:
+    item: NewTransaction
+    policy: DuplicatePolicy
+    future: Future
+
+
+@dataclass
+class WriteQueueStats:
+    running: bool = False
+    queued: int = 0       # ждут записи прямо сейчас
+    submitted: int = 0
+    written: int = 0      # операций записано (перевод — одна операция)
+    rejected: int = 0     # ошибки отдельных операций
+    failed_batches: int = 0
+    batches: int = 0      # commit-ов
+    max_batch: int = 0    # самая большая пачка
+
+    @property
+    def avg_batch(self) -> float:
+        return (self.written + self.rejected) / self.batches if self.batches else 0.0
+
+
+class WriteQueue:
+    def __init__(self, max_batch: int, max_delay_s: float) -> None:
+        # пачка пишется одним _add_transactions_bulk
+        self.max_batch = max(1, min(max_batch, TRANSACTIONS_BULK_MAX_ITEMS))
+        self.max_delay_s = max_delay_s
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = WriteQueueStats()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Дописать уже поставленные операции и остановить поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def submit(
+        self,
+        item: NewTransaction,
+        on_duplicate: Optional[DuplicatePolicy] = None,
+    ) -> Future:
+        """
+        Поставить операцию в очередь. Future вернёт список записей
+        (перевод — две) после commit или исключение: ValueError,
+        DuplicateTransactionError — как при прямой записи.
+        """
+        policy = resolve_policy(on_duplicate)
+        # время операции — время запроса, а не момент записи пачки
+        if item.dt is None:
+            item.dt = datetime.now()
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None:
+                raise RuntimeError("write queue is not running")
+            self._stats.submitted += 1
+            self._queue.put(_Entry(item, policy, future))
+        return future
+
+    async def submit_async(
+        self,
+        item: NewTransaction,
+        on_duplicate: Optional[DuplicatePolicy] = None,
+    ) -> List[TransactionDTO]:
+        return await asyncio.wrap_future(self.submit(item, on_duplicate))
+
+    # ---------- Поток-писатель ----------
+
+    def _collect(self, first) -> tuple[list, bool]:
+        """Пачка: first, всё накопленное и то, что придёт за max_delay_s."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay_s
+        while len(batch) < self.max_batch:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        # _STOP ставится после всех принятых операций (см. stop/submit)
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            # отменённые вызывающим (клиент ушёл) не пишем
+            self._write([e for e in batch if e.future.set_running_or_notify_cancel()])
+            if stop:
+                return
+
+    @staticmethod
+    def _runs(batch: list[_Entry]):
+        """
+        Части пачки для _add_transactions_bulk в порядке поступления:
+        подряд идущие allow — одной частью, reject и flag — по одной.
+        find_duplicates сравнивает кандидатов только с уже записанными
+        операциями, а двойная отправка одного и того же — как раз тот
+        дубль, который нужно поймать, как при прямой записи.
+        """
+        run: list[_Entry] = []
+        for entry in batch:
+            if entry.policy == "allow":
+                run.append(entry)
+                continue
+            if run:
+                yield run
+                run = []
+            yield [entry]
+        if run:
+            yield run
+
+    def _write(self, batch: list[_Entry]) -> None:
+        if not batch:
+            return
+        try:
+            with session_scope() as session:
+                done = [
+                    (entry, result)
+                    for run in self._runs(batch)
+                    for entry, result in zip(
+                        run,
+                        _add_transactions_bulk(
+                            session, [e.item for e in run], on_duplicate=run[0].policy,
+                        ),
+                    )
+                ]
+        except Exception as exc:
+            with self._lock:
+                self._stats.batches += 1
+                self._stats.failed_batches += 1
+            for entry in batch:
+                entry.future.set_exception(exc)
+            return
+
+        # commit прошёл — теперь можно отвечать
+        rejected = 0
+        for entry, result in done:
+            if result.error is None:
+                entry.future.set_result(result.transactions)
+            elif result.duplicate_of is not None and entry.policy == "reject":
+                rejected += 1
+                entry.future.set_exception(DuplicateTransactionError(result.duplicate_of))
+            else:
+                rejected += 1
+                entry.future.set_exception(ValueError(result.error))
+
+        with self._lock:
+            self._stats.batches += 1
+            self._stats.written += len(done) - rejected
+            self._stats.rejected += rejected
+            self._stats.max_batch = max(self._stats.max_batch, len(done))
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._stats.running = self._thread is not None
+            self._stats.queued = self._queue.qsize()
+            data = asdict(self._stats)
+            data["avg_batch"] = self._stats.avg_batch
+            return data
+
+
+write_queue = WriteQueue(WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_DELAY_MS / 1000)